@@ -4,10 +4,10 @@ Centralizes MongoDB connection settings.
 Uses environment variable MONGO_URI for connection string.
 """
 import os
-import certifi
-from pymongo import MongoClient
 from pymongo.errors import ConnectionFailure, ServerSelectionTimeoutError
 
+from app.database.client import get_client, get_database, database_name
+
 
 class DatabaseConfig:
     """MongoDB connection configuration."""
@@ -18,30 +18,11 @@ class DatabaseConfig:
     @staticmethod
     def get_database():
         """
-        Creates and returns a MongoDB database connection.
+        Returns the MongoDB database on the process-wide shared client.
         Uses MONGO_URI from environment variables.
         """
         uri = os.environ.get("MONGO_URI", DatabaseConfig.MONGO_URI)
-        client = MongoClient(
-            uri,
-            serverSelectionTimeoutMS=10000,
-            tlsCAFile=certifi.where(),
-            connectTimeoutMS=10000,
-            socketTimeoutMS=20000,
-        )
-        
-        # Extract database name from URI, fallback to default
-        db_name = DatabaseConfig.DATABASE_NAME
-        if "//" in uri:
-            after_host = uri.split("//")[-1]
-            if "/" in after_host:
-                parts = after_host.split("/")
-                if len(parts) > 1:
-                    raw_name = parts[-1].split("?")[0]
-                    if raw_name:
-                        db_name = raw_name
-
-        return client[db_name]
+        return get_database(uri)
 
     @staticmethod
     def test_connection():
@@ -51,27 +32,12 @@ class DatabaseConfig:
         """
         try:
             uri = os.environ.get("MONGO_URI", DatabaseConfig.MONGO_URI)
-            client = MongoClient(
-                uri,
-                serverSelectionTimeoutMS=10000,
-                tlsCAFile=certifi.where(),
-                connectTimeoutMS=10000,
-                socketTimeoutMS=20000,
-            )
+            client = get_client(uri)
             # Force a connection attempt
             client.admin.command("ping")
-            
+
             # Also report how many users exist in the DB
-            db_name = DatabaseConfig.DATABASE_NAME
-            if "//" in uri:
-                after_host = uri.split("//")[-1]
-                if "/" in after_host:
-                    parts = after_host.split("/")
-                    if len(parts) > 1:
-                        raw_name = parts[-1].split("?")[0]
-                        if raw_name:
-                            db_name = raw_name
-            
+            db_name = database_name(uri)
             user_count = client[db_name]["users"].count_documents({})
             return True, f"MongoDB connection successful (DB: {db_name}, Users: {user_count})"
         except ConnectionFailure as e:
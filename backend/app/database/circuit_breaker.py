@@ -0,0 +1,102 @@
+"""
+Circuit breaker for the MongoDB connection.
+
+After a failed connect the breaker opens: for a cool-down window every
+caller gets DatabaseUnavailable immediately instead of repeating the full
+connect + ping (up to serverSelectionTimeoutMS) in its request thread.
+When the window ends one caller makes a trial attempt; success closes the
+breaker, failure re-opens it with a doubled window (capped). Only one
+attempt runs at a time; callers arriving meanwhile wait up to
+MONGO_CONNECT_WAIT seconds for it and then fail fast.
+
+Settings (environment):
+    MONGO_RETRY_COOLDOWN=15       seconds the breaker stays open after a failure
+    MONGO_RETRY_COOLDOWN_MAX=120  cap for the doubling cool-down
+    MONGO_CONNECT_WAIT=2          seconds to wait for an in-flight attempt
+"""
+
+import os
+import time
+import threading
+
+from pymongo.errors import ConnectionFailure
+
+from app.utils import metrics
+
+COOLDOWN = float(os.environ.get("MONGO_RETRY_COOLDOWN", 15))
+MAX_COOLDOWN = float(os.environ.get("MONGO_RETRY_COOLDOWN_MAX", 120))
+CONNECT_WAIT = float(os.environ.get("MONGO_CONNECT_WAIT", 2))
+
+metrics.describe("circuit_breaker_open", "1 while the circuit breaker rejects calls")
+metrics.describe("circuit_breaker_rejections_total", "Calls rejected without an attempt")
+
+
+class DatabaseUnavailable(ConnectionFailure):
+    """Raised without contacting the server while the breaker is open."""
+
+
+class CircuitBreaker:
+    """closed -> (failure) -> open -> (cool-down over) -> half_open -> closed/open."""
+
+    def __init__(self, name, cooldown=COOLDOWN, max_cooldown=MAX_COOLDOWN, wait=CONNECT_WAIT):
+        self.name = name
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.wait = wait
+        self.state = "closed"
+        self.failures = 0
+        self.last_error = None
+        self.retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _reject(self, reason):
+        metrics.inc("circuit_breaker_rejections_total", breaker=self.name)
+        raise DatabaseUnavailable(f"{self.name} unavailable ({reason}): {self.last_error}")
+
+    def _check_open(self):
+        if self.state == "open":
+            remaining = self.retry_at - time.monotonic()
+            if remaining > 0:
+                self._reject(f"retrying in {remaining:.0f}s")
+
+    def call(self, attempt):
+        """Run attempt() unless the breaker is open; record its outcome."""
+        self._check_open()
+        if not self._lock.acquire(timeout=self.wait):
+            self._reject("connection attempt in progress")
+        try:
+            self._check_open()  # another caller may have failed while we waited
+            if self.state == "open":
+                self.state = "half_open"
+            try:
+                result = attempt()
+            except Exception as e:
+                self._trip(e)
+                raise
+            self._close()
+            return result
+        finally:
+            self._lock.release()
+
+    def _trip(self, error):
+        self.failures += 1
+        window = min(self.max_cooldown, self.cooldown * 2 ** (self.failures - 1))
+        self.state = "open"
+        self.last_error = str(error)
+        self.retry_at = time.monotonic() + window
+        metrics.set_gauge("circuit_breaker_open", 1, breaker=self.name)
+        print(f"[WARNING] {self.name} circuit open for {window:.0f}s after failure #{self.failures}")
+
+    def _close(self):
+        if self.failures:
+            print(f"[SUCCESS] {self.name} circuit closed")
+        self.state = "closed"
+        self.failures = 0
+        self.last_error = None
+        metrics.set_gauge("circuit_breaker_open", 0, breaker=self.name)
+
+    def status(self):
+        status = {"state": self.state, "failures": self.failures, "last_error": self.last_error}
+        if self.state == "open":
+            status["retry_in"] = round(max(0.0, self.retry_at - time.monotonic()), 1)
+        return status
@@ -0,0 +1,221 @@
+"""
+Process-wide MongoClient registry.
+
+mongodb.py, mongo_db.py and config.DatabaseConfig all get their client
+here, so the whole process shares one connection pool (and one TLS
+handshake per pooled connection) per URI instead of building its own.
+
+Pool settings (environment):
+    MONGO_MAX_POOL_SIZE=50         connections per server
+    MONGO_MIN_POOL_SIZE=0          connections kept open while idle
+    MONGO_MAX_IDLE_TIME_MS=300000  close connections idle for longer
+    MONGO_WAIT_QUEUE_TIMEOUT_MS=10000  wait for a free connection before failing
+    MONGO_SERVER_SELECTION_TIMEOUT_MS=10000  give up on an unreachable cluster
+    MONGO_TLS=                     1/0 forces TLS on/off; unset follows the URI
+                                   (mongodb+srv:// or a tls=/ssl= option)
+
+MongoClient is not fork-safe: a child of a pre-forking server (gunicorn
+with preload) must not use its parent's sockets, so the registry is
+emptied after a fork and every process builds its own client.
+"""
+
+import os
+import time
+from urllib.parse import parse_qs, urlsplit
+import threading
+
+import certifi
+from pymongo import MongoClient, monitoring
+
+from app.utils import metrics
+
+DEFAULT_URI = "mongodb://localhost:27017/fashiondb"
+DEFAULT_DATABASE = "fashiondb"
+
+MAX_POOL_SIZE = int(os.environ.get("MONGO_MAX_POOL_SIZE", 50))
+MIN_POOL_SIZE = int(os.environ.get("MONGO_MIN_POOL_SIZE", 0))
+MAX_IDLE_TIME_MS = int(os.environ.get("MONGO_MAX_IDLE_TIME_MS", 300000))
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 10000))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 10000))
+TLS = os.environ.get("MONGO_TLS", "")
+
+_clients = {}  # uri -> MongoClient
+_pid = os.getpid()
+_lock = threading.Lock()
+
+metrics.describe("mongo_pool_connections", "Open pooled MongoDB connections per server")
+metrics.describe("mongo_pool_checked_out", "Pooled MongoDB connections in use per server")
+metrics.describe("mongo_pool_checkout_wait_seconds", "Time spent waiting for a pooled connection")
+metrics.describe("mongo_pool_checkout_failures_total", "Failed connection check-outs by reason")
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Connection pool events -> gauges of open/in-use connections and check-out waits."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open = {}
+        self._checked_out = {}
+        self._local = threading.local()
+
+    def _adjust(self, counts, gauge, address, delta):
+        server = "%s:%s" % address
+        with self._lock:
+            counts[server] = max(0, counts.get(server, 0) + delta)
+            value = counts[server]
+        metrics.set_gauge(gauge, value, server=server)
+
+    def reset(self):
+        with self._lock:
+            self._open.clear()
+            self._checked_out.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                server: {"open": count, "checked_out": self._checked_out.get(server, 0)}
+                for server, count in self._open.items()
+            }
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._adjust(self._open, "mongo_pool_connections", event.address, 1)
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._adjust(self._open, "mongo_pool_connections", event.address, -1)
+
+    def connection_check_out_started(self, event):
+        # Events fire in the thread that checks the connection out
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        metrics.inc("mongo_pool_checkout_failures_total", reason=event.reason)
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            metrics.observe("mongo_pool_checkout_wait_seconds", time.perf_counter() - started)
+            self._local.started = None
+        self._adjust(self._checked_out, "mongo_pool_checked_out", event.address, 1)
+
+    def connection_checked_in(self, event):
+        self._adjust(self._checked_out, "mongo_pool_checked_out", event.address, -1)
+
+
+pool_metrics = PoolMetrics()
+
+
+def mongo_uri():
+    return os.environ.get("MONGO_URI", DEFAULT_URI)
+
+
+def database_name(uri=None):
+    """Database name from the URI path (mongodb://host/<name>?opts), else fashiondb."""
+    uri = uri or mongo_uri()
+    if "//" in uri:
+        after_host = uri.split("//")[-1]
+        if "/" in after_host:
+            raw = after_host.split("/")[-1].split("?")[0]
+            if raw:
+                return raw
+    return DEFAULT_DATABASE
+
+
+def use_tls(uri=None):
+    """Whether to connect with TLS: MONGO_TLS if set, else what the URI asks for."""
+    if TLS:
+        return TLS == "1"
+    uri = uri or mongo_uri()
+    if uri.startswith("mongodb+srv://"):
+        return True  # SRV (Atlas) connections default to TLS
+    options = {k.lower(): v for k, v in parse_qs(urlsplit(uri).query).items()}
+    value = options.get("tls", options.get("ssl", ["false"]))[-1]
+    return value.lower() in ("true", "1")
+
+
+def _tls_options(uri):
+    if not use_tls(uri):
+        # Any tls* option (even tlsCAFile) would switch TLS on in pymongo
+        return {"tls": False}
+    return {"tls": True, "tlsCAFile": certifi.where(), "tlsAllowInvalidCertificates": False}
+
+
+def _reset_after_fork():
+    """Forget (without closing) clients inherited from the parent process."""
+    global _pid, _lock
+    _lock = threading.Lock()  # may have been held by another parent thread
+    _clients.clear()
+    pool_metrics.reset()
+    _pid = os.getpid()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def get_client(uri=None):
+    """The shared MongoClient for `uri` (MONGO_URI by default), created on first use."""
+    uri = uri or mongo_uri()
+    if os.getpid() != _pid:
+        _reset_after_fork()
+    client = _clients.get(uri)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(uri)
+        if client is None:
+            client = MongoClient(
+                uri,
+                serverSelectionTimeoutMS=SERVER_SELECTION_TIMEOUT_MS,
+                connectTimeoutMS=10000,
+                socketTimeoutMS=20000,
+                retryWrites=True,
+                retryReads=True,
+                maxPoolSize=MAX_POOL_SIZE,
+                minPoolSize=MIN_POOL_SIZE,
+                maxIdleTimeMS=MAX_IDLE_TIME_MS,
+                waitQueueTimeoutMS=WAIT_QUEUE_TIMEOUT_MS,
+                event_listeners=[pool_metrics],
+                **_tls_options(uri),
+            )
+            _clients[uri] = client
+    return client
+
+
+def get_database(uri=None):
+    uri = uri or mongo_uri()
+    return get_client(uri)[database_name(uri)]
+
+
+def close_client(uri=None):
+    """Close and drop the shared client (e.g. after SSL errors); the next call reconnects."""
+    uri = uri or mongo_uri()
+    with _lock:
+        client = _clients.pop(uri, None)
+    if client is not None:
+        try:
+            client.close()
+        except Exception:
+            pass
+
+
+def pool_stats():
+    return {
+        "max_pool_size": MAX_POOL_SIZE,
+        "min_pool_size": MIN_POOL_SIZE,
+        "servers": pool_metrics.stats(),
+    }
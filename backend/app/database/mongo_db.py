@@ -5,17 +5,17 @@ Uses google_id as the document _id to prevent duplicates.
 """
 
 from datetime import datetime, timezone
-from pymongo import MongoClient
 from pymongo.errors import (
     DuplicateKeyError,
     ConnectionFailure,
     ServerSelectionTimeoutError,
 )
-import os
 import ssl
 import certifi
 import traceback
 
+from app.database.client import get_client, close_client, mongo_uri, database_name
+
 # ── Module-level connection (lazy-initialized) ──────────────────────
 _client = None
 _db = None
@@ -40,39 +40,19 @@ def _make_ssl_context():
 
 
 def _get_db():
-    """Lazy-initialize the MongoDB connection. Resets on failure."""
+    """Lazy-initialize the MongoDB connection (shared client). Resets on failure."""
     global _client, _db
-    if _db is None:
-        uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017/fashiondb")
+    client = get_client()
+    if _db is None or _client is not client:
+        uri = mongo_uri()
         print(f"[MongoDB] Connecting to: {uri[:40]}...")
         try:
-            _client = MongoClient(
-                uri,
-                serverSelectionTimeoutMS=10000,
-                tlsCAFile=certifi.where(),
-                tls=True,
-                tlsAllowInvalidCertificates=False,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=20000,
-                retryWrites=True,
-                retryReads=True,
-            )
-
             # Force a connection test
-            _client.admin.command("ping")
-
-            # Extract DB name from URI
-            db_name = "fashiondb"
-            if "//" in uri:
-                after_host = uri.split("//")[-1]
-                if "/" in after_host:
-                    parts = after_host.split("/")
-                    if len(parts) > 1:
-                        raw = parts[-1].split("?")[0]
-                        if raw:
-                            db_name = raw
-
-            _db = _client[db_name]
+            client.admin.command("ping")
+
+            db_name = database_name(uri)
+            _db = client[db_name]
+            _client = client
             print(f"[MongoDB] ✅ Connected successfully to database: {db_name}")
         except Exception as e:
             # Reset so next request tries again
@@ -86,11 +66,7 @@ def _get_db():
 def reset_connection():
     """Force reset the MongoDB connection (e.g., after SSL errors)."""
     global _client, _db
-    if _client:
-        try:
-            _client.close()
-        except Exception:
-            pass
+    close_client()
     _client = None
     _db = None
     print("[MongoDB] Connection reset")
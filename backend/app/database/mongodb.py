@@ -4,18 +4,32 @@ Complete replacement for SQLite - handles all data storage.
 """
 
 from datetime import datetime, timezone
-from pymongo import MongoClient, ASCENDING, DESCENDING
+from pymongo import ASCENDING, DESCENDING
 from pymongo.errors import DuplicateKeyError, ConnectionFailure
 from bson import ObjectId
 from werkzeug.security import generate_password_hash, check_password_hash
-import os
 import ssl
 import certifi
 import secrets
 import traceback
+import threading
+import re
+import json
+import base64
+import hashlib
+
+from app.utils.metrics import span, timed
+from app.database import write_behind
+from app.database.client import get_client, close_client, mongo_uri, database_name
+from app.database.circuit_breaker import CircuitBreaker
+
+MIGRATIONS_COLLECTION = "_migrations"
+INDEX_MIGRATION = "indexes-v1"
 
 _client = None
 _db = None
+_breaker = CircuitBreaker("mongodb")
+_write_behind = write_behind.WriteBehindQueue(lambda: _get_db())
 
 
 def _make_ssl_context():
@@ -32,45 +46,81 @@ def _make_ssl_context():
     return ctx
 
 
-def _get_db():
-    """Lazy-initialize MongoDB connection."""
+def _connect(client):
+    """Ping, then apply pending migrations; runs under the circuit breaker."""
     global _client, _db
-    if _db is None:
-        uri = os.environ.get("MONGO_URI", "mongodb://localhost:27017/fashiondb")
-        print(f"[MongoDB] Connecting to: {uri[:40]}...")
+    if _db is not None and _client is client:
+        return _db  # connected by the attempt this caller waited for
+    uri = mongo_uri()
+    print(f"[MongoDB] Connecting to: {uri[:40]}...")
+    try:
+        with span("mongo_operation_seconds", operation="connect"):
+            client.admin.command("ping")
+
+        db_name = database_name(uri)
+        db = client[db_name]
+        run_migrations(db)
+        _db = db
+        _client = client
+        print(f"[MongoDB] Connected successfully to database: {db_name}")
+    except Exception as e:
+        _client = None
+        _db = None
+        print(f"[MongoDB] Connection failed: {e}")
+        raise
+    return _db
+
+
+def _get_db():
+    """
+    Lazy-initialize MongoDB connection (on the process-wide shared client).
+    Raises DatabaseUnavailable without touching the network while the
+    circuit breaker is open after a failed connect.
+    """
+    client = get_client()
+    if _db is not None and _client is client:
+        return _db
+    return _breaker.call(lambda: _connect(client))
+
+
+def connect_in_background():
+    """Connect (and migrate) on a daemon thread so startup never waits on MongoDB."""
+
+    def connect():
         try:
-            _client = MongoClient(
-                uri,
-                serverSelectionTimeoutMS=10000,
-                tlsCAFile=certifi.where(),
-                tls=True,
-                tlsAllowInvalidCertificates=False,
-                connectTimeoutMS=10000,
-                socketTimeoutMS=20000,
-                retryWrites=True,
-                retryReads=True,
-            )
-            _client.admin.command("ping")
-
-            db_name = "fashiondb"
-            if "//" in uri:
-                after_host = uri.split("//")[-1]
-                if "/" in after_host:
-                    parts = after_host.split("/")
-                    if len(parts) > 1:
-                        raw = parts[-1].split("?")[0]
-                        if raw:
-                            db_name = raw
-
-            _db = _client[db_name]
-            _ensure_indexes(_db)
-            print(f"[MongoDB] Connected successfully to database: {db_name}")
+            db = _get_db()
+            print(f"✅ MongoDB connected: {db.name}")
         except Exception as e:
-            _client = None
-            _db = None
-            print(f"[MongoDB] Connection failed: {e}")
-            raise
-    return _db
+            print(f"❌ MongoDB connection failed: {e}")
+            print("   The app will still start, but data operations will fail.")
+            print("   Set MONGO_URI in your .env file to fix this.")
+
+    thread = threading.Thread(target=connect, name="mongo-connect", daemon=True)
+    thread.start()
+    return thread
+
+
+def connection_status():
+    return _breaker.status()
+
+
+def run_migrations(db):
+    """
+    One-time schema steps, recorded in the _migrations collection so later
+    connects (every worker, every reconnect) only read the marker.
+    Bump INDEX_MIGRATION when _ensure_indexes changes.
+    """
+    if db[MIGRATIONS_COLLECTION].find_one({"_id": INDEX_MIGRATION}) is not None:
+        return False
+    with span("mongo_operation_seconds", operation="migrate"):
+        _ensure_indexes(db)
+    db[MIGRATIONS_COLLECTION].update_one(
+        {"_id": INDEX_MIGRATION},
+        {"$setOnInsert": {"applied_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    print(f"[MongoDB] Applied migration {INDEX_MIGRATION}")
+    return True
 
 
 def _ensure_indexes(db):
@@ -100,11 +150,7 @@ def _ensure_indexes(db):
 def reset_connection():
     """Force reset MongoDB connection."""
     global _client, _db
-    if _client:
-        try:
-            _client.close()
-        except Exception:
-            pass
+    close_client()
     _client = None
     _db = None
     print("[MongoDB] Connection reset")
@@ -180,6 +226,7 @@ def _build_user_doc(
     }
 
 
+@timed("mongo_operation_seconds", operation="create_user")
 def create_user(
     username,
     email,
@@ -224,6 +271,7 @@ def create_user(
         return None, str(e)
 
 
+@timed("mongo_operation_seconds", operation="find_user_by_email")
 def find_user_by_email(email):
     """Find user by email - works for both manual and Google users."""
     db = _get_db()
@@ -231,6 +279,7 @@ def find_user_by_email(email):
     return _serialize_user(user) if user else None
 
 
+@timed("mongo_operation_seconds", operation="find_user_by_username")
 def find_user_by_username(username):
     """Find user by username."""
     db = _get_db()
@@ -238,6 +287,7 @@ def find_user_by_username(username):
     return _serialize_user(user) if user else None
 
 
+@timed("mongo_operation_seconds", operation="find_user_by_google_id")
 def find_user_by_google_id(google_id):
     """Find user by Google ID."""
     db = _get_db()
@@ -262,6 +312,7 @@ def verify_user_password(email, password):
     return None
 
 
+@timed("mongo_operation_seconds", operation="update_user")
 def update_user(user_id, update_data):
     """
     Update user fields. Supports partial updates.
@@ -307,6 +358,7 @@ def update_user(user_id, update_data):
         return None
 
 
+@timed("mongo_operation_seconds", operation="update_user_last_login")
 def update_user_last_login(user_id):
     """Update last login timestamp."""
     db = _get_db()
@@ -315,6 +367,7 @@ def update_user_last_login(user_id):
     )
 
 
+@timed("mongo_operation_seconds", operation="find_user_by_object_id")
 def find_user_by_object_id(user_id):
     """Find user by MongoDB ObjectId."""
     db = _get_db()
@@ -325,6 +378,7 @@ def find_user_by_object_id(user_id):
         return None
 
 
+@timed("mongo_operation_seconds", operation="link_google_account")
 def link_google_account(user_id, google_id, profile_pic=None):
     """Link Google account to existing manual user."""
     db = _get_db()
@@ -355,6 +409,7 @@ def link_google_account(user_id, google_id, profile_pic=None):
 # ============================================================================
 
 
+@timed("mongo_operation_seconds", operation="get_wardrobe_items")
 def get_wardrobe_items(user_id):
     """Get all wardrobe items for a user, sorted by creation date."""
     db = _get_db()
@@ -372,6 +427,7 @@ def get_wardrobe_items(user_id):
     return items
 
 
+@timed("mongo_operation_seconds", operation="add_wardrobe_item")
 def add_wardrobe_item(user_id, image_url, category="uncategorized"):
     """Add item to user's wardrobe."""
     db = _get_db()
@@ -387,6 +443,7 @@ def add_wardrobe_item(user_id, image_url, category="uncategorized"):
     return doc
 
 
+@timed("mongo_operation_seconds", operation="delete_wardrobe_item")
 def delete_wardrobe_item(user_id, item_id):
     """Delete wardrobe item."""
     db = _get_db()
@@ -401,9 +458,9 @@ def delete_wardrobe_item(user_id, item_id):
 # ============================================================================
 
 
+@timed("mongo_operation_seconds", operation="add_search_history")
 def add_search_history(user_id, search_type, search_query, results_count=0):
-    """Add search to user's history."""
-    db = _get_db()
+    """Add search to user's history (written behind the request)."""
     doc = {
         "user_id": str(user_id),
         "search_type": search_type,
@@ -411,12 +468,10 @@ def add_search_history(user_id, search_type, search_query, results_count=0):
         "results_count": results_count,
         "created_at": datetime.now(timezone.utc),
     }
-    result = db["search_history"].insert_one(doc)
-    doc["_id"] = str(result.inserted_id)
-    doc["created_at"] = doc["created_at"].isoformat()
-    return doc
+    return _insert_deferred("search_history", [doc])[0]
 
 
+@timed("mongo_operation_seconds", operation="get_search_history")
 def get_search_history(user_id, limit=50):
     """Get user's recent search history."""
     db = _get_db()
@@ -435,16 +490,53 @@ def get_search_history(user_id, limit=50):
     return items
 
 
+# ============================================================================
+# WRITE-BEHIND INSERTS
+# ============================================================================
+
+
+def _insert_deferred(collection, docs):
+    """
+    Insert history/audit documents through the write-behind queue (or
+    synchronously with MONGO_WRITE_BEHIND=0). The _id is assigned here so
+    callers still get it back and retried batches stay idempotent.
+    Returns the documents serialized like the synchronous helpers do.
+    """
+    for doc in docs:
+        doc.setdefault("_id", ObjectId())
+    if write_behind.ENABLED:
+        _write_behind.submit(collection, docs)
+    else:
+        _get_db()[collection].insert_many(docs, ordered=False)
+
+    saved = []
+    for doc in docs:
+        doc = dict(doc, _id=str(doc["_id"]))
+        if isinstance(doc.get("created_at"), datetime):
+            doc["created_at"] = doc["created_at"].isoformat()
+        saved.append(doc)
+    return saved
+
+
+def flush_write_behind(timeout=None):
+    """Drain the write-behind queue and write synchronously from then on (runs at exit)."""
+    _write_behind.close(write_behind.DRAIN_TIMEOUT if timeout is None else timeout)
+
+
+def write_behind_stats():
+    return dict(_write_behind.stats, depth=_write_behind.depth(), enabled=write_behind.ENABLED)
+
+
 # ============================================================================
 # SIZE ESTIMATION OPERATIONS
 # ============================================================================
 
 
+@timed("mongo_operation_seconds", operation="save_size_estimate")
 def save_size_estimate(
     user_id, measurements, recommended_size, confidence=0.0, body_type=None
 ):
-    """Save size estimation result for user."""
-    db = _get_db()
+    """Save size estimation result for user (the estimate is written behind the request)."""
     doc = {
         "user_id": str(user_id),
         "measurements": measurements,
@@ -453,9 +545,7 @@ def save_size_estimate(
         "body_type": body_type or "",
         "created_at": datetime.now(timezone.utc),
     }
-    result = db["size_estimates"].insert_one(doc)
-    doc["_id"] = str(result.inserted_id)
-    doc["created_at"] = doc["created_at"].isoformat()
+    doc = _insert_deferred("size_estimates", [doc])[0]
 
     if user_id:
         update_user(
@@ -466,6 +556,7 @@ def save_size_estimate(
     return doc
 
 
+@timed("mongo_operation_seconds", operation="get_size_estimates")
 def get_size_estimates(user_id, limit=10):
     """Get user's recent size estimates."""
     db = _get_db()
@@ -495,10 +586,8 @@ def get_latest_size_estimate(user_id):
 # ============================================================================
 
 
-def save_recommendation(user_id, product_id, product_data, score, reason=None):
-    """Save a recommendation for user."""
-    db = _get_db()
-    doc = {
+def _recommendation_doc(user_id, product_id, product_data, score, reason=None):
+    return {
         "user_id": str(user_id),
         "product_id": product_id,
         "product_data": product_data,
@@ -507,12 +596,33 @@ def save_recommendation(user_id, product_id, product_data, score, reason=None):
         "viewed": False,
         "created_at": datetime.now(timezone.utc),
     }
-    result = db["recommendations"].insert_one(doc)
-    doc["_id"] = str(result.inserted_id)
-    doc["created_at"] = doc["created_at"].isoformat()
-    return doc
 
 
+@timed("mongo_operation_seconds", operation="save_recommendation")
+def save_recommendation(user_id, product_id, product_data, score, reason=None):
+    """Save a recommendation for user (written behind the request)."""
+    doc = _recommendation_doc(user_id, product_id, product_data, score, reason)
+    return _insert_deferred("recommendations", [doc])[0]
+
+
+@timed("mongo_operation_seconds", operation="save_recommendations_bulk")
+def save_recommendations_bulk(user_id, items, reason=None):
+    """
+    Save all results of one recommendation query at once.
+    items: list of (product_id, product_data, score).
+    Queued for the write-behind thread (MONGO_WRITE_BEHIND), otherwise one
+    insert_many. Returns the number of documents saved or queued.
+    """
+    docs = [
+        _recommendation_doc(user_id, product_id, product_data, score, reason)
+        for product_id, product_data, score in items
+    ]
+    if not docs:
+        return 0
+    return len(_insert_deferred("recommendations", docs))
+
+
+@timed("mongo_operation_seconds", operation="get_recommendations")
 def get_recommendations(user_id, limit=20, unseen_only=False):
     """Get recommendations for user."""
     db = _get_db()
@@ -532,6 +642,7 @@ def get_recommendations(user_id, limit=20, unseen_only=False):
     return items
 
 
+@timed("mongo_operation_seconds", operation="mark_recommendation_viewed")
 def mark_recommendation_viewed(user_id, recommendation_id):
     """Mark recommendation as viewed."""
     db = _get_db()
@@ -547,11 +658,16 @@ def mark_recommendation_viewed(user_id, recommendation_id):
 # ============================================================================
 
 
-def get_products(filters=None, limit=100):
-    """Get products with optional filters."""
-    db = _get_db()
-    query = {}
+# Keyset pagination: pages are "the next `limit` documents after the last
+# one returned" in a fixed sort order, so every page costs the same index
+# range scan no matter how deep the client pages (no skip()).
+MAX_PRODUCT_PAGE = 100
+PRODUCT_SCORE_WEIGHTS = {"name": 0.4, "description": 0.2, "category": 0.25, "brand": 0.15}
+_FIELD_NAME = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
 
+def _product_query(filters):
+    query = {}
     if filters:
         if filters.get("category"):
             query["category"] = filters["category"]
@@ -562,22 +678,136 @@ def get_products(filters=None, limit=100):
         if filters.get("max_price"):
             query.setdefault("price", {})["$lte"] = filters["max_price"]
         if filters.get("search_term"):
+            # Literal substring match: "c++" or "(" must not be parsed as a pattern
+            term = re.escape(filters["search_term"])
             query["$or"] = [
-                {"name": {"$regex": filters["search_term"], "$options": "i"}},
-                {"description": {"$regex": filters["search_term"], "$options": "i"}},
-                {"brand": {"$regex": filters["search_term"], "$options": "i"}},
+                {"name": {"$regex": term, "$options": "i"}},
+                {"description": {"$regex": term, "$options": "i"}},
+                {"brand": {"$regex": term, "$options": "i"}},
             ]
+    return query
+
+
+def _product_projection(fields):
+    """{field: 1} for the requested fields (_id is always returned); None = all fields."""
+    if not fields:
+        return None
+    if isinstance(fields, str):
+        fields = fields.split(",")
+    projection = {}
+    for field in fields:
+        field = field.strip()
+        if not _FIELD_NAME.match(field):
+            raise ValueError(f"invalid field '{field}'")
+        projection[field] = 1
+    return projection
+
+
+def _query_fingerprint(query, score_term):
+    raw = json.dumps([query, score_term], sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:12]
 
-    products = list(db["products"].find(query).limit(limit))
+
+def _encode_page_token(fingerprint, last_id, last_score=None):
+    key = {"oid": str(last_id)} if isinstance(last_id, ObjectId) else {"id": last_id}
+    payload = {"q": fingerprint, "after": key, "score": last_score}
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+
+def _decode_page_token(token, fingerprint):
+    """(last_id, last_score) of the previous page; ValueError if malformed or for another query."""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode("ascii")))
+        after = payload["after"]
+        last_id = ObjectId(after["oid"]) if "oid" in after else after["id"]
+        last_score = payload.get("score")
+    except Exception:
+        raise ValueError("invalid page_token")
+    if payload.get("q") != fingerprint:
+        raise ValueError("page_token belongs to a different query")
+    return last_id, last_score
+
+
+def _score_expression(term):
+    """Server-side relevance: weighted sum of the fields containing `term` (literally)."""
+    term = re.escape(term)
+    return {
+        "$add": [
+            {
+                "$cond": [
+                    {"$regexMatch": {"input": {"$ifNull": [f"${field}", ""]},
+                                     "regex": term, "options": "i"}},
+                    weight,
+                    0,
+                ]
+            }
+            for field, weight in PRODUCT_SCORE_WEIGHTS.items()
+        ]
+    }
+
+
+@timed("mongo_operation_seconds", operation="get_products_page")
+def get_products_page(filters=None, limit=20, page_token=None, fields=None,
+                      with_count=False, score_term=None):
+    """
+    One page of products. Pages follow _id order, or relevance to
+    `score_term` (highest first, ties by _id) when it is given; each
+    product then carries its "_score". `fields` limits the returned fields
+    (list or comma-separated). with_count adds the total number of matches
+    (one extra count query, so only ask for it when needed).
+    Returns {"products", "next_page_token" (None on the last page)[, "total"]}.
+    Raises ValueError for a bad page_token or field name.
+    """
+    db = _get_db()
+    limit = max(1, min(int(limit), MAX_PRODUCT_PAGE))
+    query = _product_query(filters)
+    projection = _product_projection(fields)
+    fingerprint = _query_fingerprint(query, score_term)
+    after = _decode_page_token(page_token, fingerprint) if page_token else None
+
+    if score_term:
+        pipeline = [{"$match": query}, {"$addFields": {"_score": _score_expression(score_term)}}]
+        if after:
+            last_id, last_score = after
+            pipeline.append({"$match": {"$or": [
+                {"_score": {"$lt": last_score}},
+                {"_score": last_score, "_id": {"$gt": last_id}},
+            ]}})
+        pipeline += [{"$sort": {"_score": -1, "_id": 1}}, {"$limit": limit + 1}]
+        if projection:
+            pipeline.append({"$project": dict(projection, _score=1)})
+        products = list(db["products"].aggregate(pipeline))
+    else:
+        page_query = dict(query)
+        if after:
+            page_query = {"$and": [query, {"_id": {"$gt": after[0]}}]}
+        products = list(
+            db["products"].find(page_query, projection).sort("_id", ASCENDING).limit(limit + 1)
+        )
+
+    next_page_token = None
+    if len(products) > limit:
+        products = products[:limit]
+        last = products[-1]
+        next_page_token = _encode_page_token(fingerprint, last["_id"], last.get("_score"))
 
     for product in products:
         product["_id"] = str(product["_id"])
         if "created_at" in product and isinstance(product["created_at"], datetime):
             product["created_at"] = product["created_at"].isoformat()
 
-    return products
+    page = {"products": products, "next_page_token": next_page_token}
+    if with_count:
+        page["total"] = db["products"].count_documents(query)
+    return page
+
+
+def get_products(filters=None, limit=100, fields=None):
+    """Get products with optional filters (first page only; see get_products_page)."""
+    return get_products_page(filters, limit=limit, fields=fields)["products"]
 
 
+@timed("mongo_operation_seconds", operation="get_product_by_id")
 def get_product_by_id(product_id):
     """Get single product by ID."""
     db = _get_db()
@@ -590,6 +820,7 @@ def get_product_by_id(product_id):
         return None
 
 
+@timed("mongo_operation_seconds", operation="get_unique_categories")
 def get_unique_categories():
     """Get all unique product categories."""
     db = _get_db()
@@ -597,6 +828,7 @@ def get_unique_categories():
     return categories
 
 
+@timed("mongo_operation_seconds", operation="get_unique_brands")
 def get_unique_brands():
     """Get all unique product brands."""
     db = _get_db()
@@ -604,6 +836,7 @@ def get_unique_brands():
     return brands
 
 
+@timed("mongo_operation_seconds", operation="seed_products")
 def seed_products(products_data):
     """Seed products collection with initial data."""
     db = _get_db()
@@ -624,6 +857,7 @@ def seed_products(products_data):
 # ============================================================================
 
 
+@timed("mongo_operation_seconds", operation="get_all_users")
 def get_all_users():
     """Get all users (for debugging/migration)."""
     db = _get_db()
@@ -631,6 +865,7 @@ def get_all_users():
     return [_serialize_user(u) for u in users]
 
 
+@timed("mongo_operation_seconds", operation="count_collection")
 def count_collection(collection_name):
     """Count documents in a collection."""
     db = _get_db()
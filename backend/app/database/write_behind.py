@@ -0,0 +1,255 @@
+"""
+Write-behind buffer for MongoDB inserts the client never reads back
+(search history, recommendations, size estimates).
+
+Requests enqueue documents and return immediately; a background thread
+groups them by collection and writes each group with one
+insert_many(ordered=False) when the batch fills up or the flush interval
+elapses. The queue is bounded: when it is full the caller writes the
+documents synchronously instead, so a slow database slows requests down
+rather than growing memory without limit.
+
+Failed flushes are retried with exponential backoff. Documents get their
+_id before they are queued, so a retry of a partially applied batch only
+re-sends the documents that did not land (duplicate-key errors count as
+written). While the circuit breaker is open nothing is sent at all, so
+those rejections do not use up attempts: the batch waits for the breaker's
+cool-down instead of being dropped during a short outage. The queue is
+drained when the process exits.
+
+Settings (environment):
+    MONGO_WRITE_BEHIND=0             write synchronously in the request thread
+    MONGO_WRITE_BEHIND_MAX=10000     queued documents before falling back to sync
+    MONGO_WRITE_BEHIND_BATCH=500     documents per insert_many
+    MONGO_WRITE_BEHIND_INTERVAL=0.5  seconds between flushes of partial batches
+    MONGO_WRITE_BEHIND_RETRIES=5     attempts per batch before it is dropped
+    MONGO_WRITE_BEHIND_DRAIN=10      seconds allowed for draining at exit
+"""
+
+import os
+import time
+import queue
+import atexit
+import weakref
+import threading
+
+from pymongo.errors import BulkWriteError
+
+from app.utils import metrics
+from app.database.circuit_breaker import DatabaseUnavailable
+
+ENABLED = os.environ.get("MONGO_WRITE_BEHIND", "1") == "1"
+MAX_QUEUED = int(os.environ.get("MONGO_WRITE_BEHIND_MAX", 10000))
+BATCH_SIZE = int(os.environ.get("MONGO_WRITE_BEHIND_BATCH", 500))
+FLUSH_INTERVAL = float(os.environ.get("MONGO_WRITE_BEHIND_INTERVAL", 0.5))
+MAX_RETRIES = int(os.environ.get("MONGO_WRITE_BEHIND_RETRIES", 5))
+DRAIN_TIMEOUT = float(os.environ.get("MONGO_WRITE_BEHIND_DRAIN", 10))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+
+DUPLICATE_KEY = 11000
+_STOP = object()
+_queues = weakref.WeakSet()  # every live WriteBehindQueue, reset in forked children
+
+metrics.describe("write_behind_queue_depth", "Documents waiting in the MongoDB write-behind queue")
+metrics.describe("write_behind_flush_seconds", "insert_many latency of write-behind flushes")
+metrics.describe("write_behind_documents_total", "Write-behind documents by outcome")
+
+
+def _unwritten(docs, error):
+    """Documents of a failed insert_many(ordered=False) that did not land."""
+    failed = {
+        e["index"] for e in error.details.get("writeErrors", []) if e.get("code") != DUPLICATE_KEY
+    }
+    if error.details.get("writeConcernErrors"):
+        return docs  # nothing is known to be durable
+    return [doc for i, doc in enumerate(docs) if i in failed]
+
+
+class WriteBehindQueue:
+    """Bounded per-collection insert buffer flushed by one daemon thread."""
+
+    def __init__(self, get_db, max_queued=MAX_QUEUED, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_retries=MAX_RETRIES):
+        self.get_db = get_db
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self._closed = False
+        self._atexit_registered = False
+        self.stats = {"queued": 0, "written": 0, "sync_fallbacks": 0, "retries": 0,
+                      "unavailable": 0, "failed": 0}
+        _queues.add(self)
+
+    def _after_fork(self):
+        """
+        A forked child inherits the queue but not the flushing thread: start
+        over with an empty queue (the parent writes its own documents) and
+        let the next submit start this process's thread.
+        """
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()  # may have been held by a parent thread
+        self._closed = False
+
+    def _ensure_started(self):
+        # No thread until the first document arrives; a forked child (whose
+        # queue _after_fork emptied) starts its own flush thread here
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        if self._pid is not None and self._pid != pid:
+            self._after_fork()  # fallback where os.register_at_fork is missing
+        with self._start_lock:
+            if self._thread is None or self._pid != pid or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="mongo-write-behind", daemon=True
+                )
+                self._pid = pid
+                self._thread.start()
+                if not self._atexit_registered:
+                    # atexit handlers survive fork, so one registration covers children
+                    atexit.register(self.close)
+                    self._atexit_registered = True
+
+    def _count(self, collection, outcome, n):
+        metrics.inc("write_behind_documents_total", n, collection=collection, outcome=outcome)
+
+    def submit(self, collection, docs):
+        """Queue `docs` for `collection`; writes them now if the queue is full or closed."""
+        if self._closed:
+            self._write(collection, docs)
+            return
+        self._ensure_started()
+        for i, doc in enumerate(docs):
+            try:
+                self._queue.put_nowait((collection, doc))
+            except queue.Full:
+                self.stats["sync_fallbacks"] += 1
+                self._count(collection, "sync_fallback", len(docs) - i)
+                self._write(collection, docs[i:])
+                return
+            self.stats["queued"] += 1
+        metrics.set_gauge("write_behind_queue_depth", self.depth())
+
+    def _write(self, collection, docs):
+        with metrics.span("write_behind_flush_seconds", collection=collection):
+            self.get_db()[collection].insert_many(docs, ordered=False)
+        self.stats["written"] += len(docs)
+        self._count(collection, "written", len(docs))
+
+    def _write_with_retry(self, collection, docs):
+        attempt = waits = 0
+        while attempt < self.max_retries:
+            try:
+                self._write(collection, docs)
+                return
+            except DatabaseUnavailable as e:
+                # Rejected by the open breaker before anything was sent:
+                # wait for its cool-down without spending an attempt
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** waits)
+                if not waits:
+                    print(f"[WARNING] Write-behind holding {len(docs)} {collection} docs "
+                          f"while MongoDB is unavailable ({e})")
+                self.stats["unavailable"] += 1
+                self._count(collection, "unavailable", len(docs))
+                waits += 1
+                time.sleep(delay)
+                continue
+            except BulkWriteError as e:
+                remaining = _unwritten(docs, e)
+                self.stats["written"] += len(docs) - len(remaining)
+                self._count(collection, "written", len(docs) - len(remaining))
+                docs = remaining
+                if not docs:
+                    return
+                error = e
+            except Exception as e:
+                error = e
+            attempt += 1
+            if attempt < self.max_retries:
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+                self.stats["retries"] += 1
+                self._count(collection, "retried", len(docs))
+                print(f"[WARNING] Write-behind flush of {len(docs)} {collection} docs failed "
+                      f"({error}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+        self.stats["failed"] += len(docs)
+        self._count(collection, "failed", len(docs))
+        print(f"[ERROR] Dropping {len(docs)} {collection} docs after "
+              f"{self.max_retries} attempts: {error}")
+
+    def _flush(self, pending):
+        for collection, docs in pending.items():
+            self._write_with_retry(collection, docs)
+        pending.clear()
+        metrics.set_gauge("write_behind_queue_depth", self.depth())
+
+    def _run(self):
+        pending, count = {}, 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    self._flush(pending)
+                    return
+                collection, doc = item
+                pending.setdefault(collection, []).append(doc)
+                count += 1
+            except queue.Empty:
+                pass
+            if count >= self.batch_size or (count and time.monotonic() >= deadline):
+                self._flush(pending)
+                count = 0
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+    def close(self, timeout=DRAIN_TIMEOUT):
+        """Flush everything queued and stop the thread (registered with atexit)."""
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is None or self._pid != os.getpid():
+            return  # nothing started in this process
+        depth = self.depth()
+        # The sentinel lands after every queued doc; waits only while the queue is full
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            pass
+        self._thread.join(timeout)
+        if not self._thread.is_alive():
+            # Docs that raced in behind the sentinel
+            leftovers = {}
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is not _STOP:
+                    leftovers.setdefault(item[0], []).append(item[1])
+            self._flush(leftovers)
+        if self._thread.is_alive():
+            print(f"[WARNING] Write-behind drain timed out with {self.depth()} docs unwritten")
+        elif depth:
+            print(f"[SUCCESS] Write-behind drained {depth} queued docs")
+
+    def depth(self):
+        return self._queue.qsize()
+
+
+def _after_fork_in_child():
+    for write_queue in list(_queues):
+        write_queue._after_fork()
+
+
+if hasattr(os, "register_at_fork"):
+    # Once per process, not per queue: a per-instance hook would keep every
+    # queue ever created alive
+    os.register_at_fork(after_in_child=_after_fork_in_child)
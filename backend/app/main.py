@@ -1,8 +1,9 @@
-from flask import Flask, send_from_directory
+from flask import Flask, send_from_directory, request, g, Response
 from flask_cors import CORS
 from flask_session import Session
 from dotenv import load_dotenv
 import os
+import time
 from datetime import timedelta
 
 load_dotenv()
@@ -33,15 +34,16 @@ CORS(
 
 print("Server configured with Session (Filesystem) + MongoDB Atlas (PyMongo)")
 
-from app.database.mongodb import _get_db
+from app.database.mongodb import (
+    _get_db,
+    connect_in_background,
+    connection_status,
+    write_behind_stats,
+)
+from app.database.client import pool_stats
 
-try:
-    db = _get_db()
-    print(f"✅ MongoDB connected: {db.name}")
-except Exception as e:
-    print(f"❌ MongoDB connection failed: {e}")
-    print("   The app will still start, but data operations will fail.")
-    print("   Set MONGO_URI in your .env file to fix this.")
+# Connect + one-time migrations off the startup path; requests fail fast until then
+connect_in_background()
 
 from app.routes.auth import bp as auth_bp
 from app.routes.profile import bp as profile_bp
@@ -57,6 +59,44 @@ app.register_blueprint(wardrobe_bp)
 app.register_blueprint(search_bp)
 app.register_blueprint(recommendations_bp)
 
+# Build + warm up the feature extractor once per process (background by default)
+from models import model_registry
+from models import recommender_model
+from models.recommender_model import recommend_from_bytes as get_recommendations
+
+model_registry.start_warmup()
+# Pick up new embedding store versions without a restart (RECOMMENDER_RELOAD_INTERVAL)
+recommender_model.start_store_watcher()
+
+from app.utils import metrics
+
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def record_request_duration(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        # Label by route pattern, not raw path, to keep the series bounded
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.observe(
+            "http_request_duration_seconds",
+            time.perf_counter() - started,
+            method=request.method,
+            endpoint=endpoint,
+            status=response.status_code,
+        )
+    return response
+
+
+@app.route("/metrics")
+def prometheus_metrics():
+    """Latency histograms (request, recommendation stages, MongoDB) for Prometheus."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
 
 @app.route("/")
 def home():
@@ -91,6 +131,11 @@ def health_check():
         "database": "mongodb",
         "mongodb": "connected" if mongo_ok else "disconnected",
         "mongodb_detail": mongo_msg,
+        "mongodb_circuit": connection_status(),
+        "recommender": model_registry.status(),
+        "catalog": recommender_model.reload_status,
+        "write_behind": write_behind_stats(),
+        "mongo_pool": pool_stats(),
     }
 
 
@@ -117,26 +162,16 @@ def ai_recommend():
     if file.filename == "":
         return jsonify({"error": "No file selected"}), 400
     try:
-        if not os.path.exists("uploads"):
-            os.makedirs("uploads")
-        temp_path = os.path.join("uploads", file.filename)
-        file.save(temp_path)
-
-        from models.recommender_model import recommend as get_recommendations
-
-        rec_paths = get_recommendations(temp_path)
+        rec_results = get_recommendations(file.read())
 
         recommended_products = []
-        for abs_path in rec_paths:
+        for abs_path, _similarity in rec_results:
             filename = os.path.basename(abs_path)
             image_url = f"/static/dataset_images/{filename}"
             recommended_products.append(
                 {"name": "Recommended Style Item", "size": "M", "image": image_url}
             )
 
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
-
         return jsonify(
             {
                 "body_type": "Athletic",
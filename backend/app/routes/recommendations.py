@@ -1,10 +1,19 @@
 from flask import Blueprint, request, jsonify, session
-from models.recommender_model import recommend as get_recommendations
+from models.recommender_model import (
+    recommend_from_bytes as get_recommendations,
+    similar_items,
+    reload_catalog,
+    cache_stats,
+)
+from models.metadata import FILTER_COLUMNS
+from models.embedding_store import VERSION_PATTERN
 from app.database.mongodb import (
-    save_recommendation,
+    save_recommendations_bulk,
     get_recommendations as get_saved_recommendations,
 )
+from app.utils.metrics import span, trace
 import os
+import hmac
 
 bp = Blueprint("recommendations", __name__, url_prefix="/api/recommendations")
 
@@ -20,6 +29,32 @@ def get_user_id():
     return user.get("user_id") if user else None
 
 
+def parse_filters(form):
+    """
+    Attribute filters from the request form. Each of FILTER_COLUMNS may be
+    repeated or comma-separated (any value matches); year_min / year_max
+    bound the catalog year. Raises ValueError on a malformed year.
+    """
+    filters = {}
+    for name in FILTER_COLUMNS:
+        values = [
+            value.strip()
+            for raw in form.getlist(name)
+            for value in raw.split(",")
+            if value.strip()
+        ]
+        if values:
+            filters[name] = values
+    for name in ("year_min", "year_max"):
+        raw = form.get(name, "").strip()
+        if raw:
+            try:
+                filters[name] = int(raw)
+            except ValueError:
+                raise ValueError(f"{name} must be a year, got '{raw}'")
+    return filters
+
+
 @bp.route("/recommend", methods=["POST"])
 def recommend():
     print("Received recommendation request")
@@ -37,47 +72,83 @@ def recommend():
     print(f"User Gender: {user_gender}, User ID: {user_id}")
 
     try:
-        if not os.path.exists("uploads"):
-            os.makedirs("uploads")
-
-        temp_path = os.path.join("uploads", file.filename)
-        file.save(temp_path)
-
-        print(f"Calling recommend with gender: {user_gender}")
-        rec_results = get_recommendations(temp_path, user_gender)
-
-        results = []
-        for abs_path, similarity in rec_results:
-            filename = os.path.basename(abs_path)
-            image_url = f"/static/dataset_images/{filename}"
-
-            product_data = {"name": filename, "image": image_url}
-
-            results.append(
-                {"url": image_url, "similarity": round(float(similarity), 4)}
-            )
-
-            # Save to MongoDB if user is logged in
-            if user_id:
+        filters = parse_filters(request.form)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if filters:
+        print(f"Filters: {filters}")
+
+    with trace(f"/recommend ({user_gender}, {len(filters)} filters)"):
+        try:
+            # Decoded in memory: no temp file, no collisions between equal filenames
+            with span("recommend_stage_seconds", stage="read_upload"):
+                image_bytes = file.read()
+
+            print(f"Calling recommend with gender: {user_gender}")
+            with span("recommend_stage_seconds", stage="recommend"):
+                rec_results = get_recommendations(image_bytes, user_gender, filters=filters)
+
+            results = []
+            saved = []
+            for abs_path, similarity in rec_results:
+                filename = os.path.basename(abs_path)
+                image_url = f"/static/dataset_images/{filename}"
+
+                product_data = {"name": filename, "image": image_url}
+
+                results.append(
+                    {"url": image_url, "similarity": round(float(similarity), 4)}
+                )
+                saved.append((filename, product_data, float(similarity)))
+
+            # Save to MongoDB if user is logged in (one batch for all results)
+            if user_id and saved:
                 try:
-                    save_recommendation(
-                        user_id=user_id,
-                        product_id=filename,
-                        product_data=product_data,
-                        score=float(similarity),
-                        reason=f"Similar style for {user_gender}",
-                    )
+                    with span("recommend_stage_seconds", stage="save_recommendations"):
+                        save_recommendations_bulk(
+                            user_id, saved, reason=f"Similar style for {user_gender}"
+                        )
                 except Exception as db_err:
-                    print(f"Error saving recommendation to DB: {db_err}")
+                    print(f"Error saving recommendations to DB: {db_err}")
+
+            with span("recommend_stage_seconds", stage="serialize"):
+                response = jsonify({"recommended_images": results, "filters": filters})
+            return response, 200
 
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
+        except Exception as e:
+            print(f"Error in recommendation: {e}")
+            return jsonify({"error": str(e)}), 500
 
-        return jsonify({"recommended_images": results}), 200
 
+@bp.route("/similar/<int:item_id>", methods=["GET"])
+def similar(item_id):
+    """More like catalog item `item_id`, from the precomputed neighbour table."""
+    try:
+        top_k = int(request.args.get("k", 5))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+    if not 1 <= top_k <= 100:
+        return jsonify({"error": "k must be between 1 and 100"}), 400
+
+    try:
+        matches = similar_items(item_id, top_k)
     except Exception as e:
-        print(f"Error in recommendation: {e}")
+        print(f"Error finding similar items: {e}")
         return jsonify({"error": str(e)}), 500
+    if matches is None:
+        return jsonify({"error": f"Item {item_id} not found"}), 404
+
+    results = []
+    for path, similarity in matches:
+        filename = os.path.basename(path)
+        results.append(
+            {
+                "item_id": filename.split(".")[0],
+                "url": f"/static/dataset_images/{filename}",
+                "similarity": round(float(similarity), 4),
+            }
+        )
+    return jsonify({"item_id": item_id, "similar_items": results}), 200
 
 
 @bp.route("/history", methods=["GET"])
@@ -93,3 +164,39 @@ def get_recommendation_history():
     except Exception as e:
         print(f"Error getting recommendation history: {e}")
         return jsonify({"error": str(e)}), 500
+
+
+@bp.route("/stats", methods=["GET"])
+def get_recommender_stats():
+    """Query-cache hit/miss counters and micro-batching stats."""
+    return jsonify(cache_stats()), 200
+
+
+def is_admin_request():
+    """
+    Admin calls need the X-Admin-Token header to match RECOMMENDER_ADMIN_TOKEN.
+    The client address is not trusted (behind a local reverse proxy every
+    request comes from 127.0.0.1), so without a configured token admin
+    endpoints are disabled.
+    """
+    token = os.environ.get("RECOMMENDER_ADMIN_TOKEN")
+    if not token:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", ""), token)
+
+
+@bp.route("/reload", methods=["POST"])
+def reload_index():
+    """Load the current (or a given) embedding store version and swap it in."""
+    if not os.environ.get("RECOMMENDER_ADMIN_TOKEN"):
+        return jsonify({"error": "Not found"}), 404
+    if not is_admin_request():
+        return jsonify({"error": "Forbidden"}), 403
+
+    data = request.get_json(silent=True) or {}
+    version = data.get("version")
+    if version is not None and not (isinstance(version, str) and VERSION_PATTERN.fullmatch(version)):
+        return jsonify({"error": "version must look like v<YYYYmmdd-HHMMSS>-<hex>"}), 400
+    outcome, message = reload_catalog(version, force=bool(data.get("force")))
+    body = {"outcome": outcome, "message": message, "catalog": cache_stats()["catalog"]}
+    return jsonify(body), 500 if outcome == "failed" else 200
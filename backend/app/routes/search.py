@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session
 from ..database.mongodb import (
     get_products,
+    get_products_page,
     get_product_by_id,
     get_unique_categories,
     get_unique_brands,
@@ -25,6 +26,37 @@ def get_user_id():
     return user.get("user_id") if user else None
 
 
+def _page_args(params, default_limit=100):
+    """
+    Pagination options shared by the list endpoints, from a JSON body or the
+    query string: limit, page_token, fields (list or comma-separated), count.
+    The default limit is the old fixed cap, so clients that do not page get
+    the same results as before. Raises ValueError on a malformed limit.
+    """
+    try:
+        limit = int(params.get("limit") or default_limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+    count = params.get("count")
+    if isinstance(count, str):
+        count = count.lower() in ("1", "true", "yes")
+    return {
+        "limit": limit,
+        "page_token": params.get("page_token") or None,
+        "fields": params.get("fields") or None,
+        "with_count": bool(count),
+    }
+
+
+def _page_meta(page):
+    # The exact match count (count=1) gets its own key: "total" / "total_results"
+    # have always been the length of the returned list
+    meta = {"next_page_token": page["next_page_token"]}
+    if "total" in page:
+        meta["total_count"] = page["total"]
+    return meta
+
+
 def _get_match_reason(query, product):
     """Generate a reason for why the product matches the search query."""
     query_lower = query.lower()
@@ -56,31 +88,23 @@ def text_search():
             return jsonify({"error": "Search query is required"}), 400
 
         query = data["query"].lower()
+        try:
+            page_args = _page_args(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
-        products = get_products({"search_term": query})
+        # Relevance is scored and sorted in MongoDB, so pages come back
+        # already ranked and only `limit` documents leave the server
+        try:
+            page = get_products_page(
+                {"search_term": query}, score_term=query, **page_args
+            )
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
 
         results = []
-        for product in products:
-            name = product.get("name", "").lower()
-            desc = product.get("description", "").lower()
-            cat = product.get("category", "").lower()
-            brand = product.get("brand", "").lower()
-
-            name_match = query in name
-            desc_match = query in desc
-            cat_match = query in cat
-            brand_match = query in brand
-
-            score = 0.0
-            if name_match:
-                score += 0.4
-            if desc_match:
-                score += 0.2
-            if cat_match:
-                score += 0.25
-            if brand_match:
-                score += 0.15
-
+        for product in page["products"]:
+            score = product.pop("_score", 0.0)
             results.append(
                 {
                     "product": product,
@@ -89,13 +113,16 @@ def text_search():
                 }
             )
 
-        results.sort(key=lambda x: x["similarity_score"], reverse=True)
-
-        if user_id:
+        if user_id and not page_args["page_token"]:
             add_search_history(user_id, "text_search", query, len(results))
 
         return jsonify(
-            {"query": query, "results": results, "total_results": len(results)}
+            {
+                "query": query,
+                "results": results,
+                "total_results": len(results),
+                **_page_meta(page),
+            }
         ), 200
 
     except Exception as e:
@@ -253,20 +280,28 @@ def filtered_search():
         if data.get("search_term"):
             filters["search_term"] = data["search_term"]
 
-        products = get_products(filters)
+        try:
+            page = get_products_page(filters, **_page_args(data))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         results = [
             {"product": p, "similarity_score": 1.0, "match_reason": "Filter match"}
-            for p in products
+            for p in page["products"]
         ]
 
-        if user_id:
+        if user_id and not data.get("page_token"):
             search_query = (
                 f"filter_{data.get('category', 'all')}_{data.get('brand', 'all')}"
             )
             add_search_history(user_id, "filtered_search", search_query, len(results))
 
         return jsonify(
-            {"results": results, "total_results": len(results), "filters_applied": data}
+            {
+                "results": results,
+                "total_results": len(results),
+                "filters_applied": data,
+                **_page_meta(page),
+            }
         ), 200
 
     except Exception as e:
@@ -296,10 +331,17 @@ def get_brands():
 
 @bp.route("/all", methods=["GET"])
 def get_all_products():
-    """Get all products with optional pagination."""
+    """
+    Get all products, one page at a time: ?limit= (max 100), ?page_token=
+    from the previous response, ?fields=name,price and ?count=1 (adds the
+    number of all products as total_count; total is the page's length).
+    """
     try:
-        limit = request.args.get("limit", 100, type=int)
-        products = get_products(limit=limit)
-        return jsonify({"products": products, "total": len(products)}), 200
+        try:
+            page = get_products_page(**_page_args(request.args))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        products = page["products"]
+        return jsonify({"products": products, "total": len(products), **_page_meta(page)}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,199 @@
+"""
+Lightweight in-process metrics: counters, gauges and latency histograms,
+exported in the Prometheus text format at /metrics.
+
+    with span("recommend_stage_seconds", stage="cnn"):
+        ...
+
+    @timed("mongo_operation_seconds", operation="save_recommendation")
+    def save_recommendation(...): ...
+
+Spans opened while a trace() is active (one per request) are also
+collected into that trace, so a slow request can be logged with its
+per-stage breakdown (METRICS_SLOW_REQUEST_MS, default 1000; 0 disables).
+"""
+
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+# Seconds; covers sub-millisecond cache hits up to multi-second cold starts
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SLOW_REQUEST_MS = float(os.environ.get("METRICS_SLOW_REQUEST_MS", 1000))
+
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> float
+_gauges = {}  # (name, labels) -> float
+_histograms = {}  # (name, labels) -> Histogram
+_help = {}
+_local = threading.local()
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics)."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self):
+        total, result = 0, []
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def describe(name, help_text):
+    """HELP line shown for a metric in the Prometheus output."""
+    _help[name] = help_text
+
+
+def inc(name, amount=1.0, **labels):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + amount
+
+
+def set_gauge(name, value, **labels):
+    with _lock:
+        _gauges[_key(name, labels)] = float(value)
+
+
+def observe(name, value, **labels):
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = Histogram()
+        histogram.observe(value)
+
+
+@contextmanager
+def span(name, **labels):
+    """Time the block into histogram `name` (and the active trace, if any)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        observe(name, elapsed, **labels)
+        spans = getattr(_local, "spans", None)
+        if spans is not None:
+            label = ",".join(str(v) for v in labels.values()) or name
+            spans.append((label, elapsed))
+
+
+def timed(name, **labels):
+    """Decorator form of span()."""
+
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with span(name, **labels):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@contextmanager
+def trace(description):
+    """
+    Collect the spans of the current thread; logs the breakdown when the
+    block takes longer than METRICS_SLOW_REQUEST_MS.
+    """
+    previous = getattr(_local, "spans", None)
+    _local.spans = spans = []
+    start = time.perf_counter()
+    try:
+        yield spans
+    finally:
+        _local.spans = previous
+        elapsed_ms = 1000 * (time.perf_counter() - start)
+        if SLOW_REQUEST_MS and elapsed_ms > SLOW_REQUEST_MS:
+            breakdown = ", ".join(f"{label}={1000 * seconds:.1f}ms" for label, seconds in spans)
+            print(f"[WARNING] Slow request {description}: {elapsed_ms:.1f}ms ({breakdown})")
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (version 0.0.4)."""
+    with _lock:
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+        histograms = {
+            key: (h.cumulative(), h.count, h.sum) for key, h in _histograms.items()
+        }
+
+    lines = []
+    for kind, series in (("counter", counters), ("gauge", gauges)):
+        for name in sorted({name for name, _ in series}):
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+            for (metric, labels), value in sorted(series.items()):
+                if metric == name:
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for name in sorted({name for name, _ in histograms}):
+        if name in _help:
+            lines.append(f"# HELP {name} {_help[name]}")
+        lines.append(f"# TYPE {name} histogram")
+        for (metric, labels), (buckets, count, total) in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, cumulative in buckets:
+                lines.append(
+                    f"{name}_bucket{_format_labels(labels, [('le', _format_value(bound))])} {cumulative}"
+                )
+            lines.append(f"{name}_bucket{_format_labels(labels, [('le', '+Inf')])} {count}")
+            lines.append(f"{name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    """Drop every recorded value (tests / benchmarks)."""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _histograms.clear()
+
+
+describe("http_request_duration_seconds", "Flask request latency by endpoint")
+describe("recommend_stage_seconds", "Recommendation pipeline stage latency")
+describe("mongo_operation_seconds", "MongoDB operation latency")
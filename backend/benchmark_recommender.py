@@ -0,0 +1,348 @@
+"""
+Latency / throughput benchmark of the recommendation hot path.
+
+Builds synthetic embedding stores (clustered unit vectors plus a synthetic
+styles.csv) at several catalog sizes, synthesizes query JPEGs and measures:
+
+  per stage   decode, preprocess, cnn, filter, similarity, serialization
+  end to end  requests/sec and latency percentiles at several concurrency
+              levels (through recommend_from_bytes, so micro-batching and
+              caching behave as in the server)
+
+and writes a JSON report. Pass --baseline to compare with an earlier report
+and exit non-zero when a stage's p50 regressed by more than --tolerance.
+
+    python benchmark_recommender.py --sizes 10000,100000 --index exact,ivf
+    python benchmark_recommender.py --sizes 1000000 --dtype float16 --skip-cnn
+    python benchmark_recommender.py --baseline bench_old.json --output bench_new.json
+
+--skip-cnn replaces the ResNet50 forward pass by a random query vector, so
+the search path can be benchmarked on machines without TensorFlow weights.
+"""
+
+import os
+import sys
+import io
+import json
+import time
+import shutil
+import platform
+import tempfile
+import argparse
+import subprocess
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from models.embedding_store import save_store, open_store
+from models.ann_index import IVFIndex, INDEX_FILE
+from models.cnn_feature_extractor import preprocess_array, EXTRACTOR_CONFIG
+from models import recommender_model as rm
+
+GENDERS = ["Men", "Women", "Unisex", "Boys", "Girls"]
+ARTICLE_TYPES = ["Tshirts", "Shirts", "Jeans", "Watches", "Casual Shoes", "Kurtas", "Handbags", "Tops"]
+COLOURS = ["Black", "White", "Blue", "Red", "Green", "Grey", "Pink", "Brown"]
+SEASONS = ["Summer", "Fall", "Winter", "Spring"]
+USAGES = ["Casual", "Formal", "Sports", "Ethnic"]
+
+# Filters of decreasing selectivity, each query picks one in turn
+FILTERS = [
+    None,
+    {"articleType": ["Tshirts"]},
+    {"articleType": ["Jeans"], "baseColour": ["Blue"]},
+    {"season": ["Summer"], "usage": ["Casual"], "year_min": 2015},
+]
+
+
+# ----------------------------------------------------------------------------
+# Synthetic data
+# ----------------------------------------------------------------------------
+
+def synthetic_store(root, n_rows, dim, dtype, clusters=1000, seed=0, chunk=50000):
+    """
+    Clustered unit vectors (so ANN indexes behave as on real features),
+    generated chunk by chunk into a temporary memmap and saved as a store.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((min(clusters, n_rows), dim)).astype(np.float32)
+    tmp_path = os.path.join(root, "synthetic.npy")
+    matrix = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(n_rows, dim))
+    for start in range(0, n_rows, chunk):
+        stop = min(start + chunk, n_rows)
+        rows = centres[rng.integers(len(centres), size=stop - start)]
+        rows = rows + 0.5 * rng.standard_normal(rows.shape).astype(np.float32)
+        matrix[start:stop] = rows / np.linalg.norm(rows, axis=1, keepdims=True)
+    matrix.flush()
+
+    filenames = [f"{1000000 + row}.jpg" for row in range(n_rows)]
+    path = save_store(matrix, filenames, root=os.path.join(root, "store"), dtype=dtype,
+                      extractor=EXTRACTOR_CONFIG, normalized=True)
+    del matrix
+    os.remove(tmp_path)
+
+    styles_csv = os.path.join(root, "styles.csv")
+    with open(styles_csv, "w", encoding="utf-8") as f:
+        f.write("id,gender,masterCategory,subCategory,articleType,baseColour,season,year,usage,"
+                "productDisplayName\n")
+        for row in range(n_rows):
+            f.write(
+                f"{1000000 + row},{GENDERS[rng.integers(len(GENDERS))]},Apparel,Topwear,"
+                f"{ARTICLE_TYPES[rng.integers(len(ARTICLE_TYPES))]},"
+                f"{COLOURS[rng.integers(len(COLOURS))]},{SEASONS[rng.integers(len(SEASONS))]},"
+                f"{2010 + rng.integers(10)},{USAGES[rng.integers(len(USAGES))]},Item {row}\n"
+            )
+    return path, styles_csv
+
+
+def synthetic_images(count, size=(600, 800), seed=0):
+    """Distinct JPEG uploads (noise plus a few coloured blocks), so no query hits a cache."""
+    rng = np.random.default_rng(seed)
+    images = []
+    for _ in range(count):
+        pixels = rng.integers(0, 256, size=(size[1], size[0], 3), dtype=np.uint8)
+        for _ in range(4):
+            x, y = rng.integers(0, size[0] // 2), rng.integers(0, size[1] // 2)
+            pixels[y : y + size[1] // 3, x : x + size[0] // 3] = rng.integers(0, 256, 3)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels).save(buffer, format="JPEG", quality=90)
+        images.append(buffer.getvalue())
+    return images
+
+
+# ----------------------------------------------------------------------------
+# Measurements
+# ----------------------------------------------------------------------------
+
+def percentiles(samples):
+    if not samples:
+        return None
+    values = np.asarray(samples) * 1000.0
+    return {
+        "count": len(values),
+        "mean_ms": round(float(values.mean()), 3),
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+    }
+
+
+def serialize(matches):
+    """Same response shape as /api/recommendations/recommend."""
+    results = []
+    for path, similarity in matches:
+        filename = os.path.basename(path)
+        results.append({"url": f"/static/dataset_images/{filename}",
+                        "similarity": round(float(similarity), 4)})
+    return json.dumps({"recommended_images": results})
+
+
+def measure_stages(catalog, images, extractor, k, rng):
+    """Time every stage of one query separately, query by query."""
+    stages = {name: [] for name in ("decode", "preprocess", "cnn", "filter", "similarity",
+                                    "serialization")}
+    for i, data in enumerate(images):
+        filters = FILTERS[i % len(FILTERS)]
+        gender = GENDERS[i % 2] if i % 3 else None
+
+        start = time.perf_counter()
+        decoded = np.asarray(Image.open(io.BytesIO(data)).convert("RGB"))
+        stages["decode"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        array = preprocess_array(decoded)
+        stages["preprocess"].append(time.perf_counter() - start)
+
+        if extractor is not None:
+            start = time.perf_counter()
+            query = extractor.embed_batch(array[None])[0]
+            stages["cnn"].append(time.perf_counter() - start)
+        else:
+            query = rng.standard_normal(catalog.embeddings.shape[1]).astype(np.float32)
+
+        # Cold filter: the per-(gender, filters) row cache is cleared first
+        rm.filter_cache.clear()
+        start = time.perf_counter()
+        rows = rm._eligible_rows(catalog, gender, filters)
+        stages["filter"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        top_rows, similarities = rm._index_for(catalog, rows).search(query, k, rows)
+        stages["similarity"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        serialize([(catalog.filenames[r], s) for r, s in zip(top_rows, similarities)])
+        stages["serialization"].append(time.perf_counter() - start)
+    return {name: percentiles(samples) for name, samples in stages.items()}
+
+
+def measure_throughput(catalog, images, concurrency, k, use_cnn, seed=0):
+    """Requests/sec with `concurrency` client threads sharing the image list."""
+    rng = np.random.default_rng(seed)
+    queries = rng.standard_normal((len(images), catalog.embeddings.shape[1])).astype(np.float32)
+
+    def request(i):
+        start = time.perf_counter()
+        filters = FILTERS[i % len(FILTERS)]
+        if use_cnn:
+            matches = rm.recommend_from_bytes(images[i], None, k, filters)
+        else:
+            rm.preprocess_upload(images[i])
+            matches = rm._search(catalog, queries[i], None, k, filters)
+        serialize(matches)
+        return time.perf_counter() - start
+
+    rm.result_cache.clear()
+    rm.embedding_cache.clear()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        latencies = list(pool.map(request, range(len(images))))
+    elapsed = time.perf_counter() - start
+    return dict(
+        percentiles(latencies),
+        concurrency=concurrency,
+        requests_per_sec=round(len(images) / elapsed, 2),
+    )
+
+
+# ----------------------------------------------------------------------------
+# Report
+# ----------------------------------------------------------------------------
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        commit = None
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit or None,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(report, baseline, tolerance):
+    """Stage p50 regressions beyond tolerance, as readable strings."""
+    previous = {(r["rows"], r["index"]): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in report["results"]:
+        old = previous.get((result["rows"], result["index"]))
+        if old is None:
+            continue
+        for stage, stats in result["stages"].items():
+            old_stats = old["stages"].get(stage)
+            if not stats or not old_stats or old_stats["p50_ms"] <= 0:
+                continue
+            change = stats["p50_ms"] / old_stats["p50_ms"] - 1
+            if change > tolerance:
+                regressions.append(
+                    f"{result['rows']} rows / {result['index']} / {stage}: "
+                    f"p50 {old_stats['p50_ms']} -> {stats['p50_ms']} ms (+{100 * change:.0f}%)"
+                )
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the recommendation hot path")
+    parser.add_argument("--sizes", default="10000,100000,1000000",
+                        help="comma-separated catalog sizes")
+    parser.add_argument("--dim", type=int, default=2048)
+    parser.add_argument("--dtype", choices=("float32", "float16"), default="float32")
+    parser.add_argument("--index", default="exact,ivf", help="comma-separated RECOMMENDER_INDEX modes")
+    parser.add_argument("--nlist", type=int, default=0, help="IVF cells (default: 4 * sqrt(rows))")
+    parser.add_argument("--queries", type=int, default=200, help="queries per stage measurement")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated client threads")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--skip-cnn", action="store_true",
+                        help="use random query vectors instead of the ResNet50 forward pass")
+    parser.add_argument("--work-dir", default=None, help="where synthetic stores are written")
+    parser.add_argument("--keep", action="store_true", help="keep the synthetic stores")
+    parser.add_argument("--output", default="benchmark_report.json")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p50 slowdown per stage before failing (0.2 = 20%%)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+    modes = [mode.strip() for mode in args.index.split(",")]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="recommender-bench-")
+
+    extractor = None
+    if not args.skip_cnn:
+        from models.model_registry import get_extractor
+        extractor = get_extractor()
+        if args.dim != extractor.model.output_shape[-1]:
+            print(f"[WARNING] --dim {args.dim} differs from the CNN output; using --skip-cnn")
+            extractor = None
+    images = synthetic_images(args.queries)
+    rng = np.random.default_rng(0)
+
+    report = {"environment": environment(), "args": vars(args), "results": []}
+    try:
+        for n_rows in sizes:
+            size_dir = os.path.join(work_dir, str(n_rows))
+            os.makedirs(size_dir, exist_ok=True)
+            print(f"\nBuilding synthetic store: {n_rows} x {args.dim} {args.dtype}")
+            start = time.perf_counter()
+            path, styles_csv = synthetic_store(size_dir, n_rows, args.dim, args.dtype)
+            print(f"   built in {time.perf_counter() - start:.1f}s")
+            store = open_store(os.path.dirname(path), os.path.basename(path))
+
+            for mode in modes:
+                if mode == "ivf" and not os.path.exists(store.artifact_path(INDEX_FILE)):
+                    nlist = args.nlist or int(4 * np.sqrt(n_rows))
+                    IVFIndex.build(store.embeddings, nlist=nlist).save(store.artifact_path(INDEX_FILE))
+                os.environ["RECOMMENDER_INDEX"] = mode
+                catalog = rm.Catalog(store.embeddings, store.filenames, store.path, store,
+                                     styles_csv=styles_csv)
+                # Published like a hot reload, so recommend_from_bytes serves it
+                rm._catalog = catalog
+
+                print(f"[{n_rows} rows / {catalog.index.kind}] per-stage latency...")
+                result = {
+                    "rows": n_rows,
+                    "index": mode,
+                    "index_kind": catalog.index.kind,
+                    "dtype": args.dtype,
+                    "stages": measure_stages(catalog, images, extractor, args.k, rng),
+                    "throughput": [],
+                }
+                for level in levels:
+                    stats = measure_throughput(catalog, images, level, args.k, extractor is not None)
+                    result["throughput"].append(stats)
+                    print(f"   concurrency {level}: {stats['requests_per_sec']} req/s, "
+                          f"p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms")
+                for stage, stats in result["stages"].items():
+                    if stats:
+                        print(f"   {stage:>13}: p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms")
+                report["results"].append(result)
+    finally:
+        if not args.keep and not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n[SUCCESS] Report written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        if regressions:
+            print(f"[ERROR] {len(regressions)} stage(s) regressed beyond {100 * args.tolerance:.0f}%:")
+            for line in regressions:
+                print(f"   - {line}")
+            sys.exit(1)
+        print("[SUCCESS] No regressions against the baseline")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+"""
+Vector indexes used by the recommender.
+
+ExactIndex  - brute-force cosine scan over every catalog row (reference mode)
+IVFIndex    - inverted-file approximate nearest-neighbour index. A spherical
+              k-means coarse quantizer splits the catalog into `nlist` cells and
+              a query only scores the rows of its `nprobe` closest cells.
+              Raising nprobe trades latency for recall (nprobe == nlist is exact).
+
+The IVF index is saved as ann_index.npz inside the current embedding store
+version. Build / evaluate it from the command line:
+    python ann_index.py build --nlist 256
+    python ann_index.py eval --nprobe 16 --queries 200
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+try:
+    from models.embedding_store import open_store, store_exists, STORE_DIR
+except ImportError:
+    from embedding_store import open_store, store_exists, STORE_DIR
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INDEX_FILE = "ann_index.npz"
+
+INDEX_FORMAT_VERSION = 1
+DEFAULT_NPROBE = 16
+CHUNK_ROWS = 8192
+
+
+def row_norms(embeddings):
+    """L2 norm of every row, computed in chunks to avoid a full-size temporary."""
+    norms = np.empty(len(embeddings), dtype=np.float32)
+    for start in range(0, len(embeddings), CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start : start + CHUNK_ROWS], dtype=np.float32)
+        norms[start : start + len(chunk)] = np.linalg.norm(chunk, axis=1)
+    norms[norms == 0] = 1.0
+    return norms
+
+
+def similarity_scores(embeddings, query, rows=None):
+    """
+    Dot products of the selected rows with `query`, a (D,) vector or a
+    (D, B) matrix of B queries. float16 stores are up-cast chunk by chunk so
+    no float32 copy of the whole matrix is made.
+    """
+    if rows is not None:
+        return np.asarray(embeddings[rows], dtype=np.float32) @ query
+    if embeddings.dtype == np.float32:
+        return embeddings @ query
+    scores = np.empty((len(embeddings),) + query.shape[1:], dtype=np.float32)
+    for start in range(0, len(embeddings), CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start : start + CHUNK_ROWS], dtype=np.float32)
+        scores[start : start + len(chunk)] = chunk @ query
+    return scores
+
+
+def cosine_scores(embeddings, query, norms, rows=None):
+    """
+    similarity_scores() divided by the selected rows' norms, i.e. cosine
+    similarities for a unit-length query. norms=None: the rows are already
+    unit length (normalized store) and the division is skipped.
+    """
+    scores = similarity_scores(embeddings, query, rows)
+    if norms is None:
+        return scores
+    selected = norms if rows is None else norms[rows]
+    return scores / (selected if scores.ndim == 1 else selected[:, None])
+
+
+def _index_norms(embeddings, norms, normalized):
+    if norms is not None:
+        return norms
+    if normalized:
+        return np.ones(len(embeddings), dtype=np.float32)
+    return row_norms(embeddings)
+
+
+def top_k(scores, k):
+    """Positions of the k largest scores, best first, via partial selection."""
+    if k >= len(scores):
+        return np.argsort(scores)[::-1]
+    top = np.argpartition(scores, -k)[-k:]
+    return top[np.argsort(scores[top])[::-1]]
+
+
+def _normalize(vector):
+    vector = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class ExactIndex:
+    """Brute-force cosine similarity over the full embedding matrix."""
+
+    kind = "exact"
+
+    def __init__(self, embeddings, norms=None, normalized=False):
+        self.embeddings = embeddings
+        self.norms = _index_norms(embeddings, norms, normalized)
+        # Unit-length rows: scores are cosines without dividing by norms
+        self.normalized = normalized
+        self._divisor = None if normalized else self.norms
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def search(self, query, k, rows=None):
+        """
+        Return (row_indices, scores) of the k best rows, best match first.
+        rows: optional sorted array of eligible row indices (pre-filter).
+        """
+        query = _normalize(query)
+        scores = cosine_scores(self.embeddings, query, self._divisor, rows)
+        top = top_k(scores, k)
+        return (top if rows is None else rows[top]), scores[top]
+
+    def search_batch(self, queries, k, rows_list):
+        """
+        search() for B queries at once: a single (M, D) x (D, B) product is
+        shared by all queries, then each one selects its top k over its rows.
+        M is the union of the queries' eligible rows, so a batch of selective
+        filters never scans the whole catalog (every row if one is unfiltered).
+        """
+        queries = np.stack([_normalize(q) for q in queries], axis=1)
+        if any(rows is None for rows in rows_list):
+            union = None
+        else:
+            union = np.unique(np.concatenate(rows_list))
+        scores = cosine_scores(self.embeddings, queries, self._divisor, union)
+
+        results = []
+        for column, rows in enumerate(rows_list):
+            if rows is None:
+                query_scores = scores[:, column]
+                top = top_k(query_scores, k)
+                results.append((top, query_scores[top]))
+            else:
+                # Rows are sorted, so their positions in the union are a binary search
+                positions = rows if union is None else np.searchsorted(union, rows)
+                query_scores = scores[positions, column]
+                top = top_k(query_scores, k)
+                results.append((rows[top], query_scores[top]))
+        return results
+
+
+class IVFIndex:
+    """Inverted-file index with a spherical k-means coarse quantizer."""
+
+    kind = "ivf"
+
+    def __init__(self, embeddings, centroids, list_offsets, list_rows, norms=None,
+                 normalized=False):
+        self.embeddings = embeddings
+        self.norms = _index_norms(embeddings, norms, normalized)
+        self.normalized = normalized
+        self._divisor = None if normalized else self.norms
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_rows = list_rows
+        self.nprobe = DEFAULT_NPROBE
+
+        # Cell of every row, used to filter pre-selected candidate rows by cell
+        self.assign = np.empty(len(list_rows), dtype=np.int32)
+        self.assign[list_rows] = np.repeat(
+            np.arange(len(centroids), dtype=np.int32), np.diff(list_offsets)
+        )
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @property
+    def nlist(self):
+        return len(self.centroids)
+
+    @classmethod
+    def build(cls, embeddings, nlist=256, iterations=15, sample_size=50000, seed=0):
+        """Train the coarse quantizer on a sample and assign every row to a cell."""
+        rng = np.random.default_rng(seed)
+        norms = row_norms(embeddings)
+        n_rows = len(embeddings)
+        nlist = max(1, min(nlist, n_rows))
+
+        sample_rows = np.sort(rng.choice(n_rows, min(sample_size, n_rows), replace=False))
+        sample = np.asarray(embeddings[sample_rows], dtype=np.float32)
+        sample /= norms[sample_rows, None]
+
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty cells with random sample points so no cell is wasted
+            sums[empty] = sample[rng.choice(len(sample), int(empty.sum()))]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        return cls.from_centroids(embeddings, centroids.astype(np.float32), norms)
+
+    @classmethod
+    def from_centroids(cls, embeddings, centroids, norms=None):
+        """
+        Assign every row to an already trained quantizer. Used to fold a
+        changed catalog into an existing index without re-running k-means.
+        """
+        n_rows = len(embeddings)
+        nlist = len(centroids)
+        assign = np.empty(n_rows, dtype=np.int32)
+        for start in range(0, n_rows, CHUNK_ROWS):
+            chunk = np.asarray(embeddings[start : start + CHUNK_ROWS], dtype=np.float32)
+            assign[start : start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+
+        list_rows = np.argsort(assign, kind="stable").astype(np.int64)
+        counts = np.bincount(assign, minlength=nlist)
+        list_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        return cls(embeddings, centroids, list_offsets, list_rows, norms)
+
+    def save(self, path):
+        np.savez(
+            path,
+            version=INDEX_FORMAT_VERSION,
+            n_rows=len(self.embeddings),
+            dim=self.embeddings.shape[1],
+            centroids=self.centroids,
+            list_offsets=self.list_offsets,
+            list_rows=self.list_rows,
+        )
+
+    @staticmethod
+    def load_centroids(path):
+        with np.load(path) as data:
+            return data["centroids"]
+
+    @classmethod
+    def load(cls, embeddings, path, norms=None, normalized=False):
+        """Load a persisted index, refusing files built for a different catalog."""
+        with np.load(path) as data:
+            if int(data["version"]) != INDEX_FORMAT_VERSION:
+                raise ValueError(f"unsupported index version {int(data['version'])}")
+            if int(data["n_rows"]) != len(embeddings) or int(data["dim"]) != embeddings.shape[1]:
+                raise ValueError(
+                    f"index built for {int(data['n_rows'])}x{int(data['dim'])}, "
+                    f"embeddings are {embeddings.shape[0]}x{embeddings.shape[1]}"
+                )
+            return cls(
+                embeddings,
+                data["centroids"],
+                data["list_offsets"],
+                data["list_rows"],
+                norms,
+                normalized,
+            )
+
+    def _candidates(self, cells, rows):
+        if rows is None:
+            return np.concatenate(
+                [self.list_rows[self.list_offsets[c] : self.list_offsets[c + 1]] for c in cells]
+            )
+        probed = np.zeros(self.nlist, dtype=bool)
+        probed[cells] = True
+        return rows[probed[self.assign[rows]]]
+
+    def search(self, query, k, rows=None, nprobe=None):
+        """
+        Return (row_indices, scores) of the k best rows in the probed cells.
+        rows: optional sorted array of eligible row indices (pre-filter). When the
+        probed cells hold fewer than k eligible rows, nprobe is doubled until
+        they do (or every cell is probed), so exactly k results come back.
+        """
+        query = _normalize(query)
+        nprobe = min(nprobe or self.nprobe, self.nlist)
+        wanted = min(k, len(self.embeddings) if rows is None else len(rows))
+
+        cell_scores = self.centroids @ query
+        while True:
+            if nprobe < self.nlist:
+                cells = np.argpartition(cell_scores, -nprobe)[-nprobe:]
+            else:
+                cells = np.arange(self.nlist)
+            candidates = self._candidates(cells, rows)
+            if len(candidates) >= wanted or nprobe >= self.nlist:
+                break
+            nprobe = min(nprobe * 2, self.nlist)
+
+        scores = cosine_scores(self.embeddings, query, self._divisor, candidates)
+        top = top_k(scores, k)
+        return candidates[top], scores[top]
+
+    def search_batch(self, queries, k, rows_list):
+        """Each query probes its own cells, so batches are searched one by one."""
+        return [self.search(query, k, rows) for query, rows in zip(queries, rows_list)]
+
+
+def load_index(embeddings, mode=None, nprobe=None, artifact_dir=BASE_DIR, normalized=False):
+    """
+    Pick the search index for the recommender.
+    mode (RECOMMENDER_INDEX): "ivf" (default), "exact", a compressed
+    encoding "float16" / "int8" / "pq" (see quantization.py), or "reduced"
+    for the PCA / random-projection space (see dim_reduction.py).
+    Falls back to the exact index if the requested index is missing or stale.
+    normalized: rows are already unit length, so the norm scan and the
+    per-search division by norms are skipped.
+    """
+    mode = (mode or os.environ.get("RECOMMENDER_INDEX", "ivf")).lower()
+    norms = _index_norms(embeddings, None, normalized)
+
+    if mode == "ivf":
+        path = os.path.join(artifact_dir, INDEX_FILE)
+        if os.path.exists(path):
+            try:
+                index = IVFIndex.load(embeddings, path, norms, normalized)
+                index.nprobe = int(nprobe or os.environ.get("RECOMMENDER_NPROBE", DEFAULT_NPROBE))
+                print(f"[SUCCESS] IVF index loaded: nlist={index.nlist}, nprobe={index.nprobe}")
+                return index
+            except Exception as e:
+                print(f"[WARNING] Could not load IVF index, using exact search: {e}")
+        else:
+            print("[WARNING] IVF index not built, using exact search")
+
+    elif mode == "reduced":
+        try:
+            from models.dim_reduction import ReducedIndex, DEFAULT_RERANK
+        except ImportError:
+            from dim_reduction import ReducedIndex, DEFAULT_RERANK
+
+        try:
+            index = ReducedIndex.load(embeddings, artifact_dir, norms)
+            index.rerank = int(os.environ.get("RECOMMENDER_RERANK", DEFAULT_RERANK))
+            print(f"[SUCCESS] {index.kind} index loaded, rerank={index.rerank}")
+            return index
+        except Exception as e:
+            print(f"[WARNING] Could not load reduced index, using exact search: {e}")
+
+    elif mode != "exact":
+        try:
+            from models.quantization import QuantizedIndex, quantized_file, DEFAULT_RERANK
+        except ImportError:
+            from quantization import QuantizedIndex, quantized_file, DEFAULT_RERANK
+
+        path = os.path.join(artifact_dir, quantized_file(mode))
+        if os.path.exists(path):
+            try:
+                index = QuantizedIndex.load(embeddings, path, norms)
+                index.rerank = int(os.environ.get("RECOMMENDER_RERANK", DEFAULT_RERANK))
+                print(
+                    f"[SUCCESS] {mode} codes loaded: {index.memory_bytes() / 1e6:.1f} MB, "
+                    f"rerank={index.rerank}"
+                )
+                return index
+            except Exception as e:
+                print(f"[WARNING] Could not load {mode} codes, using exact search: {e}")
+        else:
+            print(f"[WARNING] {mode} codes not built, using exact search")
+
+    return ExactIndex(embeddings, norms, normalized)
+
+
+def recall_at_k(index, embeddings, k=5, queries=200, nprobe=None, seed=0):
+    """Measure recall@k of an approximate index against exact search, using catalog rows as queries."""
+    rng = np.random.default_rng(seed)
+    exact = ExactIndex(embeddings, index.norms, getattr(index, "normalized", False))
+    query_rows = rng.choice(len(embeddings), min(queries, len(embeddings)), replace=False)
+
+    hits = 0
+    exact_time = ann_time = 0.0
+    for row in query_rows:
+        query = np.asarray(embeddings[row], dtype=np.float32)
+
+        start = time.perf_counter()
+        truth, _ = exact.search(query, k)
+        exact_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        if nprobe:
+            found, _ = index.search(query, k, nprobe=nprobe)
+        else:
+            found, _ = index.search(query, k)
+        ann_time += time.perf_counter() - start
+
+        hits += len(set(truth.tolist()) & set(found.tolist()))
+
+    n = len(query_rows)
+    return {
+        "recall": hits / (n * k),
+        "exact_ms": 1000 * exact_time / n,
+        "ann_ms": 1000 * ann_time / n,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate the IVF index")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="train the index for the current store")
+    build.add_argument("--nlist", type=int, default=256)
+    build.add_argument("--iterations", type=int, default=15)
+
+    evaluate = sub.add_parser("eval", help="recall@k of the index vs exact search")
+    evaluate.add_argument("--nprobe", type=int, default=DEFAULT_NPROBE)
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args()
+    if not store_exists():
+        print(f"[ERROR] No embedding store at {STORE_DIR}")
+        return
+    store = open_store()
+    embeddings = store.embeddings
+    index_path = store.artifact_path(INDEX_FILE)
+    print(f"Store {store.version}: {embeddings.shape} {embeddings.dtype}")
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = IVFIndex.build(embeddings, nlist=args.nlist, iterations=args.iterations)
+        index.save(index_path)
+        print(f"[SUCCESS] IVF index built in {time.perf_counter() - start:.1f}s")
+        print(f"Saved to {index_path}")
+    else:
+        index = IVFIndex.load(embeddings, index_path)
+        stats = recall_at_k(index, embeddings, args.k, args.queries, args.nprobe)
+        print(f"recall@{args.k} (nprobe={args.nprobe}): {stats['recall']:.4f}")
+        print(f"exact: {stats['exact_ms']:.2f} ms/query, ivf: {stats['ann_ms']:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
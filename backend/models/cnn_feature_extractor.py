@@ -3,64 +3,134 @@ from tensorflow.keras.preprocessing import image
 from tensorflow.keras.layers import GlobalMaxPooling2D
 from tensorflow.keras.applications.resnet50 import ResNet50,preprocess_input
 import numpy as np
-from numpy.linalg import norm
+from io import BytesIO
+from PIL import Image
 import os
-from tqdm import tqdm
-import pickle
+import sys
+import hashlib
 
-model = ResNet50(weights='imagenet',include_top=False,input_shape=(224,224,3))
-model.trainable = False
+INPUT_SHAPE = (224,224,3)
 
-model = tensorflow.keras.Sequential([
-    model,
-    GlobalMaxPooling2D()
-])
+# The single definition of how catalog *and* query vectors are produced.
+# It is recorded in every embedding store header and checked when the
+# recommender loads a store, so the two sides can never silently diverge.
+EXTRACTOR_CONFIG = {
+    "backbone": "resnet50",
+    "weights": "imagenet",
+    "pooling": "max",
+    "normalization": "l2",
+    "input_size": list(INPUT_SHAPE[:2]),
+    "resize": "nearest",
+    "preprocessing": "resnet50.preprocess_input",
+}
 
-#print(model.summary())
 
-def extract_features(img_path,model):
-    img = image.load_img(img_path,target_size=(224,224))
+def build_model():
+    """ResNet50 backbone + GlobalMaxPooling2D (EXTRACTOR_CONFIG). Use model_registry in the server."""
+    base_model = ResNet50(weights='imagenet',include_top=False,input_shape=INPUT_SHAPE)
+    base_model.trainable = False
+
+    return tensorflow.keras.Sequential([
+        base_model,
+        GlobalMaxPooling2D()
+    ])
+
+
+def load_image(img_path):
+    """Load an image file as a preprocessed (224, 224, 3) float32 array."""
+    img = image.load_img(img_path,target_size=INPUT_SHAPE[:2])
     img_array = image.img_to_array(img)
-    expanded_img_array = np.expand_dims(img_array, axis=0)
-    preprocessed_img = preprocess_input(expanded_img_array)
-    result = model.predict(preprocessed_img).flatten()
-    normalized_result = result / norm(result)
+    return preprocess_input(img_array)
+
+
+def preprocess_array(img_array):
+    """
+    Preprocess an already decoded RGB image (H, W, 3) array, resizing it the
+    same way load_img does (nearest neighbour) when it isn't 224x224.
+    """
+    img_array = np.asarray(img_array)
+    if img_array.shape[:2] != INPUT_SHAPE[:2]:
+        img = Image.fromarray(img_array.astype(np.uint8)).convert('RGB')
+        img_array = np.asarray(img.resize(INPUT_SHAPE[1::-1], Image.NEAREST))
+    return preprocess_input(img_array.astype(np.float32))
+
+
+def load_image_bytes(data):
+    """Decode encoded image bytes (JPEG/PNG/...) in memory, no temp file needed."""
+    img = Image.open(BytesIO(data)).convert('RGB')
+    img = img.resize(INPUT_SHAPE[1::-1], Image.NEAREST)
+    return preprocess_input(np.asarray(img, dtype=np.float32))
+
+
+def preprocess_upload(data):
+    """Preprocessed array for encoded image bytes or a decoded RGB array."""
+    if isinstance(data, np.ndarray):
+        return preprocess_array(data)
+    return load_image_bytes(data)
+
+
+def weights_hash(model):
+    """Short SHA-256 over every weight tensor, identifying the exact weights in use."""
+    digest = hashlib.sha256()
+    for weight in model.get_weights():
+        digest.update(np.ascontiguousarray(weight).tobytes())
+    return digest.hexdigest()[:16]
+
+
+def config_mismatches(stored, current=None):
+    """
+    Keys whose values differ between a store's recorded extractor config and
+    the running one. weights_hash is only compared when both sides have it.
+    """
+    current = current or EXTRACTOR_CONFIG
+    mismatches = [key for key in EXTRACTOR_CONFIG if stored.get(key) != current.get(key)]
+    if stored.get("weights_hash") and current.get("weights_hash"):
+        if stored["weights_hash"] != current["weights_hash"]:
+            mismatches.append("weights_hash")
+    return mismatches
+
+
+class FeatureExtractor:
+    """
+    Wraps the Keras model in a compiled tf.function with a fixed input
+    signature. Calling it avoids the per-call setup of model.predict, which
+    dominates the latency of single-image requests.
+    """
+
+    def __init__(self, model=None):
+        self.model = model or build_model()
+        self.config = dict(EXTRACTOR_CONFIG, weights_hash=weights_hash(self.model))
+        self._infer = tensorflow.function(
+            lambda batch: self.model(batch, training=False),
+            input_signature=[tensorflow.TensorSpec((None,) + INPUT_SHAPE, tensorflow.float32)],
+        )
+
+    def embed_batch(self, batch):
+        """L2-normalized features for a (B, 224, 224, 3) preprocessed batch."""
+        features = self._infer(tensorflow.convert_to_tensor(batch, dtype=tensorflow.float32)).numpy()
+        norms = np.linalg.norm(features, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return features / norms
+
+    def extract(self, img_path):
+        """L2-normalized features for one image file."""
+        return self.embed_batch(load_image(img_path)[None])[0]
+
+    def extract_bytes(self, data):
+        """L2-normalized features for encoded image bytes or a decoded RGB array."""
+        return self.embed_batch(preprocess_upload(data)[None])[0]
+
+    def warm_up(self):
+        """Trace the graph once so the first real request doesn't pay for it."""
+        self.embed_batch(np.zeros((1,) + INPUT_SHAPE, dtype=np.float32))
 
-    return normalized_result
 
 if __name__ == "__main__":
-    # Define base paths
+    # Catalog embeddings are produced by generate_embeddings.py with this same
+    # extractor; default to the dataset the server serves images from.
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
     PROJECT_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
     images_path = os.path.join(PROJECT_ROOT, 'data', 'datasets', 'images')
 
-    filenames = []
-
-    if os.path.exists(images_path):
-        for file in os.listdir(images_path):
-            if file.lower().endswith(('.png', '.jpg', '.jpeg')):
-                filenames.append(os.path.join(images_path,file))
-    else:
-        print(f"Error: Image directory not found at {images_path}")
-        exit(1)
-
-    # Limit to first 1000 images for speed, remove suffix if you want all
-    filenames = filenames[:44400]
-
-    feature_list = []
-
-    print(f"Extracting features for {len(filenames)} images...")
-    for file in tqdm(filenames):
-        try:
-            feature_list.append(extract_features(file,model))
-        except Exception as e:
-            print(f"Error processing {file}: {e}")
-
-    # Save to the current directory (backend/models)
-    with open(os.path.join(BASE_DIR, 'embeddings.pkl'), 'wb') as f:
-        pickle.dump(feature_list, f)
-    with open(os.path.join(BASE_DIR, 'filenames.pkl'), 'wb') as f:
-        pickle.dump(filenames, f)
-    print(f"Features extracted for {len(feature_list)} images.")
-    print(f"Saved to {os.path.join(BASE_DIR, 'embeddings.pkl')}")
-    print(f"Saved to {os.path.join(BASE_DIR, 'filenames.pkl')}")
\ No newline at end of file
+    import generate_embeddings
+    generate_embeddings.main(['--dataset', images_path] + sys.argv[1:])
@@ -0,0 +1,200 @@
+"""
+Dimensionality reduction for ResNet50 features.
+
+The 2048-d pooled features are far more than similarity needs. A reducer is
+fitted once over the catalog, the reduced (and re-normalized) catalog is
+stored next to the embedding store version, and queries are projected with
+the same reducer before searching:
+
+  pca - principal components of the normalized catalog, optionally whitened
+  rp  - Gaussian random projection (no training, distances preserved in
+        expectation)
+
+ReducedIndex scans the reduced matrix and, by default, re-ranks the best
+candidates against the full-dimension store so returned scores stay exact.
+
+    python dim_reduction.py fit --method pca --dim 256 --whiten
+    python dim_reduction.py eval --rerank 0      # reduced-only recall
+    python dim_reduction.py eval --rerank 100    # with full-dim re-rank
+"""
+
+import os
+import time
+import argparse
+import numpy as np
+
+try:
+    from models.ann_index import row_norms, top_k, similarity_scores, recall_at_k, CHUNK_ROWS
+    from models.ann_index import _normalize
+    from models.embedding_store import open_store, store_exists, STORE_DIR
+except ImportError:
+    from ann_index import row_norms, top_k, similarity_scores, recall_at_k, CHUNK_ROWS
+    from ann_index import _normalize
+    from embedding_store import open_store, store_exists, STORE_DIR
+
+REDUCER_FILE = "reducer.npz"
+REDUCED_EMBEDDINGS_FILE = "embeddings_reduced.npy"
+METHODS = ("pca", "rp")
+DEFAULT_RERANK = 100
+
+
+class Reducer:
+    """Affine projection x -> ((x - mean) @ components.T) / scale."""
+
+    def __init__(self, method, mean, components, scale):
+        self.method = method
+        self.mean = mean.astype(np.float32)
+        self.components = components.astype(np.float32)
+        self.scale = scale.astype(np.float32)
+
+    @property
+    def dim(self):
+        return self.components.shape[0]
+
+    @classmethod
+    def fit_pca(cls, sample, dim, whiten=False):
+        mean = sample.mean(axis=0)
+        # Eigen-decomposition of the D x D covariance is cheaper than an SVD of the sample
+        covariance = np.cov(sample - mean, rowvar=False)
+        eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+        order = np.argsort(eigenvalues)[::-1][:dim]
+        components = eigenvectors[:, order].T
+        scale = np.sqrt(np.maximum(eigenvalues[order], 1e-12)) if whiten else np.ones(dim)
+        explained = eigenvalues[order].sum() / eigenvalues.sum()
+        print(f"PCA: {dim} components explain {100 * explained:.1f}% of the variance")
+        return cls("pca-whiten" if whiten else "pca", mean, components, scale)
+
+    @classmethod
+    def random_projection(cls, input_dim, dim, seed=0):
+        rng = np.random.default_rng(seed)
+        components = rng.standard_normal((dim, input_dim)) / np.sqrt(dim)
+        return cls("rp", np.zeros(input_dim), components, np.ones(dim))
+
+    def transform(self, vectors):
+        """Project (..., D) vectors and L2-normalize the result."""
+        reduced = ((np.asarray(vectors, dtype=np.float32) - self.mean) @ self.components.T) / self.scale
+        norms = np.linalg.norm(reduced, axis=-1, keepdims=True)
+        return reduced / np.where(norms > 0, norms, 1.0)
+
+    def save(self, path):
+        np.savez(path, method=self.method, mean=self.mean, components=self.components,
+                 scale=self.scale)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(str(data["method"]), data["mean"], data["components"], data["scale"])
+
+
+def reduce_catalog(embeddings, reducer, path):
+    """Write the reduced, normalized catalog as a .npy next to the store."""
+    norms = row_norms(embeddings)
+    reduced = np.lib.format.open_memmap(
+        path, mode="w+", dtype=np.float32, shape=(len(embeddings), reducer.dim)
+    )
+    for start in range(0, len(embeddings), CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start : start + CHUNK_ROWS], dtype=np.float32)
+        reduced[start : start + len(chunk)] = reducer.transform(chunk / norms[start : start + len(chunk), None])
+    reduced.flush()
+    del reduced
+
+
+class ReducedIndex:
+    """Exact scan in the reduced space, optional exact re-rank in full dimension."""
+
+    def __init__(self, embeddings, reduced, reducer, norms=None):
+        self.embeddings = embeddings
+        self.reduced = reduced
+        self.reducer = reducer
+        self.norms = row_norms(embeddings) if norms is None else norms
+        self.rerank = DEFAULT_RERANK
+
+    @property
+    def kind(self):
+        return f"reduced-{self.reducer.method}-{self.reducer.dim}"
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @classmethod
+    def load(cls, embeddings, artifact_dir, norms=None):
+        reducer = Reducer.load(os.path.join(artifact_dir, REDUCER_FILE))
+        reduced = np.load(os.path.join(artifact_dir, REDUCED_EMBEDDINGS_FILE), mmap_mode="r")
+        if len(reduced) != len(embeddings):
+            raise ValueError(f"reduced catalog has {len(reduced)} rows, store has {len(embeddings)}")
+        return cls(embeddings, reduced, reducer, norms)
+
+    def _finish(self, query, reduced_scores, k, rows):
+        if not self.rerank:
+            top = top_k(reduced_scores, k)
+            return (top if rows is None else rows[top]), reduced_scores[top]
+
+        shortlist = top_k(reduced_scores, max(k, self.rerank))
+        candidates = np.sort(shortlist if rows is None else rows[shortlist])
+        exact = similarity_scores(self.embeddings, query, candidates) / self.norms[candidates]
+        top = top_k(exact, k)
+        return candidates[top], exact[top]
+
+    def search(self, query, k, rows=None):
+        query = _normalize(query)
+        projected = self.reducer.transform(query)
+        return self._finish(query, similarity_scores(self.reduced, projected, rows), k, rows)
+
+    def search_batch(self, queries, k, rows_list):
+        """One (N, d) x (d, B) product in the reduced space for the whole batch."""
+        queries = np.stack([_normalize(q) for q in queries])
+        scores = similarity_scores(self.reduced, self.reducer.transform(queries).T)
+        return [
+            self._finish(query, scores[:, column] if rows is None else scores[rows, column], k, rows)
+            for column, (query, rows) in enumerate(zip(queries, rows_list))
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit or evaluate a dimensionality reducer")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    fit = sub.add_parser("fit", help="fit on the current store and reduce the catalog")
+    fit.add_argument("--method", choices=METHODS, default="pca")
+    fit.add_argument("--dim", type=int, default=256)
+    fit.add_argument("--whiten", action="store_true", help="PCA whitening")
+    fit.add_argument("--sample", type=int, default=50000, help="rows used to fit PCA")
+
+    evaluate = sub.add_parser("eval", help="recall@k vs the full-dimension baseline")
+    evaluate.add_argument("--rerank", type=int, default=DEFAULT_RERANK)
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args()
+    if not store_exists():
+        print(f"[ERROR] No embedding store at {STORE_DIR}")
+        return
+    store = open_store()
+    embeddings = store.embeddings
+
+    if args.command == "fit":
+        start = time.perf_counter()
+        if args.method == "pca":
+            norms = row_norms(embeddings)
+            rng = np.random.default_rng(0)
+            rows = np.sort(rng.choice(len(embeddings), min(args.sample, len(embeddings)), replace=False))
+            sample = np.asarray(embeddings[rows], dtype=np.float32) / norms[rows, None]
+            reducer = Reducer.fit_pca(sample, args.dim, args.whiten)
+        else:
+            reducer = Reducer.random_projection(embeddings.shape[1], args.dim)
+        reducer.save(store.artifact_path(REDUCER_FILE))
+        reduce_catalog(embeddings, reducer, store.artifact_path(REDUCED_EMBEDDINGS_FILE))
+        print(f"[SUCCESS] {reducer.method} reducer {embeddings.shape[1]} -> {reducer.dim} dims "
+              f"in {time.perf_counter() - start:.1f}s")
+        print(f"Saved to {store.path}")
+    else:
+        index = ReducedIndex.load(embeddings, store.path)
+        index.rerank = args.rerank
+        stats = recall_at_k(index, embeddings, args.k, args.queries)
+        print(f"recall@{args.k} ({index.kind}, rerank={args.rerank}): {stats['recall']:.4f}")
+        print(f"full {embeddings.shape[1]}-d: {stats['exact_ms']:.2f} ms/query, "
+              f"reduced: {stats['ann_ms']:.2f} ms/query")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+"""
+Versioned, memory-mapped embedding store.
+
+Replaces embeddings.pkl / filenames.pkl. Layout on disk:
+
+    embedding_store/
+        CURRENT                  name of the active version
+        v20240101-120000-ab12/
+            header.json          format version, dtype, shape, creation time,
+                                 extractor config and whether rows are L2-normalized
+            embeddings.npy       (N, D) float32 or float16 matrix
+            filenames.json       image path of every row
+            ids.npy              product id of every row (-1 if unknown)
+            fingerprints.npy     optional (size, mtime_ns) of every source image,
+                                 used by incremental embedding generation
+
+The matrix is opened with np.load(mmap_mode="r"), so every worker process
+shares the same pages through the OS page cache and startup does no copying.
+A new version is written to a temporary directory, renamed into place and
+only then published through CURRENT, so readers never see a partial store.
+
+Convert existing pickles:
+    python embedding_store.py migrate [--dtype float16]
+    python embedding_store.py info
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import pickle
+import argparse
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(BASE_DIR, "embedding_store")
+LEGACY_EMBEDDINGS_PATH = os.path.join(BASE_DIR, "embeddings.pkl")
+LEGACY_FILENAMES_PATH = os.path.join(BASE_DIR, "filenames.pkl")
+
+STORE_FORMAT_VERSION = 1
+SUPPORTED_DTYPES = ("float32", "float16")
+CURRENT_FILE = "CURRENT"
+HEADER_FILE = "header.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+FILENAMES_FILE = "filenames.json"
+IDS_FILE = "ids.npy"
+FINGERPRINTS_FILE = "fingerprints.npy"
+VERSION_PATTERN = re.compile(r"v\d{8}-\d{6}-[0-9a-f]+")
+
+
+class EmbeddingStore:
+    """One opened version of the store."""
+
+    def __init__(self, path, header, embeddings, filenames, ids, fingerprints=None):
+        self.path = path
+        self.header = header
+        self.embeddings = embeddings
+        self.filenames = filenames
+        self.ids = ids
+        self.fingerprints = fingerprints
+
+    def __len__(self):
+        return len(self.filenames)
+
+    @property
+    def version(self):
+        return self.header["version"]
+
+    def artifact_path(self, name):
+        """Path of a derived file (index, caches...) kept next to this version."""
+        return os.path.join(self.path, name)
+
+
+def id_from_path(path):
+    """Product id encoded in an image filename ("15970.jpg" -> 15970), -1 if none."""
+    try:
+        return int(os.path.basename(path).split(".")[0])
+    except ValueError:
+        return -1
+
+
+def store_exists(root=STORE_DIR):
+    return os.path.exists(os.path.join(root, CURRENT_FILE))
+
+
+def current_version(root=STORE_DIR):
+    with open(os.path.join(root, CURRENT_FILE), "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def _new_version_name():
+    return f"v{time.strftime('%Y%m%d-%H%M%S')}-{os.urandom(2).hex()}"
+
+
+def save_store(embeddings, filenames, root=STORE_DIR, dtype="float32", keep=2,
+               fingerprints=None, extractor=None, normalized=False):
+    """
+    Write a new store version and make it current.
+    fingerprints: optional (N, 2) int array of (size, mtime_ns) per source image.
+    extractor: config of the feature extractor that produced the rows (see
+    cnn_feature_extractor.EXTRACTOR_CONFIG); normalized: rows are unit length.
+    Returns the path of the new version directory.
+    """
+    if dtype not in SUPPORTED_DTYPES:
+        raise ValueError(f"dtype must be one of {SUPPORTED_DTYPES}, got {dtype}")
+
+    embeddings = np.asarray(embeddings)
+    if embeddings.ndim != 2 or len(embeddings) != len(filenames):
+        raise ValueError(
+            f"expected ({len(filenames)}, D) embeddings, got shape {embeddings.shape}"
+        )
+
+    os.makedirs(root, exist_ok=True)
+    version = _new_version_name()
+    tmp_dir = os.path.join(root, f".tmp-{version}")
+    final_dir = os.path.join(root, version)
+    os.makedirs(tmp_dir)
+
+    try:
+        np.save(os.path.join(tmp_dir, EMBEDDINGS_FILE), embeddings.astype(dtype, copy=False))
+        np.save(
+            os.path.join(tmp_dir, IDS_FILE),
+            np.array([id_from_path(p) for p in filenames], dtype=np.int64),
+        )
+        with open(os.path.join(tmp_dir, FILENAMES_FILE), "w", encoding="utf-8") as f:
+            json.dump(list(filenames), f)
+        if fingerprints is not None:
+            np.save(
+                os.path.join(tmp_dir, FINGERPRINTS_FILE),
+                np.asarray(fingerprints, dtype=np.int64).reshape(len(filenames), 2),
+            )
+
+        header = {
+            "format_version": STORE_FORMAT_VERSION,
+            "version": version,
+            "dtype": dtype,
+            "count": int(embeddings.shape[0]),
+            "dim": int(embeddings.shape[1]),
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            # Orders versions for pruning (directory mtimes change on copy/touch)
+            "created_ns": time.time_ns(),
+            "normalized": bool(normalized),
+        }
+        if extractor is not None:
+            header["extractor"] = dict(extractor)
+        # Header last: a directory without one is never treated as a store
+        with open(os.path.join(tmp_dir, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f, indent=2)
+
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _publish(root, version)
+    _prune(root, keep)
+    return final_dir
+
+
+def _publish(root, version):
+    tmp_current = os.path.join(root, f".{CURRENT_FILE}.tmp")
+    with open(tmp_current, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_current, os.path.join(root, CURRENT_FILE))
+
+
+def _version_age_key(root, name):
+    """
+    Creation order of a version: created_ns from its header, else the
+    timestamp in its name (v<YYYYmmdd-HHMMSS>-<hex>). None if it has no header.
+    """
+    try:
+        with open(os.path.join(root, name, HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+    except (OSError, ValueError):
+        return None
+    created_ns = header.get("created_ns")
+    if created_ns is None:
+        try:
+            created_ns = int(time.mktime(time.strptime(name[1:16], "%Y%m%d-%H%M%S"))) * 10**9
+        except ValueError:
+            created_ns = 0
+    return created_ns, name
+
+
+def _prune(root, keep):
+    """Remove all but the newest `keep` versions (never the current one)."""
+    if not keep:
+        return
+    current = current_version(root)
+    keys = {
+        name: _version_age_key(root, name)
+        for name in os.listdir(root)
+        if name.startswith("v") and os.path.isdir(os.path.join(root, name))
+    }
+    versions = sorted((name for name, key in keys.items() if key is not None), key=keys.get)
+    for name in versions[:-keep]:
+        if name != current:
+            # Workers still mapping old files keep them alive until they unmap
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def version_path(root, version):
+    """
+    Directory of store `version` under `root`. Raises ValueError unless the
+    name is a version name (no separators, so never a path outside `root`)
+    of an existing version with a header.
+    """
+    if not isinstance(version, str) or not VERSION_PATTERN.fullmatch(version):
+        raise ValueError(f"invalid store version {version!r}")
+    path = os.path.join(root, version)
+    if not os.path.isfile(os.path.join(path, HEADER_FILE)):
+        raise ValueError(f"no store version {version}")
+    return path
+
+
+def open_store(root=STORE_DIR, version=None, mmap=True):
+    """Open a store version (the current one by default)."""
+    version = version or current_version(root)
+    path = version_path(root, version)
+
+    with open(os.path.join(path, HEADER_FILE), "r", encoding="utf-8") as f:
+        header = json.load(f)
+    if header.get("format_version") != STORE_FORMAT_VERSION:
+        raise ValueError(f"unsupported store format {header.get('format_version')}")
+
+    embeddings = np.load(os.path.join(path, EMBEDDINGS_FILE), mmap_mode="r" if mmap else None)
+    with open(os.path.join(path, FILENAMES_FILE), "r", encoding="utf-8") as f:
+        filenames = json.load(f)
+    ids = np.load(os.path.join(path, IDS_FILE))
+    fingerprints_path = os.path.join(path, FINGERPRINTS_FILE)
+    fingerprints = np.load(fingerprints_path) if os.path.exists(fingerprints_path) else None
+
+    if embeddings.shape != (header["count"], header["dim"]) or len(filenames) != header["count"]:
+        raise ValueError(
+            f"store {version} is inconsistent: header says "
+            f"{header['count']}x{header['dim']}, matrix is {embeddings.shape}, "
+            f"{len(filenames)} filenames"
+        )
+    return EmbeddingStore(path, header, embeddings, filenames, ids, fingerprints)
+
+
+def migrate_from_pickle(
+    embeddings_path=LEGACY_EMBEDDINGS_PATH,
+    filenames_path=LEGACY_FILENAMES_PATH,
+    root=STORE_DIR,
+    dtype="float32",
+):
+    """Convert embeddings.pkl / filenames.pkl into a new store version."""
+    with open(embeddings_path, "rb") as f:
+        embeddings = np.asarray(pickle.load(f), dtype=np.float32)
+    with open(filenames_path, "rb") as f:
+        filenames = pickle.load(f)
+    return save_store(embeddings, filenames, root=root, dtype=dtype)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the embedding store")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    migrate = sub.add_parser("migrate", help="convert embeddings.pkl/filenames.pkl")
+    migrate.add_argument("--dtype", choices=SUPPORTED_DTYPES, default="float32")
+    sub.add_parser("info", help="describe the current store version")
+
+    args = parser.parse_args()
+
+    if args.command == "migrate":
+        path = migrate_from_pickle(dtype=args.dtype)
+        print(f"[SUCCESS] Store written to {path}")
+    else:
+        if not store_exists():
+            print(f"[ERROR] No embedding store at {STORE_DIR}")
+            return
+        store = open_store()
+        print(json.dumps(store.header, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,23 @@
 """
 Generate embeddings from Myntra dataset using ResNet50 CNN feature extractor
-Saves embeddings.pkl and filenames.pkl for recommendation system
+Saves a new version of the memory-mapped embedding store (see embedding_store.py)
+
+Uses the same extractor as the server (cnn_feature_extractor.FeatureExtractor),
+stores L2-normalized rows and records the extractor config in the store header.
 """
 
 import os
 import sys
-import pickle
+import json
+import time
+import shutil
+import queue
+import hashlib
+import argparse
+import multiprocessing
 import numpy as np
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from tqdm import tqdm
 
@@ -15,45 +26,33 @@ sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # TensorFlow imports
 import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow.keras.models import Model
+
+from cnn_feature_extractor import FeatureExtractor, load_image, EXTRACTOR_CONFIG, config_mismatches
+from embedding_store import save_store, open_store, store_exists, STORE_DIR
+from ann_index import IVFIndex, INDEX_FILE
 
 # Configuration
 DATASET_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'myntradataset', 'images')
-OUTPUT_DIR = os.path.dirname(__file__)
-EMBEDDINGS_FILE = os.path.join(OUTPUT_DIR, 'embeddings.pkl')
-FILENAMES_FILE = os.path.join(OUTPUT_DIR, 'filenames.pkl')
+STORE_DTYPE = os.environ.get('EMBEDDING_STORE_DTYPE', 'float32')
+SHARD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'embedding_shards')
+SHARD_SIZE = 2048
 
-IMAGE_SIZE = (224, 224)
 BATCH_SIZE = 32
+LOADER_THREADS = min(8, os.cpu_count() or 1)
+PREFETCH_BATCHES = 4
 
 def build_feature_extractor():
-    """Build ResNet50 model for feature extraction"""
+    """Build the shared ResNet50 feature extractor"""
     print("Loading ResNet50 model...")
-    
-    # Load pretrained ResNet50
-    base_model = ResNet50(weights='imagenet', include_top=False)
-    
-    # Add global average pooling
-    inputs = tf.keras.Input(shape=(224, 224, 3))
-    x = preprocess_input(inputs)
-    x = base_model(x, training=False)
-    outputs = GlobalAveragePooling2D()(x)
-    
-    model = Model(inputs, outputs)
-    return model
+    extractor = FeatureExtractor()
+    print(f"Extractor config: {extractor.config}")
+    return extractor
 
 
 def load_and_preprocess_image(img_path):
-    """Load and preprocess image for ResNet50"""
+    """Load and preprocess image for ResNet50 (preprocessing happens exactly once)"""
     try:
-        img = image.load_img(img_path, target_size=IMAGE_SIZE)
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        return img_array
+        return load_image(img_path)
     except Exception as e:
         print(f"Error loading image {img_path}: {e}")
         return None
@@ -85,83 +84,461 @@ def get_valid_images(dataset_path):
     return sorted(image_files)
 
 
-def generate_embeddings(model, image_paths):
-    """Generate embeddings for all images"""
+def iter_image_batches(image_paths, batch_size=BATCH_SIZE, loader_threads=LOADER_THREADS,
+                       prefetch=PREFETCH_BATCHES):
+    """
+    Yield (paths, batch, failed_paths) for consecutive chunks of image_paths.
+    Images are decoded and resized in a thread pool that keeps `prefetch`
+    batches in flight, so loading overlaps with inference on the current batch.
+    """
+    chunks = [image_paths[i:i + batch_size] for i in range(0, len(image_paths), batch_size)]
+    pending = deque()
+
+    with ThreadPoolExecutor(max_workers=loader_threads) as pool:
+        def submit(chunk):
+            pending.append((chunk, [pool.submit(load_and_preprocess_image, p) for p in chunk]))
+
+        for chunk in chunks[:prefetch]:
+            submit(chunk)
+        next_chunk = prefetch
+
+        while pending:
+            chunk, futures = pending.popleft()
+            if next_chunk < len(chunks):
+                submit(chunks[next_chunk])
+                next_chunk += 1
+
+            paths, arrays, failed = [], [], []
+            for img_path, future in zip(chunk, futures):
+                img_array = future.result()
+                if img_array is None:
+                    failed.append(img_path)
+                else:
+                    paths.append(img_path)
+                    arrays.append(img_array)
+
+            batch = np.stack(arrays) if arrays else None
+            yield paths, batch, failed
+
+
+def predict_batch(extractor, batch, batch_size=BATCH_SIZE):
+    """Run one forward pass; short batches are zero-padded to a fixed shape."""
+    n = len(batch)
+    if n < batch_size:
+        padding = np.zeros((batch_size - n,) + batch.shape[1:], dtype=batch.dtype)
+        batch = np.concatenate([batch, padding])
+    return extractor.embed_batch(batch)[:n]
+
+
+def generate_embeddings(extractor, image_paths, batch_size=BATCH_SIZE,
+                        loader_threads=LOADER_THREADS, prefetch=PREFETCH_BATCHES, verbose=True):
+    """Generate embeddings for all images in fixed-size batches"""
     embeddings = []
     filenames = []
     failed_images = []
     
-    print(f"\nGenerating embeddings for {len(image_paths)} images...")
+    if verbose:
+        print(f"\nGenerating embeddings for {len(image_paths)} images "
+              f"(batch size {batch_size}, {loader_threads} loader threads)...")
+    start = time.perf_counter()
     
-    for img_path in tqdm(image_paths, desc="Extracting features"):
-        img_array = load_and_preprocess_image(img_path)
-        
-        if img_array is None:
-            failed_images.append(img_path)
-            continue
-        
-        try:
-            # Extract features
-            features = model.predict(img_array, verbose=0)
-            embeddings.append(features.flatten())
-            filenames.append(os.path.basename(img_path))
-        except Exception as e:
-            print(f"Error extracting features for {img_path}: {e}")
-            failed_images.append(img_path)
+    batches = iter_image_batches(image_paths, batch_size, loader_threads, prefetch)
+    with tqdm(total=len(image_paths), desc="Extracting features", disable=not verbose) as progress:
+        for paths, batch, failed in batches:
+            failed_images.extend(failed)
+            
+            if batch is not None:
+                try:
+                    # Extract features
+                    embeddings.append(predict_batch(extractor, batch, batch_size))
+                    filenames.extend(os.path.basename(p) for p in paths)
+                except Exception as e:
+                    print(f"Error extracting features for batch starting {paths[0]}: {e}")
+                    failed_images.extend(paths)
+            
+            progress.update(len(paths) + len(failed))
+    
+    elapsed = time.perf_counter() - start
+    embeddings = np.concatenate(embeddings) if embeddings else np.empty((0, 0), np.float32)
     
     # Report statistics
-    print(f"\n[SUCCESS] Successfully processed: {len(embeddings)} images")
-    if failed_images:
-        print(f"[WARNING] Failed to process: {len(failed_images)} images")
+    if verbose:
+        print(f"\n[SUCCESS] Successfully processed: {len(embeddings)} images")
+        if failed_images:
+            print(f"[WARNING] Failed to process: {len(failed_images)} images")
+        print(f"Throughput: {len(embeddings) / max(elapsed, 1e-9):.1f} images/sec "
+              f"({elapsed:.1f}s total)")
     
-    return np.array(embeddings), filenames, failed_images
+    return embeddings, filenames, failed_images
+
+
+def file_fingerprint(path):
+    """(size, mtime_ns) used to detect changed source images"""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+# ----------------------------------------------------------------------------
+# Checkpointed shards: the image list is split into fixed shards, each written
+# to SHARD_DIR as soon as it is embedded. A rerun of the same job skips the
+# shards already on disk; the shards are merged into the store at the end.
+# ----------------------------------------------------------------------------
+
+def _shard_path(shard_id):
+    return os.path.join(SHARD_DIR, f'shard_{shard_id:05d}.npz')
+
 
+def _job_manifest(image_paths, shard_size):
+    digest = hashlib.sha256("\n".join(image_paths).encode("utf-8")).hexdigest()
+    return {"images": len(image_paths), "shard_size": shard_size, "digest": digest,
+            "extractor": EXTRACTOR_CONFIG}
 
-def save_embeddings(embeddings, filenames):
-    """Save embeddings and filenames to pickle files"""
-    print(f"\nSaving embeddings to {EMBEDDINGS_FILE}")
-    with open(EMBEDDINGS_FILE, 'wb') as f:
-        pickle.dump(embeddings, f)
+
+def prepare_shards(image_paths, shard_size=SHARD_SIZE, fresh=False):
+    """Return the ids of shards already completed for this exact job"""
+    manifest = _job_manifest(image_paths, shard_size)
+    manifest_path = os.path.join(SHARD_DIR, 'manifest.json')
     
-    print(f"Saving filenames to {FILENAMES_FILE}")
-    with open(FILENAMES_FILE, 'wb') as f:
-        pickle.dump(filenames, f)
+    if not fresh and os.path.exists(manifest_path):
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            if json.load(f) == manifest:
+                done = sorted(
+                    int(name[len('shard_'):-len('.npz')])
+                    for name in os.listdir(SHARD_DIR)
+                    if name.startswith('shard_') and name.endswith('.npz')
+                )
+                if done:
+                    print(f"Resuming: {len(done)} shard(s) already completed")
+                return done
+        print("[WARNING] Checkpoints belong to a different job, starting over")
+    
+    shutil.rmtree(SHARD_DIR, ignore_errors=True)
+    os.makedirs(SHARD_DIR)
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f)
+    return []
+
+
+def write_shard(shard_id, embeddings, image_paths, failed, weights_hash=""):
+    """Write one shard atomically so a crash never leaves a partial checkpoint"""
+    tmp_path = _shard_path(shard_id) + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(
+            f,
+            embeddings=embeddings,
+            filenames=np.array([os.path.basename(p) for p in image_paths], dtype=str),
+            fingerprints=np.array([file_fingerprint(p) for p in image_paths],
+                                  dtype=np.int64).reshape(-1, 2),
+            failed=np.array(failed, dtype=str),
+            weights_hash=np.array(weights_hash),
+        )
+    os.replace(tmp_path, _shard_path(shard_id))
+
+
+def merge_shards(n_shards):
+    """Concatenate all shards in shard order, with the weights hash they were embedded with"""
+    embeddings, filenames, fingerprints, failed = [], [], [], []
+    hashes = set()
+    for shard_id in range(n_shards):
+        with np.load(_shard_path(shard_id)) as shard:
+            hashes.add(str(shard['weights_hash']))
+            if len(shard['filenames']):
+                embeddings.append(shard['embeddings'])
+                filenames.extend(shard['filenames'].tolist())
+                fingerprints.append(shard['fingerprints'])
+            failed.extend(shard['failed'].tolist())
+    if len(hashes) > 1:
+        raise RuntimeError(f"shards were embedded with different weights {sorted(hashes)}; "
+                           f"rerun with --fresh")
+    weights_hash = hashes.pop() if hashes else ""
+    if not embeddings:
+        return np.empty((0, 0), np.float32), [], np.empty((0, 2), np.int64), failed, weights_hash
+    return (np.concatenate(embeddings), filenames, np.concatenate(fingerprints), failed,
+            weights_hash)
+
+
+def _embed_shard(extractor, shard_id, shard_paths, args, loader_threads, verbose=True):
+    embeddings, filenames, failed = generate_embeddings(
+        extractor, shard_paths, args.batch_size, loader_threads, args.prefetch, verbose
+    )
+    by_name = {os.path.basename(p): p for p in shard_paths}
+    write_shard(shard_id, embeddings, [by_name[name] for name in filenames], failed,
+                extractor.config["weights_hash"])
+    return len(filenames), len(failed)
+
+
+def _shard_worker(worker_id, shards, args, intra_op_threads, progress_queue):
+    """Process entry point: embed the assigned (shard_id, paths) pairs"""
+    # Bound TF's thread pools so N workers don't oversubscribe the cores
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    loader_threads = max(1, args.loader_threads // args.workers)
+    
+    extractor = build_feature_extractor()
+    for shard_id, shard_paths in shards:
+        start = time.perf_counter()
+        embedded, failed = _embed_shard(extractor, shard_id, shard_paths, args, loader_threads,
+                                        verbose=False)
+        progress_queue.put((worker_id, shard_id, embedded, failed, time.perf_counter() - start))
+    progress_queue.put((worker_id, None, 0, 0, 0.0))
+
+
+def run_workers(pending, n_shards, args):
+    """
+    Spread pending shards round-robin over args.workers processes and report
+    per-worker progress. Each worker writes its own shard files; the merge
+    afterwards is by shard id, so the result does not depend on scheduling.
+    """
+    n_workers = min(args.workers, len(pending))
+    intra_op_threads = args.threads_per_worker or max(1, (os.cpu_count() or 1) // n_workers)
+    print(f"\nStarting {n_workers} workers ({intra_op_threads} intra-op threads each) "
+          f"for {len(pending)} shards")
+    
+    context = multiprocessing.get_context('spawn')
+    progress_queue = context.Queue()
+    processes = []
+    for worker_id in range(n_workers):
+        shards = pending[worker_id::n_workers]
+        process = context.Process(
+            target=_shard_worker,
+            args=(worker_id, shards, args, intra_op_threads, progress_queue),
+        )
+        process.start()
+        processes.append(process)
+    
+    per_worker = {worker_id: 0 for worker_id in range(n_workers)}
+    running = n_workers
+    completed = 0
+    while running:
+        try:
+            worker_id, shard_id, embedded, failed, elapsed = progress_queue.get(timeout=5)
+        except queue.Empty:
+            # A worker that died without reporting must not hang the run
+            if not any(p.is_alive() for p in processes):
+                break
+            continue
+        if shard_id is None:
+            running -= 1
+            continue
+        completed += 1
+        per_worker[worker_id] += embedded
+        print(f"[worker {worker_id}] shard {shard_id + 1}/{n_shards} done: "
+              f"{embedded} images, {failed} failed, {embedded / max(elapsed, 1e-9):.1f} images/sec "
+              f"({completed}/{len(pending)} shards)")
+    
+    for process in processes:
+        process.join()
+    
+    for worker_id, count in per_worker.items():
+        print(f"   - worker {worker_id}: {count} images")
+    failed_workers = [i for i, p in enumerate(processes) if p.exitcode != 0]
+    if failed_workers:
+        raise RuntimeError(f"workers {failed_workers} exited with an error; "
+                           f"rerun to resume from the completed shards")
+    return sum(per_worker.values())
+
+
+def generate_sharded(image_paths, args):
+    """Embed image_paths shard by shard, resuming from existing checkpoints"""
+    n_shards = (len(image_paths) + args.shard_size - 1) // args.shard_size
+    done = set(prepare_shards(image_paths, args.shard_size, args.fresh))
+    pending = [
+        (shard_id, image_paths[shard_id * args.shard_size:(shard_id + 1) * args.shard_size])
+        for shard_id in range(n_shards)
+        if shard_id not in done
+    ]
+    
+    start = time.perf_counter()
+    embedded = 0
+    if pending and args.workers > 1:
+        embedded = run_workers(pending, n_shards, args)
+    elif pending:
+        # Build model
+        extractor = build_feature_extractor()
+        for shard_id, shard_paths in pending:
+            print(f"\nShard {shard_id + 1}/{n_shards}")
+            embedded += _embed_shard(extractor, shard_id, shard_paths, args, args.loader_threads)[0]
+    
+    elapsed = time.perf_counter() - start
+    if embedded:
+        print(f"\nThis run: {embedded} images in {elapsed:.1f}s "
+              f"({embedded / max(elapsed, 1e-9):.1f} images/sec)")
+    return merge_shards(n_shards)
+
+
+# ----------------------------------------------------------------------------
+# Incremental updates
+# ----------------------------------------------------------------------------
+
+def plan_incremental(image_paths, store):
+    """
+    Split the dataset into rows of the current store that can be kept and
+    images that must be embedded (new, or changed size/mtime). Images that no
+    longer exist on disk are dropped.
+    """
+    existing = {os.path.basename(name): row for row, name in enumerate(store.filenames)}
+    keep_rows, to_embed = [], []
+    for path in image_paths:
+        row = existing.get(os.path.basename(path))
+        unchanged = row is not None and (
+            store.fingerprints is None
+            or tuple(store.fingerprints[row]) == file_fingerprint(path)
+        )
+        if unchanged:
+            keep_rows.append(row)
+        else:
+            to_embed.append(path)
+    return keep_rows, to_embed
+
+
+def merge_into_store(store, keep_rows, embeddings, filenames, fingerprints, dataset_paths):
+    """Combine kept store rows with freshly embedded ones, ordered by filename"""
+    by_name = {os.path.basename(p): p for p in dataset_paths}
+    kept_names = [os.path.basename(store.filenames[row]) for row in keep_rows]
+    if store.fingerprints is not None:
+        kept_fingerprints = store.fingerprints[keep_rows]
+    else:
+        kept_fingerprints = np.array([file_fingerprint(by_name[n]) for n in kept_names],
+                                     dtype=np.int64).reshape(-1, 2)
+    
+    all_names = kept_names + list(filenames)
+    parts = [np.asarray(store.embeddings[keep_rows], dtype=np.float32)]
+    if len(filenames):
+        parts.append(np.asarray(embeddings, dtype=np.float32))
+    all_embeddings = np.concatenate(parts)
+    all_fingerprints = np.concatenate([kept_fingerprints, fingerprints])
+    
+    order = np.argsort(np.array(all_names, dtype=str), kind='stable')
+    return (all_embeddings[order], [all_names[i] for i in order], all_fingerprints[order])
+
+
+def save_embeddings(embeddings, filenames, fingerprints=None, extractor_config=None):
+    """Save embeddings and filenames as a new embedding store version"""
+    print(f"\nSaving embedding store to {STORE_DIR} ({STORE_DTYPE})")
+    path = save_store(embeddings, filenames, dtype=STORE_DTYPE, fingerprints=fingerprints,
+                      extractor=extractor_config, normalized=True)
     
     print(f"\n[SUCCESS] Embeddings saved successfully!")
+    print(f"   - Store version: {os.path.basename(path)}")
     print(f"   - Embeddings shape: {embeddings.shape}")
     print(f"   - Number of images: {len(filenames)}")
+    return path
+
+
+def carry_over_index(previous_store, new_path):
+    """Re-assign the new catalog to the previous IVF quantizer, if there was one"""
+    old_index = previous_store.artifact_path(INDEX_FILE)
+    if not os.path.exists(old_index):
+        return
+    new_store = open_store(version=os.path.basename(new_path))
+    index = IVFIndex.from_centroids(new_store.embeddings, IVFIndex.load_centroids(old_index))
+    index.save(new_store.artifact_path(INDEX_FILE))
+    print(f"[SUCCESS] IVF index updated with existing quantizer ({index.nlist} cells)")
 
 
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate catalog embeddings")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="folder of catalog images")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--loader-threads", type=int, default=LOADER_THREADS,
+                        help="threads decoding/resizing images")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_BATCHES,
+                        help="batches decoded ahead of the model")
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE,
+                        help="images per checkpoint shard")
+    parser.add_argument("--fresh", action="store_true",
+                        help="ignore existing checkpoints and start over")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="extractor processes, each embedding its own shards")
+    parser.add_argument("--threads-per-worker", type=int, default=0,
+                        help="TF intra-op threads per worker (default: cores / workers)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only embed images that are new or changed since the current store")
+    parser.add_argument("--exclude", default=None,
+                        help="file listing image names to skip, e.g. near_duplicates_drop.txt "
+                             "from neighbours.py")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
     """Main execution"""
+    args = parse_args(argv)
     print("=" * 60)
     print("Fashion Recommendation - Embedding Generation")
     print("=" * 60)
     
     # Check dataset exists
-    if not os.path.exists(DATASET_PATH):
-        print(f"[ERROR] Error: Dataset not found at {DATASET_PATH}")
-        print(f"Please ensure myntradataset/images/ folder exists")
+    if not os.path.exists(args.dataset):
+        print(f"[ERROR] Error: Dataset not found at {args.dataset}")
+        print(f"Please ensure myntradataset/images/ folder exists or pass --dataset")
         return
     
     # Get image paths
-    image_paths = get_valid_images(DATASET_PATH)
+    image_paths = get_valid_images(args.dataset)
+    if args.exclude:
+        with open(args.exclude, 'r', encoding='utf-8') as f:
+            excluded = {line.strip() for line in f if line.strip()}
+        image_paths = [p for p in image_paths if os.path.basename(p) not in excluded]
+        print(f"Excluding {len(excluded)} listed images, {len(image_paths)} remain")
     if not image_paths:
         print("[ERROR] No valid images found in dataset")
         return
     
-    # Build model
-    model = build_feature_extractor()
+    previous_store = None
+    keep_rows = []
+    if args.incremental:
+        if not store_exists():
+            print("[WARNING] No existing store, running a full generation")
+        else:
+            previous_store = open_store()
+            stored_config = previous_store.header.get("extractor")
+            if stored_config is None or config_mismatches(stored_config):
+                # Mixing rows from two different extractors would corrupt similarity
+                print(f"[ERROR] Current store was built with a different extractor config "
+                      f"({stored_config}); run a full generation instead of --incremental")
+                return
+            dataset_paths = image_paths
+            keep_rows, image_paths = plan_incremental(dataset_paths, previous_store)
+            removed = len(previous_store) - len(keep_rows)
+            print(f"Incremental update: {len(keep_rows)} unchanged, "
+                  f"{len(image_paths)} new/changed, {removed} removed or changed")
+            if not image_paths and removed == 0:
+                print("[SUCCESS] Embedding store is already up to date")
+                return
     
-    # Generate embeddings
-    embeddings, filenames, failed = generate_embeddings(model, image_paths)
+    if image_paths:
+        # Generate embeddings (checkpointed per shard)
+        embeddings, filenames, fingerprints, failed, weights_hash = generate_sharded(image_paths, args)
+        if failed:
+            print(f"[WARNING] Failed to process: {len(failed)} images")
+    else:
+        embeddings, filenames, fingerprints = np.empty((0, 0), np.float32), [], np.empty((0, 2), np.int64)
+        weights_hash = ""
+    
+    if previous_store is not None:
+        embeddings, filenames, fingerprints = merge_into_store(
+            previous_store, keep_rows, embeddings, filenames, fingerprints, dataset_paths
+        )
     
     if len(embeddings) == 0:
         print("[ERROR] No embeddings were generated")
         return
     
-    # Save embeddings
-    save_embeddings(embeddings, filenames)
+    # Save embeddings with the config they were produced with
+    config = dict(EXTRACTOR_CONFIG, weights_hash=weights_hash)
+    if previous_store is not None:
+        stored_hash = previous_store.header["extractor"].get("weights_hash")
+        if weights_hash and stored_hash and weights_hash != stored_hash:
+            print(f"[ERROR] New rows were embedded with weights {weights_hash}, "
+                  f"the store with {stored_hash}; run a full generation")
+            return
+        config["weights_hash"] = weights_hash or stored_hash
+    path = save_embeddings(embeddings, filenames, fingerprints, config)
+    if previous_store is not None:
+        carry_over_index(previous_store, path)
+    
+    # The job is complete, checkpoints are no longer needed
+    shutil.rmtree(SHARD_DIR, ignore_errors=True)
     
     print("\n" + "=" * 60)
     print("[SUCCESS] Embedding generation complete!")
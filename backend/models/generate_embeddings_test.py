@@ -5,47 +5,26 @@ Use this to test recommendations while full dataset generates
 
 import os
 import sys
-import pickle
 import numpy as np
 from pathlib import Path
 from tqdm import tqdm
 
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-import tensorflow as tf
-from tensorflow.keras.preprocessing import image
-from tensorflow.keras.applications.resnet50 import ResNet50, preprocess_input
-from tensorflow.keras.layers import GlobalAveragePooling2D
-from tensorflow.keras.models import Model
+from cnn_feature_extractor import FeatureExtractor, load_image
+from embedding_store import save_store
 
 DATASET_PATH = os.path.join(os.path.dirname(__file__), '..', '..', 'myntradataset', 'images')
 OUTPUT_DIR = os.path.dirname(__file__)
-EMBEDDINGS_FILE = os.path.join(OUTPUT_DIR, 'embeddings_test.pkl')
-FILENAMES_FILE = os.path.join(OUTPUT_DIR, 'filenames_test.pkl')
+TEST_STORE_DIR = os.path.join(OUTPUT_DIR, 'embedding_store_test')
 
 # Test settings
 MAX_IMAGES = 1000  # Only process first 1000 for fast testing
-IMAGE_SIZE = (224, 224)
-
-def build_feature_extractor():
-    """Build ResNet50 model for feature extraction"""
-    print("Loading ResNet50 model...")
-    base_model = ResNet50(weights='imagenet', include_top=False)
-    inputs = tf.keras.Input(shape=(224, 224, 3))
-    x = preprocess_input(inputs)
-    x = base_model(x, training=False)
-    outputs = GlobalAveragePooling2D()(x)
-    model = Model(inputs, outputs)
-    return model
 
 def load_and_preprocess_image(img_path):
-    """Load and preprocess image for ResNet50"""
+    """Load and preprocess image for ResNet50 (same pipeline as the server)"""
     try:
-        img = image.load_img(img_path, target_size=IMAGE_SIZE)
-        img_array = image.img_to_array(img)
-        img_array = np.expand_dims(img_array, axis=0)
-        img_array = preprocess_input(img_array)
-        return img_array
+        return load_image(img_path)
     except Exception as e:
         return None
 
@@ -64,7 +43,8 @@ def main():
     
     print(f"Found {len(image_files)} images (limited to {MAX_IMAGES} for testing)")
     
-    model = build_feature_extractor()
+    print("Loading ResNet50 model...")
+    extractor = FeatureExtractor()
     embeddings = []
     filenames = []
     
@@ -73,8 +53,7 @@ def main():
         img_array = load_and_preprocess_image(img_path)
         if img_array is not None:
             try:
-                features = model.predict(img_array, verbose=0)
-                embeddings.append(features.flatten())
+                embeddings.append(extractor.embed_batch(img_array[np.newaxis])[0])
                 filenames.append(os.path.basename(img_path))
             except:
                 pass
@@ -82,20 +61,18 @@ def main():
     embeddings = np.array(embeddings)
     
     print(f"\n[SUCCESS] Processed {len(embeddings)} images")
-    print(f"Saving to temporary test files...")
+    print(f"Saving to temporary test store...")
     
-    with open(EMBEDDINGS_FILE, 'wb') as f:
-        pickle.dump(embeddings, f)
-    with open(FILENAMES_FILE, 'wb') as f:
-        pickle.dump(filenames, f)
+    store_path = save_store(embeddings, filenames, root=TEST_STORE_DIR,
+                            extractor=extractor.config, normalized=True)
     
     print(f"[SUCCESS] Test embeddings ready!")
     print(f"   Shape: {embeddings.shape}")
+    print(f"   Store: {store_path}")
     print(f"\n[WARNING] IMPORTANT:")
-    print(f"   These are TEST files. Replace with full embeddings when done.")
-    print(f"   To use full dataset, rename:")
-    print(f"   - embeddings.pkl (not test)")
-    print(f"   - filenames.pkl (not test)")
+    print(f"   This is a TEST store. Replace with full embeddings when done.")
+    print(f"   To use it anyway, rename:")
+    print(f"   - embedding_store_test -> embedding_store")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,242 @@
+"""
+Catalog metadata from styles.csv as NumPy columns aligned with embedding rows.
+
+Each categorical attribute (gender, masterCategory, subCategory, articleType,
+baseColour, season, usage) is dictionary-encoded: a small vocabulary of
+strings plus one uint16 code per embedding row (code 0 is "" / unknown).
+year is an int16 column (0 when unknown). Filtering by any attribute is then
+a vectorized comparison over the code column instead of per-item lookups.
+
+The encoded columns are cached as metadata.npz next to the embedding store
+version and rebuilt automatically when styles.csv or the store rows change.
+
+    python metadata.py info
+"""
+
+import os
+import argparse
+import numpy as np
+
+try:
+    from models.embedding_store import open_store, store_exists, STORE_DIR
+except ImportError:
+    from embedding_store import open_store, store_exists, STORE_DIR
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STYLES_CSV = os.path.join(BASE_DIR, "../../data/datasets/styles.csv")
+METADATA_FILE = "metadata.npz"
+METADATA_FORMAT_VERSION = 1
+
+CATEGORICAL_COLUMNS = (
+    "gender",
+    "masterCategory",
+    "subCategory",
+    "articleType",
+    "baseColour",
+    "season",
+    "usage",
+)
+NUMERIC_COLUMNS = ("year",)
+# Attributes accepted as recommendation filters (gender has its own rules)
+FILTER_COLUMNS = ("masterCategory", "subCategory", "articleType", "baseColour", "season", "usage")
+YEAR_FILTERS = ("year_min", "year_max")
+
+
+def _csv_stamp(csv_path):
+    stat = os.stat(csv_path)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def parse_styles(csv_path=STYLES_CSV):
+    """
+    Read styles.csv into (ids, {column: list of str}). Only the leading
+    attribute columns are used, so commas inside productDisplayName (the
+    last column) do not shift any field.
+    """
+    with open(csv_path, "r", encoding="utf-8") as f:
+        header = f.readline().strip().split(",")
+        positions = {name: header.index(name) for name in CATEGORICAL_COLUMNS + NUMERIC_COLUMNS
+                     if name in header}
+        n_fields = max(positions.values()) + 1
+
+        ids = []
+        values = {name: [] for name in positions}
+        for line in f:
+            parts = line.rstrip("\r\n").split(",", n_fields)
+            if len(parts) < n_fields:
+                continue
+            try:
+                item_id = int(parts[0])
+            except ValueError:
+                continue  # skip bad lines
+            ids.append(item_id)
+            for name, position in positions.items():
+                values[name].append(parts[position].strip())
+    return np.array(ids, dtype=np.int64), values
+
+
+def _parse_years(values):
+    years = np.zeros(len(values), dtype=np.int16)
+    for i, value in enumerate(values):
+        try:
+            years[i] = int(float(value))
+        except ValueError:
+            pass
+    return years
+
+
+class CatalogMetadata:
+    """Attribute columns indexed by embedding row."""
+
+    def __init__(self, ids, codes, vocab, year):
+        self.ids = ids
+        self.codes = codes  # column -> (N,) uint16
+        self.vocab = vocab  # column -> (V,) str, vocab[0] == ""
+        self.year = year  # (N,) int16, 0 == unknown
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, ids, csv_path=STYLES_CSV):
+        """Encode styles.csv for the given row ids (-1 / unknown ids get empty values)."""
+        csv_ids, values = parse_styles(csv_path)
+        ids = np.asarray(ids, dtype=np.int64)
+        # Align: csv line of every row id, or the trailing "" sentinel when absent
+        source = np.full(len(ids), len(csv_ids))
+        if len(csv_ids):
+            order = np.argsort(csv_ids, kind="stable")
+            found = np.minimum(np.searchsorted(csv_ids[order], ids), len(csv_ids) - 1)
+            matched = csv_ids[order[found]] == ids
+            source[matched] = order[found[matched]]
+
+        codes, vocab = {}, {}
+        for name in CATEGORICAL_COLUMNS:
+            # The trailing "" sentinel always sorts first, so code 0 is "" (unknown)
+            column = np.array(values.get(name, [""] * len(csv_ids)) + [""], dtype=str)
+            uniques, inverse = np.unique(column, return_inverse=True)
+            codes[name] = inverse.astype(np.uint16)[source]
+            vocab[name] = uniques
+
+        years = _parse_years(values.get("year", [""] * len(csv_ids)) + [""])
+        return cls(ids, codes, vocab, years[source])
+
+    def save(self, path, csv_stamp):
+        arrays = {"format_version": METADATA_FORMAT_VERSION, "ids": self.ids,
+                  "year": self.year, "csv_stamp": csv_stamp}
+        for name in CATEGORICAL_COLUMNS:
+            arrays[f"codes_{name}"] = self.codes[name]
+            arrays[f"vocab_{name}"] = self.vocab[name]
+        np.savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            if int(data["format_version"]) != METADATA_FORMAT_VERSION:
+                raise ValueError(f"unsupported metadata format {int(data['format_version'])}")
+            codes = {name: data[f"codes_{name}"] for name in CATEGORICAL_COLUMNS}
+            vocab = {name: data[f"vocab_{name}"] for name in CATEGORICAL_COLUMNS}
+            return cls(data["ids"], codes, vocab, data["year"]), data["csv_stamp"]
+
+    def values(self, name):
+        """Decoded string column (one value per row)."""
+        if name == "year":
+            return self.year
+        return self.vocab[name][self.codes[name]]
+
+    def value(self, name, row):
+        if name == "year":
+            return int(self.year[row])
+        return str(self.vocab[name][self.codes[name][row]])
+
+    def mask(self, name, values):
+        """Boolean row mask: attribute `name` equals any of `values` (case-insensitive)."""
+        if isinstance(values, str):
+            values = [values]
+        wanted = {str(v).lower() for v in values}
+        vocab = self.vocab[name]
+        codes = [code for code, value in enumerate(vocab) if value.lower() in wanted]
+        if not codes:
+            return np.zeros(len(self), dtype=bool)
+        return np.isin(self.codes[name], codes)
+
+    def year_mask(self, min_year=None, max_year=None):
+        mask = self.year > 0
+        if min_year is not None:
+            mask &= self.year >= int(min_year)
+        if max_year is not None:
+            mask &= self.year <= int(max_year)
+        return mask
+
+    def filter_mask(self, filters):
+        """
+        Rows matching every filter: {column: value or [values]} for the
+        categorical columns plus optional year_min / year_max bounds.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for name, values in filters.items():
+            if name in YEAR_FILTERS:
+                continue
+            if name not in CATEGORICAL_COLUMNS:
+                raise ValueError(f"unknown filter '{name}'")
+            mask &= self.mask(name, values)
+        if any(filters.get(name) is not None for name in YEAR_FILTERS):
+            mask &= self.year_mask(filters.get("year_min"), filters.get("year_max"))
+        return mask
+
+
+def load_metadata(ids, artifact_dir=BASE_DIR, csv_path=STYLES_CSV):
+    """
+    Metadata aligned with `ids` (one per embedding row), from the cache in
+    artifact_dir when it matches styles.csv and the rows, rebuilt otherwise.
+    Returns None when styles.csv is missing.
+    """
+    if not os.path.exists(csv_path):
+        return None
+    ids = np.asarray(ids, dtype=np.int64)
+    stamp = _csv_stamp(csv_path)
+    cache_path = os.path.join(artifact_dir, METADATA_FILE)
+
+    if os.path.exists(cache_path):
+        try:
+            metadata, cached_stamp = CatalogMetadata.load(cache_path)
+            if np.array_equal(cached_stamp, stamp) and np.array_equal(metadata.ids, ids):
+                return metadata
+        except Exception as e:
+            print(f"[WARNING] Ignoring unreadable metadata cache: {e}")
+
+    metadata = CatalogMetadata.build(ids, csv_path)
+    try:
+        tmp_path = cache_path + ".tmp.npz"
+        metadata.save(tmp_path, stamp)
+        os.replace(tmp_path, cache_path)
+    except OSError as e:
+        print(f"[WARNING] Could not cache metadata: {e}")
+    return metadata
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the catalog metadata columns")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("info", help="build (or load) the metadata of the current store")
+    parser.parse_args()
+
+    if not store_exists():
+        print(f"[ERROR] No embedding store at {STORE_DIR}")
+        return
+    store = open_store()
+    metadata = load_metadata(store.ids, store.path)
+    if metadata is None:
+        print(f"[ERROR] styles.csv not found at {STYLES_CSV}")
+        return
+    known = int((metadata.codes["gender"] > 0).sum())
+    print(f"[SUCCESS] Metadata for {len(metadata)} rows ({known} matched in styles.csv)")
+    for name in CATEGORICAL_COLUMNS:
+        print(f"   - {name}: {len(metadata.vocab[name]) - 1} values")
+    years = metadata.year[metadata.year > 0]
+    if len(years):
+        print(f"   - year: {years.min()}-{years.max()}")
+
+
+if __name__ == "__main__":
+    main()
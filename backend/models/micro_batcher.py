@@ -0,0 +1,129 @@
+"""
+Dynamic micro-batching for concurrent recommendation queries.
+
+Request threads submit work items and block on a Future. A single worker
+thread takes the first waiting item, keeps collecting for up to
+`max_wait_ms` (or until `max_batch` items are queued), runs them through
+`process_batch` in one call and fans the results back out. Under load this
+turns N single-image forward passes and N matrix-vector products into one
+batched forward pass and one matrix-matrix product.
+
+A caller waits at most `timeout` seconds for its batch; after that it
+withdraws the item (if no batch has taken it yet) and processes it on its
+own, so a stalled worker slows requests down instead of hanging them.
+"""
+
+import os
+import queue
+import time
+import threading
+from concurrent.futures import Future, TimeoutError
+
+
+class MicroBatcher:
+    """
+    process_batch(items) must return one result per item, in order. A result
+    that is an Exception instance is raised in the submitting thread only.
+    """
+
+    def __init__(self, process_batch, max_batch=16, max_wait_ms=5.0, name="micro-batcher",
+                 timeout=30.0):
+        self.process_batch = process_batch
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+        self.timeout = timeout
+        self._queue = queue.Queue()
+        self._thread = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.fallbacks = 0
+
+    def _ensure_worker(self):
+        # The thread starts on first use. A forked child inherits the queue
+        # but not the thread, so it starts its own with a fresh queue; a thread
+        # that died in this process is replaced on the same queue, keeping
+        # the futures already waiting in it.
+        pid = os.getpid()
+        if self._thread is not None and self._pid == pid and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._pid != pid:
+                self._queue = queue.Queue()
+                self._pid = pid
+                self._thread = None
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        """Queue one item; returns a Future resolved with its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """
+        Result of `item` from its batch; after `timeout` seconds (the
+        batcher's timeout by default) it is processed alone in this thread.
+        """
+        future = self.submit(item)
+        try:
+            return future.result(self.timeout if timeout is None else timeout)
+        except TimeoutError:
+            future.cancel()  # no-op if a batch already took it; its result is dropped
+        self.fallbacks += 1
+        print(f"[WARNING] {self.name}: no batch result in time, processing the item directly")
+        result = self.process_batch([item])[0]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            # Items whose caller gave up waiting were cancelled; skip them
+            batch = [entry for entry in self._collect() if entry[1].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            items = [item for item, _ in batch]
+            futures = [future for _, future in batch]
+            try:
+                results = self.process_batch(items)
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                continue
+
+            self.batches += 1
+            self.items += len(items)
+            for future, result in zip(futures, results):
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "fallbacks": self.fallbacks,
+        }
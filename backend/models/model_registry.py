@@ -0,0 +1,112 @@
+"""
+Process-wide registry for the query feature extractor.
+
+The ResNet50 extractor is built at most once per process (thread-safe) and
+warmed up with a dummy inference so the first recommendation request does
+not pay for model construction and graph tracing. The server starts the
+warm-up on a background thread at boot and reports readiness through
+/api/health via status().
+
+RECOMMENDER_WARMUP=background (default) | sync | off
+
+The recommender registers the weights hash recorded in its embedding store
+(expect_weights_hash); an extractor whose weights differ is refused, since
+its query vectors would not be comparable with the catalog.
+"""
+
+import os
+import time
+import threading
+
+try:
+    from models.cnn_feature_extractor import FeatureExtractor
+except ImportError:
+    from cnn_feature_extractor import FeatureExtractor
+
+_lock = threading.Lock()
+_extractor = None
+_warmup_thread = None
+_expected_weights_hash = None
+_status = {
+    "state": "not_loaded",  # not_loaded -> loading -> ready | failed
+    "error": None,
+    "load_seconds": None,
+    "warmup_seconds": None,
+    "weights_hash": None,
+}
+
+
+def expect_weights_hash(weights_hash):
+    """Weights hash the loaded catalog was embedded with (None disables the check)."""
+    global _expected_weights_hash
+    _expected_weights_hash = weights_hash or None
+
+
+def get_extractor():
+    """Return the process-wide extractor, building and warming it on first use."""
+    global _extractor
+    if _extractor is not None:
+        return _extractor
+
+    with _lock:
+        if _extractor is None:
+            _status.update(state="loading", error=None)
+            try:
+                start = time.perf_counter()
+                extractor = FeatureExtractor()
+                _status["load_seconds"] = round(time.perf_counter() - start, 3)
+                _status["weights_hash"] = extractor.config["weights_hash"]
+                if _expected_weights_hash and _expected_weights_hash != _status["weights_hash"]:
+                    raise RuntimeError(
+                        f"extractor weights {_status['weights_hash']} do not match the "
+                        f"embedding store ({_expected_weights_hash})"
+                    )
+
+                start = time.perf_counter()
+                extractor.warm_up()
+                _status["warmup_seconds"] = round(time.perf_counter() - start, 3)
+            except Exception as e:
+                _status.update(state="failed", error=str(e))
+                print(f"[ERROR] Feature extractor failed to load: {e}")
+                raise
+
+            _extractor = extractor
+            _status["state"] = "ready"
+            print(
+                f"[SUCCESS] Feature extractor ready "
+                f"(load {_status['load_seconds']}s, warm-up {_status['warmup_seconds']}s)"
+            )
+    return _extractor
+
+
+def _warm_up_quietly():
+    try:
+        get_extractor()
+    except Exception:
+        pass  # recorded in _status
+
+
+def start_warmup(mode=None):
+    """Load the extractor according to RECOMMENDER_WARMUP; call once at server start."""
+    global _warmup_thread
+    mode = (mode or os.environ.get("RECOMMENDER_WARMUP", "background")).lower()
+
+    if mode == "off":
+        return
+    if mode == "sync":
+        _warm_up_quietly()
+        return
+    if _warmup_thread is None:
+        _warmup_thread = threading.Thread(
+            target=_warm_up_quietly, name="extractor-warmup", daemon=True
+        )
+        _warmup_thread.start()
+
+
+def is_ready():
+    return _status["state"] == "ready"
+
+
+def status():
+    """Readiness report for /api/health."""
+    return dict(_status, ready=is_ready())
@@ -0,0 +1,358 @@
+"""
+Blocked all-pairs similarity over the embedding store.
+
+The N x N similarity matrix never exists: the job scores one tile at a time
+(a block of query rows x a chunk of catalog rows, sized to fit
+--memory-mb per worker), merges each tile into a running top-k per row and
+spreads the query blocks over a process pool. Results stream to disk as
+blocks complete.
+
+Outputs, next to the embedding store version:
+
+    neighbour_rows.npy       (N, k) int32    neighbour row indices, best first
+    neighbour_scores.npy     (N, k) float16  cosine similarities
+    near_duplicates.csv      every pair with similarity >= --threshold
+    near_duplicates_drop.txt all but one image of every duplicate group
+
+The neighbour table is memory-mapped by the server, so "more like item X"
+is a row lookup. The drop list can be passed to
+generate_embeddings.py --exclude to dedupe the catalog before indexing.
+
+    python neighbours.py build --k 50 --workers 8 --memory-mb 512
+    python neighbours.py duplicates --threshold 0.97
+"""
+
+import os
+import csv
+import time
+import argparse
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from models.ann_index import row_norms, CHUNK_ROWS
+    from models.embedding_store import open_store, store_exists, STORE_DIR
+except ImportError:
+    from ann_index import row_norms, CHUNK_ROWS
+    from embedding_store import open_store, store_exists, STORE_DIR
+
+NEIGHBOUR_ROWS_FILE = "neighbour_rows.npy"
+NEIGHBOUR_SCORES_FILE = "neighbour_scores.npy"
+DUPLICATES_FILE = "near_duplicates.csv"
+DUPLICATES_DROP_FILE = "near_duplicates_drop.txt"
+DEFAULT_K = 50
+DEFAULT_MEMORY_MB = 256
+DEFAULT_THRESHOLD = 0.97
+
+
+# Rows of a score tile whose top-k is selected at once; bounds the
+# argpartition index array to MERGE_ROWS x chunk_rows
+MERGE_ROWS = 64
+
+
+def tile_bytes(block_rows, chunk_rows, dim, k, n_rows):
+    """
+    Peak bytes block_top_k allocates for a block of block_rows queries
+    (near-duplicate hits excluded: they depend on the data, not the tile).
+    """
+    fixed = (
+        4 * n_rows  # row norms
+        + 4 * chunk_rows * dim  # float32 catalog chunk
+        + 12 * MERGE_ROWS * chunk_rows  # argpartition of one row slice (int64 + copy)
+    )
+    per_row = (
+        4 * dim  # normalized query
+        + 5 * chunk_rows  # float32 score tile + threshold mask
+        + 16 * 2 * k  # (2k) merge buffers (float32 + int32) + their argpartition
+        + 24 * k  # final ordering and gathers
+    )
+    return fixed + block_rows * per_row
+
+
+def plan_tiles(n_rows, dim, k, memory_mb=DEFAULT_MEMORY_MB):
+    """
+    (block_rows, chunk_rows) so one worker's working set (tile_bytes) fits
+    in memory_mb. The catalog chunk may take at most a quarter of the
+    budget; the query block gets the rest.
+    """
+    budget = memory_mb * 1024 * 1024
+    chunk_rows = max(1, min(CHUNK_ROWS, n_rows))
+    while chunk_rows > 256 and tile_bytes(1, chunk_rows, dim, k, n_rows) > budget / 4:
+        chunk_rows //= 2
+    fixed = tile_bytes(0, chunk_rows, dim, k, n_rows)
+    per_row = tile_bytes(1, chunk_rows, dim, k, n_rows) - fixed
+    block_rows = int((budget - fixed) // per_row)
+    if block_rows < 1:
+        raise ValueError(f"--memory-mb {memory_mb} is too small for {n_rows} rows of dim {dim}")
+    return min(block_rows, n_rows), chunk_rows
+
+
+def block_top_k(embeddings, norms, start, stop, k, chunk_rows=CHUNK_ROWS, threshold=None):
+    """
+    Top-k neighbours (excluding the row itself) of rows [start, stop),
+    scanning the catalog chunk by chunk and merging a running top-k.
+    With a threshold, also returns every pair (i, j), i < j, i in the block,
+    whose similarity is >= threshold, as ((M, 2) rows, (M,) scores).
+
+    All buffers are allocated once per block (see tile_bytes): the score
+    tile is reused across chunks and each chunk's top k is merged through
+    a (block, 2k) buffer whose first half holds the running best.
+    """
+    n = stop - start
+    queries = np.array(embeddings[start:stop], dtype=np.float32)
+    queries /= norms[start:stop, None]
+    tile = np.empty(n * min(chunk_rows, len(embeddings)), dtype=np.float32)
+    best_scores = np.full((n, 2 * k), -np.inf, dtype=np.float32)
+    best_rows = np.full((n, 2 * k), -1, dtype=np.int32)
+    diagonal = np.arange(start, stop)
+    pairs, pair_scores = [], []
+
+    for chunk_start in range(0, len(embeddings), chunk_rows):
+        chunk = np.array(embeddings[chunk_start : chunk_start + chunk_rows], dtype=np.float32)
+        m = len(chunk)
+        chunk /= norms[chunk_start : chunk_start + m, None]
+        scores = tile[: n * m].reshape(n, m)
+        np.matmul(queries, chunk.T, out=scores)
+        del chunk  # freed before the next chunk is read
+        # A row is not its own neighbour
+        own = (diagonal >= chunk_start) & (diagonal < chunk_start + m)
+        scores[np.flatnonzero(own), diagonal[own] - chunk_start] = -np.inf
+
+        if threshold is not None and chunk_start + m > start:
+            hit_i, hit_j = np.nonzero(scores >= threshold)
+            upper = chunk_start + hit_j > start + hit_i
+            pairs.append(np.stack([start + hit_i[upper], chunk_start + hit_j[upper]], axis=1))
+            pair_scores.append(scores[hit_i[upper], hit_j[upper]])
+
+        if k:
+            # This chunk's top k of every row -> second half of the merge buffer
+            take = min(k, m)
+            best_scores[:, k:] = -np.inf
+            best_rows[:, k:] = -1
+            for row in range(0, n, MERGE_ROWS):
+                part = scores[row : row + MERGE_ROWS]
+                if m > take:
+                    top = np.argpartition(part, m - take, axis=1)[:, -take:]
+                else:
+                    top = np.broadcast_to(np.arange(m), part.shape)
+                best_scores[row : row + MERGE_ROWS, k : k + take] = np.take_along_axis(part, top, axis=1)
+                best_rows[row : row + MERGE_ROWS, k : k + take] = top + chunk_start
+            # Best k of the 2k candidates back into the first half
+            keep = np.argpartition(best_scores, k, axis=1)[:, k:]
+            best_scores[:, :k] = np.take_along_axis(best_scores, keep, axis=1)
+            best_rows[:, :k] = np.take_along_axis(best_rows, keep, axis=1)
+            del keep
+
+    best_scores, best_rows = best_scores[:, :k], best_rows[:, :k]
+    order = np.argsort(best_scores, axis=1)[:, ::-1]
+    best_rows = np.take_along_axis(best_rows, order, axis=1)
+    best_scores = np.take_along_axis(best_scores, order, axis=1)
+    if threshold is None:
+        return best_rows, best_scores
+    pairs = np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    pair_scores = np.concatenate(pair_scores) if pair_scores else np.empty(0, dtype=np.float32)
+    return best_rows, best_scores, pairs, pair_scores
+
+
+# Worker processes open the memory-mapped store themselves instead of
+# receiving the matrix through pickling
+_worker = {}
+
+
+def _init_worker(root, version):
+    store = open_store(root, version)
+    _worker["embeddings"] = store.embeddings
+    _worker["norms"] = (
+        np.ones(len(store), dtype=np.float32)
+        if store.header.get("normalized")
+        else row_norms(store.embeddings)
+    )
+
+
+def _worker_block(start, stop, k, chunk_rows, threshold):
+    result = block_top_k(
+        _worker["embeddings"], _worker["norms"], start, stop, k, chunk_rows, threshold
+    )
+    return (start,) + tuple(result)
+
+
+def _duplicate_groups(pairs):
+    """Connected components of the duplicate pairs (union-find), as sorted row lists."""
+    parent = {}
+
+    def find(row):
+        parent.setdefault(row, row)
+        while parent[row] != row:
+            parent[row] = parent[parent[row]]
+            row = parent[row]
+        return row
+
+    for a, b in pairs:
+        root_a, root_b = find(int(a)), find(int(b))
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    groups = {}
+    for row in parent:
+        groups.setdefault(find(row), []).append(row)
+    return [sorted(rows) for rows in groups.values()]
+
+
+def run_all_pairs(store, k=DEFAULT_K, workers=None, memory_mb=DEFAULT_MEMORY_MB,
+                  threshold=None, write_table=True):
+    """
+    Tiled all-pairs pass over `store`. Writes the top-k neighbour table
+    (write_table) and, with a threshold, the near-duplicate report into the
+    store version directory. Returns a summary dict.
+    """
+    n = len(store)
+    k = min(k, n - 1) if write_table else 0
+    workers = workers or os.cpu_count() or 1
+    block_rows, chunk_rows = plan_tiles(n, store.embeddings.shape[1], k, memory_mb)
+    blocks = [(start, min(start + block_rows, n)) for start in range(0, n, block_rows)]
+    print(f"{len(blocks)} blocks of {block_rows} rows x {chunk_rows}-row catalog chunks, "
+          f"{workers} workers, <= {memory_mb} MB each")
+
+    rows_path = store.artifact_path(NEIGHBOUR_ROWS_FILE)
+    scores_path = store.artifact_path(NEIGHBOUR_SCORES_FILE)
+    duplicates_path = store.artifact_path(DUPLICATES_FILE)
+    if write_table:
+        # Blocks are written into the output files as they complete
+        table_rows = np.lib.format.open_memmap(
+            rows_path + ".tmp", mode="w+", dtype=np.int32, shape=(n, k)
+        )
+        table_scores = np.lib.format.open_memmap(
+            scores_path + ".tmp", mode="w+", dtype=np.float16, shape=(n, k)
+        )
+    report = writer = None
+    if threshold is not None:
+        report = open(duplicates_path + ".tmp", "w", newline="", encoding="utf-8")
+        writer = csv.writer(report)
+        writer.writerow(["row_a", "row_b", "file_a", "file_b", "similarity"])
+
+    all_pairs = []
+    root, version = os.path.dirname(store.path), store.version
+    start_time = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(root, version)) as pool:
+            futures = [
+                pool.submit(_worker_block, start, stop, k, chunk_rows, threshold)
+                for start, stop in blocks
+            ]
+            for done, future in enumerate(futures, 1):
+                result = future.result()
+                start, rows, scores = result[:3]
+                if write_table:
+                    table_rows[start : start + len(rows)] = rows
+                    table_scores[start : start + len(rows)] = scores
+                if writer is not None:
+                    pairs, pair_scores = result[3:]
+                    for (a, b), similarity in zip(pairs, pair_scores):
+                        writer.writerow([a, b, store.filenames[a], store.filenames[b],
+                                         f"{similarity:.4f}"])
+                    all_pairs.append(pairs)
+                if done % max(1, len(blocks) // 20) == 0 or done == len(blocks):
+                    print(f"   {done}/{len(blocks)} blocks ({time.perf_counter() - start_time:.1f}s)")
+    finally:
+        if report is not None:
+            report.close()
+
+    summary = {"rows": n, "k": k, "seconds": round(time.perf_counter() - start_time, 1)}
+    if write_table:
+        table_rows.flush()
+        table_scores.flush()
+        del table_rows, table_scores
+        os.replace(rows_path + ".tmp", rows_path)
+        os.replace(scores_path + ".tmp", scores_path)
+
+    if threshold is not None:
+        os.replace(duplicates_path + ".tmp", duplicates_path)
+        pairs = np.concatenate(all_pairs) if all_pairs else np.empty((0, 2), dtype=np.int64)
+        groups = _duplicate_groups(pairs)
+        # Keep the first image of every group, drop the rest
+        drop = sorted(store.filenames[row] for group in groups for row in group[1:])
+        with open(store.artifact_path(DUPLICATES_DROP_FILE), "w", encoding="utf-8") as f:
+            f.writelines(os.path.basename(name) + "\n" for name in drop)
+        summary.update(duplicate_pairs=len(pairs), duplicate_groups=len(groups), droppable=len(drop))
+    return summary
+
+
+class NeighbourTable:
+    """Memory-mapped (N, k) neighbour rows and scores."""
+
+    def __init__(self, rows, scores):
+        self.rows = rows
+        self.scores = scores
+
+    @property
+    def k(self):
+        return self.rows.shape[1]
+
+    def __len__(self):
+        return len(self.rows)
+
+    @classmethod
+    def load(cls, artifact_dir, n_rows):
+        """The table in artifact_dir, or None when it is missing or built for another catalog."""
+        rows_path = os.path.join(artifact_dir, NEIGHBOUR_ROWS_FILE)
+        scores_path = os.path.join(artifact_dir, NEIGHBOUR_SCORES_FILE)
+        if not (os.path.exists(rows_path) and os.path.exists(scores_path)):
+            return None
+        rows = np.load(rows_path, mmap_mode="r")
+        scores = np.load(scores_path, mmap_mode="r")
+        if len(rows) != n_rows or rows.shape != scores.shape:
+            print(f"[WARNING] Neighbour table has {len(rows)} rows, store has {n_rows}; ignoring it")
+            return None
+        return cls(rows, scores)
+
+    def lookup(self, row, k):
+        """(neighbour_rows, scores) of one catalog row, best first."""
+        return np.asarray(self.rows[row, :k]), np.asarray(self.scores[row, :k], dtype=np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="All-pairs neighbours and near-duplicate detection")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="top-k neighbour table of the current store")
+    build.add_argument("--k", type=int, default=DEFAULT_K)
+    build.add_argument("--threshold", type=float, default=None,
+                       help="also report near-duplicate pairs at or above this similarity")
+
+    duplicates = sub.add_parser("duplicates", help="near-duplicate report only")
+    duplicates.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    for command in (build, duplicates):
+        command.add_argument("--workers", type=int, default=0, help="processes (default: all cores)")
+        command.add_argument("--memory-mb", type=int, default=DEFAULT_MEMORY_MB,
+                             help="working-set budget per worker")
+
+    args = parser.parse_args()
+    if not store_exists():
+        print(f"[ERROR] No embedding store at {STORE_DIR}")
+        return
+    store = open_store()
+    print(f"Store {store.version}: {store.embeddings.shape} {store.embeddings.dtype}")
+
+    summary = run_all_pairs(
+        store,
+        k=args.k if args.command == "build" else 0,
+        workers=args.workers or None,
+        memory_mb=args.memory_mb,
+        threshold=args.threshold,
+        write_table=args.command == "build",
+    )
+    if args.command == "build":
+        print(f"[SUCCESS] Top-{summary['k']} neighbours of {summary['rows']} items "
+              f"in {summary['seconds']}s")
+    if args.threshold is not None:
+        print(f"[SUCCESS] {summary['duplicate_pairs']} near-duplicate pairs "
+              f"(similarity >= {args.threshold}) in {summary['duplicate_groups']} groups; "
+              f"{summary['droppable']} images can be dropped")
+        print(f"   - pairs: {store.artifact_path(DUPLICATES_FILE)}")
+        print(f"   - drop list: {store.artifact_path(DUPLICATES_DROP_FILE)}")
+    print(f"Saved to {store.path}")
+
+
+if __name__ == "__main__":
+    main()
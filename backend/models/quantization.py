@@ -0,0 +1,305 @@
+"""
+Compressed embedding encodings with asymmetric search and exact re-ranking.
+
+Codecs (all encode L2-normalized rows, so inner product == cosine):
+  float16  - half precision copy                       (2x smaller than float32)
+  int8     - per-dimension scalar quantization to uint8 (4x smaller)
+  pq       - product quantization: `m` sub-vectors, each replaced by the id of
+             one of 256 k-means centroids               (4 * D / m x smaller)
+
+QuantizedIndex keeps only the codes in memory. A query stays in float32 and
+is compared against the codes directly (asymmetric distance), the best
+`rerank` candidates are then re-scored exactly against the memory-mapped
+float store, which only touches those few rows.
+
+    python quantization.py build --codec pq --m 64
+    python quantization.py eval --codec pq --rerank 100
+"""
+
+import time
+import argparse
+import numpy as np
+
+try:
+    from models.ann_index import row_norms, top_k, similarity_scores, recall_at_k, CHUNK_ROWS
+    from models.ann_index import _normalize
+    from models.embedding_store import open_store, store_exists, STORE_DIR
+except ImportError:
+    from ann_index import row_norms, top_k, similarity_scores, recall_at_k, CHUNK_ROWS
+    from ann_index import _normalize
+    from embedding_store import open_store, store_exists, STORE_DIR
+
+CODECS = ("float16", "int8", "pq")
+DEFAULT_RERANK = 100
+PQ_CENTROIDS = 256
+
+
+def quantized_file(codec):
+    return f"quantized_{codec}.npz"
+
+
+def _normalized_chunks(embeddings, norms):
+    for start in range(0, len(embeddings), CHUNK_ROWS):
+        chunk = np.asarray(embeddings[start : start + CHUNK_ROWS], dtype=np.float32)
+        yield start, chunk / norms[start : start + len(chunk), None]
+
+
+def _sample(embeddings, norms, sample_size, rng):
+    rows = np.sort(rng.choice(len(embeddings), min(sample_size, len(embeddings)), replace=False))
+    return np.asarray(embeddings[rows], dtype=np.float32) / norms[rows, None]
+
+
+def _kmeans(points, k, iterations, rng):
+    """Plain Euclidean k-means (used per PQ sub-space)."""
+    k = min(k, len(points))
+    centroids = points[rng.choice(len(points), k, replace=False)].copy()
+    point_sq = (points ** 2).sum(axis=1, keepdims=True)
+    for _ in range(iterations):
+        distances = point_sq - 2 * points @ centroids.T + (centroids ** 2).sum(axis=1)
+        assign = np.argmin(distances, axis=1)
+        counts = np.bincount(assign, minlength=k)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assign, points)
+        empty = counts == 0
+        centroids[~empty] = sums[~empty] / counts[~empty, None]
+        centroids[empty] = points[rng.choice(len(points), int(empty.sum()))]
+    return centroids
+
+
+# ---------------------------------------------------------------------------
+# Codecs: encode(normalized chunk) -> codes, scores(codes chunk, query) -> ip
+# ---------------------------------------------------------------------------
+
+
+class Float16Codec:
+    name = "float16"
+
+    def fit(self, sample):
+        return self
+
+    def encode(self, chunk):
+        return chunk.astype(np.float16)
+
+    def prepare(self, query):
+        return query
+
+    def scores(self, codes, prepared):
+        return codes.astype(np.float32) @ prepared
+
+    def state(self):
+        return {}
+
+    def load_state(self, data):
+        return self
+
+
+class ScalarQuantizer:
+    """x ~= minimum + code * scale, per dimension, code in [0, 255]."""
+
+    name = "int8"
+
+    def fit(self, sample):
+        self.minimum = sample.min(axis=0).astype(np.float32)
+        span = sample.max(axis=0) - self.minimum
+        self.scale = np.where(span > 0, span / 255.0, 1.0).astype(np.float32)
+        return self
+
+    def encode(self, chunk):
+        codes = np.rint((chunk - self.minimum) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def prepare(self, query):
+        # <minimum + code*scale, q> = code @ (scale*q) + <minimum, q>
+        return self.scale * query, float(self.minimum @ query)
+
+    def scores(self, codes, prepared):
+        scaled_query, offset = prepared
+        return codes.astype(np.float32) @ scaled_query + offset
+
+    def state(self):
+        return {"minimum": self.minimum, "scale": self.scale}
+
+    def load_state(self, data):
+        self.minimum = data["minimum"]
+        self.scale = data["scale"]
+        return self
+
+
+class ProductQuantizer:
+    """m sub-spaces, each encoded as one byte indexing a 256-centroid codebook."""
+
+    name = "pq"
+
+    def __init__(self, m=64, iterations=15, seed=0):
+        self.m = m
+        self.iterations = iterations
+        self.seed = seed
+
+    def fit(self, sample):
+        dim = sample.shape[1]
+        if dim % self.m:
+            raise ValueError(f"dimension {dim} is not divisible by m={self.m}")
+        rng = np.random.default_rng(self.seed)
+        sub_dim = dim // self.m
+        self.codebooks = np.stack(
+            [
+                _kmeans(sample[:, j * sub_dim : (j + 1) * sub_dim], PQ_CENTROIDS, self.iterations, rng)
+                for j in range(self.m)
+            ]
+        ).astype(np.float32)  # (m, 256, sub_dim)
+        return self
+
+    def encode(self, chunk):
+        sub_dim = self.codebooks.shape[2]
+        codes = np.empty((len(chunk), self.m), dtype=np.uint8)
+        for j in range(self.m):
+            sub = chunk[:, j * sub_dim : (j + 1) * sub_dim]
+            book = self.codebooks[j]
+            distances = -2 * sub @ book.T + (book ** 2).sum(axis=1)
+            codes[:, j] = np.argmin(distances, axis=1)
+        return codes
+
+    def prepare(self, query):
+        # Lookup table of <q_j, centroid> for every sub-space j and centroid
+        sub_queries = query.reshape(self.m, -1)
+        return np.einsum("mcd,md->mc", self.codebooks, sub_queries)
+
+    def scores(self, codes, table):
+        return table[np.arange(self.m), codes].sum(axis=1)
+
+    def state(self):
+        return {"codebooks": self.codebooks}
+
+    def load_state(self, data):
+        self.codebooks = data["codebooks"]
+        self.m = self.codebooks.shape[0]
+        return self
+
+
+def make_codec(name, m=64):
+    if name == "float16":
+        return Float16Codec()
+    if name == "int8":
+        return ScalarQuantizer()
+    if name == "pq":
+        return ProductQuantizer(m=m)
+    raise ValueError(f"unknown codec {name}, expected one of {CODECS}")
+
+
+class QuantizedIndex:
+    """Asymmetric search over compressed codes + exact re-rank of the top candidates."""
+
+    def __init__(self, embeddings, codec, codes, norms=None):
+        self.embeddings = embeddings
+        self.codec = codec
+        self.codes = codes
+        self.norms = row_norms(embeddings) if norms is None else norms
+        self.rerank = DEFAULT_RERANK
+
+    @property
+    def kind(self):
+        return self.codec.name
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    @classmethod
+    def build(cls, embeddings, codec, sample_size=50000, seed=0):
+        norms = row_norms(embeddings)
+        codec.fit(_sample(embeddings, norms, sample_size, np.random.default_rng(seed)))
+        parts = [codec.encode(chunk) for _, chunk in _normalized_chunks(embeddings, norms)]
+        return cls(embeddings, codec, np.concatenate(parts), norms)
+
+    def save(self, path):
+        np.savez(
+            path,
+            codec=self.codec.name,
+            n_rows=len(self.embeddings),
+            codes=self.codes,
+            **self.codec.state(),
+        )
+
+    @classmethod
+    def load(cls, embeddings, path, norms=None):
+        with np.load(path) as data:
+            if int(data["n_rows"]) != len(embeddings):
+                raise ValueError(
+                    f"codes built for {int(data['n_rows'])} rows, store has {len(embeddings)}"
+                )
+            codec = make_codec(str(data["codec"])).load_state(data)
+            return cls(embeddings, codec, data["codes"], norms)
+
+    def memory_bytes(self):
+        return int(self.codes.nbytes + self.norms.nbytes)
+
+    def _approximate_scores(self, prepared, rows):
+        if rows is not None:
+            return self.codec.scores(self.codes[rows], prepared)
+        scores = np.empty(len(self.codes), dtype=np.float32)
+        for start in range(0, len(self.codes), CHUNK_ROWS):
+            chunk = self.codes[start : start + CHUNK_ROWS]
+            scores[start : start + len(chunk)] = self.codec.scores(chunk, prepared)
+        return scores
+
+    def search(self, query, k, rows=None):
+        """
+        Return (row_indices, scores) of the k best rows. Scores are exact
+        cosine similarities of the re-ranked candidates.
+        """
+        query = _normalize(query)
+        approximate = self._approximate_scores(self.codec.prepare(query), rows)
+        shortlist = top_k(approximate, max(k, self.rerank))
+        candidates = shortlist if rows is None else rows[shortlist]
+
+        # Exact re-rank: reads only the shortlisted rows from the float store
+        order = np.sort(candidates)
+        exact = similarity_scores(self.embeddings, query, order) / self.norms[order]
+        top = top_k(exact, k)
+        return order[top], exact[top]
+
+    def search_batch(self, queries, k, rows_list):
+        return [self.search(query, k, rows) for query, rows in zip(queries, rows_list)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or evaluate quantized embeddings")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="encode the current store")
+    build.add_argument("--codec", choices=CODECS, default="pq")
+    build.add_argument("--m", type=int, default=64, help="PQ sub-spaces")
+
+    evaluate = sub.add_parser("eval", help="recall@k and memory vs exact float32 search")
+    evaluate.add_argument("--codec", choices=CODECS, default="pq")
+    evaluate.add_argument("--rerank", type=int, default=DEFAULT_RERANK)
+    evaluate.add_argument("--queries", type=int, default=200)
+    evaluate.add_argument("-k", type=int, default=5)
+
+    args = parser.parse_args()
+    if not store_exists():
+        print(f"[ERROR] No embedding store at {STORE_DIR}")
+        return
+    store = open_store()
+    path = store.artifact_path(quantized_file(args.codec))
+    float_bytes = store.embeddings.shape[0] * store.embeddings.shape[1] * 4
+
+    if args.command == "build":
+        start = time.perf_counter()
+        index = QuantizedIndex.build(store.embeddings, make_codec(args.codec, args.m))
+        index.save(path)
+        print(f"[SUCCESS] {args.codec} codes built in {time.perf_counter() - start:.1f}s")
+        print(f"Saved to {path}")
+    else:
+        index = QuantizedIndex.load(store.embeddings, path)
+        index.rerank = args.rerank
+        stats = recall_at_k(index, store.embeddings, args.k, args.queries)
+        print(f"recall@{args.k} ({args.codec}, rerank={args.rerank}): {stats['recall']:.4f}")
+        print(f"exact: {stats['exact_ms']:.2f} ms/query, {args.codec}: {stats['ann_ms']:.2f} ms/query")
+
+    memory = index.memory_bytes()
+    print(f"In-memory size: {memory / 1e6:.1f} MB vs {float_bytes / 1e6:.1f} MB float32 "
+          f"({float_bytes / memory:.1f}x smaller)")
+
+
+if __name__ == "__main__":
+    main()
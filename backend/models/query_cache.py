@@ -0,0 +1,90 @@
+"""
+Size- and memory-bounded LRU caches for recommendation queries.
+
+Users often re-upload the same photo (retries, switching the gender filter).
+The recommender keeps two levels keyed by a content hash of the upload:
+  - query embeddings:  hash -> CNN feature vector (skips the forward pass)
+  - top-k results:     (hash, gender, top_k) -> result list (skips the search)
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+def content_hash(data):
+    """Stable key for uploaded image bytes or a decoded image array."""
+    digest = hashlib.sha256()
+    if isinstance(data, np.ndarray):
+        digest.update(f"{data.shape}{data.dtype}".encode("utf-8"))
+        digest.update(np.ascontiguousarray(data).tobytes())
+    else:
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class LRUCache:
+    """
+    Thread-safe LRU cache bounded by entry count and by approximate memory.
+    sizeof(value) returns the byte size charged for an entry.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=64 * 1024 * 1024, sizeof=None, name="cache"):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.name = name
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._entries[key] = (value, size)
+            self.bytes += size
+            while len(self._entries) > self.max_entries or self.bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.bytes,
+            "max_entries": self.max_entries,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
@@ -1,111 +1,609 @@
 # -*- coding: utf-8 -*-
 
 import os
+import time
 import pickle
+import threading
 import numpy as np
-from sklearn.metrics.pairwise import cosine_similarity
 import pandas as pd
 
 # Try importing from models package (app context) or fallback to local import
 try:
-    from models.cnn_feature_extractor import extract_features, model
+    from models import model_registry
+    from models.model_registry import get_extractor
+    from models.cnn_feature_extractor import preprocess_upload, config_mismatches
+    from models.micro_batcher import MicroBatcher
+    from models.query_cache import LRUCache, content_hash
+    from models.ann_index import load_index, ExactIndex
+    from models.embedding_store import open_store, store_exists, current_version, id_from_path
+    from models.metadata import load_metadata, STYLES_CSV
+    from models.neighbours import NeighbourTable
 except ImportError:
     try:
-        from cnn_feature_extractor import extract_features, model
+        import model_registry
+        from model_registry import get_extractor
+        from cnn_feature_extractor import preprocess_upload, config_mismatches
+        from micro_batcher import MicroBatcher
+        from query_cache import LRUCache, content_hash
+        from ann_index import load_index, ExactIndex
+        from embedding_store import open_store, store_exists, current_version, id_from_path
+        from metadata import load_metadata, STYLES_CSV
+        from neighbours import NeighbourTable
     except ImportError:
         import sys
 
         sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-        from cnn_feature_extractor import extract_features, model
+        import model_registry
+        from model_registry import get_extractor
+        from cnn_feature_extractor import preprocess_upload, config_mismatches
+        from micro_batcher import MicroBatcher
+        from query_cache import LRUCache, content_hash
+        from ann_index import load_index, ExactIndex
+        from embedding_store import open_store, store_exists, current_version, id_from_path
+        from metadata import load_metadata, STYLES_CSV
+        from neighbours import NeighbourTable
+
+# Stage timings go to the app's /metrics when running inside the Flask app
+try:
+    from app.utils.metrics import span
+except ImportError:
+    from contextlib import nullcontext
+
+    def span(name, **labels):
+        return nullcontext()
+
+STAGE_METRIC = "recommend_stage_seconds"
 
 # Load saved data
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 EMBEDDINGS_PATH = os.path.join(BASE_DIR, "embeddings.pkl")
 FILENAMES_PATH = os.path.join(BASE_DIR, "filenames.pkl")
 
-# Check if files exist
-if not os.path.exists(EMBEDDINGS_PATH) or not os.path.exists(FILENAMES_PATH):
-    print("[ERROR] Error: Model files not found in models directory")
-    embeddings = []
-    filenames = []
-else:
+ALLOW_CONFIG_MISMATCH = os.environ.get("RECOMMENDER_ALLOW_CONFIG_MISMATCH", "0") == "1"
+
+
+def _check_extractor_config(header):
+    """
+    Catalog rows are only comparable with query vectors from the same
+    extractor. Returns False when the store must not be served.
+    """
+    stored = header.get("extractor")
+    if stored is None:
+        print("[WARNING] Embedding store has no extractor config (legacy store); "
+              "regenerate it with generate_embeddings.py")
+        return True
+    mismatches = config_mismatches(stored)
+    if mismatches:
+        print(f"[ERROR] Embedding store extractor config differs from the server: {mismatches}")
+        if not ALLOW_CONFIG_MISMATCH:
+            print("[ERROR] Refusing to serve it (set RECOMMENDER_ALLOW_CONFIG_MISMATCH=1 to override)")
+            return False
+    return True
+
+
+class Catalog:
+    """
+    Everything derived from one embedding store version: matrix, index,
+    metadata, gender rows, neighbour table. Built completely before it is
+    published and never mutated afterwards, so a request that took a
+    reference keeps a consistent view even if a reload swaps in a new one.
+    """
+
+    def __init__(self, embeddings, filenames, artifact_dir=BASE_DIR, store=None, version=None,
+                 styles_csv=STYLES_CSV):
+        self.embeddings = embeddings
+        self.filenames = filenames
+        # Derived artifacts (indexes, codes) live next to the embeddings
+        self.artifact_dir = artifact_dir
+        self.store = store
+        self.version = version or (store.version if store is not None else "legacy")
+        self.styles_csv = styles_csv
+        self.index = None
+        self.exact_index = None
+        self.metadata = None
+        self.gender_rows = {}
+        self.item_rows = {}
+        self.neighbour_table = None
+        if len(embeddings):
+            self._build()
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def _build(self):
+        store = self.store
+        # Search index (IVF when built, exact otherwise; see ann_index.py)
+        normalized = bool(store and store.header.get("normalized"))
+        self.index = load_index(self.embeddings, artifact_dir=self.artifact_dir, normalized=normalized)
+        # Brute force over filtered subsets (exact results, see _index_for)
+        self.exact_index = (
+            self.index if isinstance(self.index, ExactIndex)
+            else ExactIndex(self.embeddings, getattr(self.index, "norms", None), normalized)
+        )
+
+        # Load metadata: styles.csv attributes as columns aligned with the
+        # embedding rows, cached next to the store (see metadata.py)
+        row_ids = store.ids if store is not None else [id_from_path(p) for p in self.filenames]
+        try:
+            self.metadata = load_metadata(row_ids, self.artifact_dir, self.styles_csv)
+            if self.metadata is None:
+                print("❌ styles.csv not found")
+            else:
+                print(f"✅ Metadata loaded: {int((self.metadata.codes['gender'] > 0).sum())} items")
+        except Exception as e:
+            print(f"❌ Error loading CSV: {e}")
+        self.gender_rows = self._build_gender_rows()
+
+        # Item-to-item: product id -> row, and the precomputed neighbour table
+        # (python neighbours.py build) when it exists for this store
+        self.item_rows = {int(item_id): row for row, item_id in enumerate(row_ids) if item_id >= 0}
+        self.neighbour_table = NeighbourTable.load(self.artifact_dir, len(self.embeddings))
+        if self.neighbour_table is not None:
+            print(f"[SUCCESS] Neighbour table loaded: top-{self.neighbour_table.k} per item")
+
+    def _build_gender_rows(self):
+        """
+        Eligible embedding rows per gender, computed once at load time.
+        A gender's rows are the items of that gender plus Unisex items; the
+        "Unisex" / no-filter case searches every row (None).
+        """
+        metadata = self.metadata
+        if metadata is None:
+            unisex = np.zeros(len(self.filenames), dtype=bool)
+        else:
+            unisex = metadata.mask("gender", "Unisex")
+        rows = {"Unisex": None}
+        for gender in ("Men", "Women", "Boys", "Girls"):
+            matches = metadata.mask("gender", gender) if metadata is not None else unisex
+            rows[gender] = np.flatnonzero(matches | unisex)
+        # Any other requested gender can only match Unisex items
+        rows[""] = np.flatnonzero(unisex)
+        return rows
+
+
+def load_catalog(version=None):
+    """
+    Open a store version (CURRENT by default) and build its Catalog.
+    Raises if the store cannot be opened or must not be served.
+    """
+    # Memory-mapped store: pages are shared between worker processes
+    store = open_store(version=version)
+    if not _check_extractor_config(store.header):
+        raise ValueError(f"store {store.version} was built with a different extractor")
+    print(f"[SUCCESS] Recommender Loaded (store {store.version})")
+    print("Embeddings:", store.embeddings.shape, store.embeddings.dtype)
+    print("Filenames:", len(store.filenames))
+    return Catalog(store.embeddings, store.filenames, store.path, store)
+
+
+def _load_initial_catalog():
+    if store_exists():
+        try:
+            catalog = load_catalog()
+            stored = catalog.store.header.get("extractor") or {}
+            model_registry.expect_weights_hash(stored.get("weights_hash"))
+            return catalog
+        except Exception as e:
+            print(f"[ERROR] Error opening embedding store: {e}")
+            return Catalog([], [])
+    if not os.path.exists(EMBEDDINGS_PATH) or not os.path.exists(FILENAMES_PATH):
+        print("[ERROR] Error: Model files not found in models directory")
+        return Catalog([], [])
     try:
         embeddings = pickle.load(open(EMBEDDINGS_PATH, "rb"))
         filenames = pickle.load(open(FILENAMES_PATH, "rb"))
         embeddings = np.array(embeddings)
-        print("[SUCCESS] Recommender Loaded")
+        print("[SUCCESS] Recommender Loaded (legacy pickles)")
+        print("[WARNING] Run 'python embedding_store.py migrate' for faster startup")
         print("Embeddings:", embeddings.shape)
         print("Filenames:", len(filenames))
+        return Catalog(embeddings, filenames)
     except Exception as e:
         print(f"[ERROR] Error loading pickle files: {e}")
-        embeddings = []
-        filenames = []
+        return Catalog([], [])
+
+
+# The published catalog. Readers take one reference per request; reloads
+# replace it with a single assignment (atomic under the GIL).
+_catalog = _load_initial_catalog()
+
+
+def current_catalog():
+    return _catalog
 
-# Load metadata
-STYLES_CSV = os.path.join(BASE_DIR, "../../data/datasets/styles.csv")
-gender_dict = {}
-if os.path.exists(STYLES_CSV):
-    try:
-        with open(STYLES_CSV, "r", encoding="utf-8") as f:
-            next(f)  # skip header
-            for line in f:
-                parts = line.strip().split(",")
-                if len(parts) >= 2:
-                    try:
-                        item_id = int(parts[0])
-                        gender = parts[1]
-                        gender_dict[item_id] = gender
-                    except ValueError:
-                        continue  # skip bad lines
-        print(f"✅ Metadata loaded: {len(gender_dict)} items")
-    except Exception as e:
-        print(f"❌ Error loading CSV: {e}")
-else:
-    print("❌ styles.csv not found")
 
+def _filter_key(filters):
+    """Hashable, order-independent form of an attribute filter dict (None if empty)."""
+    if not filters:
+        return None
+    return tuple(
+        sorted(
+            (name, tuple(sorted(values)) if isinstance(values, (list, tuple)) else values)
+            for name, values in filters.items()
+        )
+    )
 
-def get_id_from_path(path):
-    filename = os.path.basename(path)
-    id_str = filename.split(".")[0]
-    return int(id_str)
 
+# Filtered subsets brute-forced instead of going through the ANN index when
+# they hold at most RECOMMENDER_BRUTE_FORCE_FRACTION of the catalog (and
+# always when they hold at most RECOMMENDER_BRUTE_FORCE_ROWS rows)
+BRUTE_FORCE_FRACTION = float(os.environ.get("RECOMMENDER_BRUTE_FORCE_FRACTION", 0.1))
+BRUTE_FORCE_ROWS = int(os.environ.get("RECOMMENDER_BRUTE_FORCE_ROWS", 2000))
+search_plans = {"index": 0, "brute_force": 0}
 
-def recommend(image_path, user_gender=None, top_k=5):
+# Eligible rows per (version, gender, filters): a few vectorized masks,
+# reused by every query with the same filters
+filter_cache = LRUCache(
+    max_entries=int(os.environ.get("RECOMMENDER_FILTER_CACHE_ENTRIES", 256)),
+    max_bytes=int(float(os.environ.get("RECOMMENDER_FILTER_CACHE_MB", 32)) * 1024 * 1024),
+    sizeof=lambda rows: rows.nbytes,
+    name="filter_rows",
+)
+
+
+def _eligible_rows(catalog, user_gender, filters=None):
+    """Sorted eligible row indices for the gender and attribute filters (None = all)."""
+    gender_rows = catalog.gender_rows
+    base = None if user_gender is None else gender_rows.get(user_gender, gender_rows[""])
+    key = _filter_key(filters)
+    if key is None:
+        return base
+
+    cache_key = (catalog.version, user_gender, key)
+    cached = filter_cache.get(cache_key)
+    if cached is not None:
+        return cached
+    if catalog.metadata is None:
+        raise ValueError("attribute filters need styles.csv metadata")
+    mask = catalog.metadata.filter_mask(filters)
+    if base is not None:
+        gender_mask = np.zeros(len(mask), dtype=bool)
+        gender_mask[base] = True
+        mask &= gender_mask
+    rows = np.flatnonzero(mask)
+    filter_cache.put(cache_key, rows)
+    return rows
+
+
+def _index_for(catalog, rows):
+    """
+    Query plan: a selective filter leaves few rows, and scanning them all is
+    both exact and cheaper than probing the ANN index; broad (or no) filters
+    go through the index, which restricts its traversal to the eligible rows.
+    Selectivity is relative to the catalog: the index scans a fraction of it.
+    """
+    limit = max(BRUTE_FORCE_ROWS, BRUTE_FORCE_FRACTION * len(catalog))
+    if rows is not None and len(rows) <= limit:
+        search_plans["brute_force"] += 1
+        return catalog.exact_index
+    search_plans["index"] += 1
+    return catalog.index
+
+
+def _search(catalog, query_embedding, user_gender, top_k, filters=None):
+    # Similarity + top-k only over the rows eligible for this gender/filters
+    with span(STAGE_METRIC, stage="filter"):
+        rows = _eligible_rows(catalog, user_gender, filters)
+    with span(STAGE_METRIC, stage="similarity"):
+        top_rows, similarities = _index_for(catalog, rows).search(query_embedding, top_k, rows)
+    filenames = catalog.filenames
+    return [(filenames[idx], similarity) for idx, similarity in zip(top_rows, similarities)]
+
+
+def recommend(image_path, user_gender=None, top_k=5, filters=None):
     """
     Generate recommendations for a given image path.
     Returns a list of tuples (image_path, similarity_score).
     If user_gender is provided, filters results to match the gender.
+    filters: optional attribute filters, e.g. {"articleType": ["Shirts"],
+    "season": "Summer", "year_min": 2012} (see metadata.FILTER_COLUMNS).
     """
-    if len(embeddings) == 0:
+    catalog = _catalog
+    if len(catalog) == 0:
         print("[ERROR] Embeddings not loaded, cannot recommend.")
         return []
 
     try:
-        # Extract query features
-        # Note: extract_features in cnn_feature_extractor takes (img_path, model)
-        query_embedding = extract_features(image_path, model)
-
-        # Compute similarity
-        similarities = cosine_similarity([query_embedding], embeddings)[0]
-
-        # Get all indices sorted by similarity descending
-        all_indices = np.argsort(similarities)[::-1]
-
-        # Filter by gender
-        filtered_results = []
-        for idx in all_indices:
-            if user_gender is None or user_gender == "Unisex":
-                # Return all items for "Unisex" or no filter
-                filtered_results.append((filenames[idx], similarities[idx]))
-            else:
-                item_id = get_id_from_path(filenames[idx])
-                item_gender = gender_dict.get(item_id)
-                # Include matching gender OR items marked as Unisex
-                if item_gender == user_gender or item_gender == "Unisex":
-                    filtered_results.append((filenames[idx], similarities[idx]))
-
-            if len(filtered_results) == top_k:
-                break
+        # Extract query features with the shared, warmed-up extractor
+        # (the span includes reading and decoding the file)
+        with span(STAGE_METRIC, stage="cnn"):
+            query_embedding = get_extractor().extract(image_path)
+        filtered_results = _search(catalog, query_embedding, user_gender, top_k, filters)
+
+        print(f"✅ Recommendations generated: {len(filtered_results)} items")
+        return filtered_results
+
+    except Exception as e:
+        print("[ERROR] Recommendation Error:", e)
+        return []
+
+
+def _recommend_batch(queries):
+    """
+    Micro-batch handler: queries is a list of (catalog, image, user_gender,
+    top_k, filters). Runs one forward pass for all decodable images and one
+    similarity product per query plan, then selects each query's own top k.
+    Each query is answered from the catalog it was submitted with, even if
+    a reload happened while it waited. Each result is (matches, query_embedding).
+    """
+    results = [None] * len(queries)
+    arrays, positions, rows_list = [], [], []
+    for position, (catalog, image_data, user_gender, _, filters) in enumerate(queries):
+        try:
+            with span(STAGE_METRIC, stage="filter"):
+                rows = _eligible_rows(catalog, user_gender, filters)
+            with span(STAGE_METRIC, stage="decode"):
+                array = preprocess_upload(image_data)
+        except Exception as e:
+            results[position] = e
+            continue
+        rows_list.append(rows)
+        arrays.append(array)
+        positions.append(position)
+
+    if arrays:
+        with span(STAGE_METRIC, stage="cnn"):
+            query_embeddings = get_extractor().embed_batch(np.stack(arrays))
+        max_k = max(queries[p][3] for p in positions)
+
+        # Group the batch by plan (an index of one catalog) so each group
+        # still shares one search_batch
+        plans = [_index_for(queries[p][0], rows) for p, rows in zip(positions, rows_list)]
+        hits = [None] * len(positions)
+        for plan in {id(plan): plan for plan in plans}.values():
+            members = [i for i, other in enumerate(plans) if other is plan]
+            with span(STAGE_METRIC, stage="similarity"):
+                group_hits = plan.search_batch(
+                    [query_embeddings[i] for i in members], max_k, [rows_list[i] for i in members]
+                )
+            for i, hit in zip(members, group_hits):
+                hits[i] = hit
+
+        for position, query_embedding, (top_rows, similarities) in zip(
+            positions, query_embeddings, hits
+        ):
+            filenames = queries[position][0].filenames
+            top_k = queries[position][3]
+            matches = [
+                (filenames[idx], similarity)
+                for idx, similarity in zip(top_rows[:top_k], similarities[:top_k])
+            ]
+            results[position] = (matches, query_embedding)
+    return results
+
+
+def similar_items(item_id, top_k=5):
+    """
+    Catalog items most similar to catalog item `item_id`, as a list of
+    (image_path, similarity_score), or None if the item is not in the catalog.
+    Served from the neighbour table; falls back to an index search when the
+    table is missing or holds fewer than top_k neighbours.
+    """
+    catalog = _catalog
+    row = catalog.item_rows.get(int(item_id))
+    if row is None:
+        return None
+
+    neighbour_table = catalog.neighbour_table
+    if neighbour_table is not None and top_k <= neighbour_table.k:
+        top_rows, similarities = neighbour_table.lookup(row, top_k)
+    else:
+        query = np.asarray(catalog.embeddings[row], dtype=np.float32)
+        top_rows, similarities = catalog.index.search(query, top_k + 1)
+        keep = top_rows != row
+        top_rows, similarities = top_rows[keep][:top_k], similarities[keep][:top_k]
+    filenames = catalog.filenames
+    return [(filenames[idx], float(similarity)) for idx, similarity in zip(top_rows, similarities)]
+
+
+# Concurrent uploads are grouped into batches of up to RECOMMENDER_MAX_BATCH,
+# waiting at most RECOMMENDER_MAX_WAIT_MS for a batch to fill. A query whose
+# batch has not answered within RECOMMENDER_BATCH_TIMEOUT seconds is run alone.
+BATCHING_ENABLED = os.environ.get("RECOMMENDER_BATCHING", "1") != "0"
+batcher = MicroBatcher(
+    _recommend_batch,
+    max_batch=int(os.environ.get("RECOMMENDER_MAX_BATCH", 16)),
+    max_wait_ms=float(os.environ.get("RECOMMENDER_MAX_WAIT_MS", 5)),
+    name="recommend-batcher",
+    timeout=float(os.environ.get("RECOMMENDER_BATCH_TIMEOUT", 30)),
+)
+
+
+_MB = 1024 * 1024
+
+# Query embeddings keyed by upload content hash, and top-k results keyed by
+# (catalog version, hash, gender, top_k, filters).
+# Sizes: RECOMMENDER_*_CACHE_ENTRIES / *_CACHE_MB.
+embedding_cache = LRUCache(
+    max_entries=int(os.environ.get("RECOMMENDER_EMBEDDING_CACHE_ENTRIES", 2048)),
+    max_bytes=int(float(os.environ.get("RECOMMENDER_EMBEDDING_CACHE_MB", 32)) * _MB),
+    sizeof=lambda vector: vector.nbytes,
+    name="query_embeddings",
+)
+result_cache = LRUCache(
+    max_entries=int(os.environ.get("RECOMMENDER_RESULT_CACHE_ENTRIES", 8192)),
+    max_bytes=int(float(os.environ.get("RECOMMENDER_RESULT_CACHE_MB", 16)) * _MB),
+    sizeof=lambda matches: 64 + sum(len(path) + 48 for path, _ in matches),
+    name="query_results",
+)
+
+
+# ---------------------------------------------------------------------------
+# Hot reload: load a new store version in the background, validate it, then
+# swap the published catalog. In-flight requests finish on the old one.
+# ---------------------------------------------------------------------------
+
+_reload_lock = threading.Lock()
+_watcher_thread = None
+reload_status = {
+    "state": "idle",  # idle -> loading -> idle | failed
+    "version": _catalog.version,
+    "error": None,
+    "failed_version": None,
+    "reloads": 0,
+    "last_reload": None,
+    "load_seconds": None,
+}
+
+
+def _validate(catalog):
+    """Sanity checks before a catalog may be served; raises ValueError."""
+    if len(catalog) == 0:
+        raise ValueError("store is empty")
+    if len(catalog.filenames) != len(catalog.embeddings):
+        raise ValueError("filenames and embeddings differ in length")
+
+    extractor_hash = model_registry.status().get("weights_hash")
+    stored = {}
+    if catalog.store is not None:
+        stored = catalog.store.header.get("extractor") or {}
+    if extractor_hash and stored.get("weights_hash") and stored["weights_hash"] != extractor_hash:
+        raise ValueError(
+            f"store was embedded with weights {stored['weights_hash']}, "
+            f"the loaded extractor has {extractor_hash}"
+        )
+
+    # Every probed row must find itself (or an identical duplicate) first.
+    # Exact search: approximate scores (pq/int8/reduced without re-rank) can
+    # legitimately fall below the threshold; the serving index only has to answer.
+    rng = np.random.default_rng(0)
+    for row in rng.choice(len(catalog), min(8, len(catalog)), replace=False):
+        query = np.asarray(catalog.embeddings[row], dtype=np.float32)
+        if not np.all(np.isfinite(query)):
+            raise ValueError(f"row {row} has non-finite values")
+        _, similarities = catalog.exact_index.search(query, 1)
+        if len(similarities) == 0 or similarities[0] < 0.99:
+            raise ValueError(f"store self-check failed for row {row}")
+        if len(catalog.index.search(query, 1)[0]) == 0:
+            raise ValueError(f"index self-check failed for row {row}")
+
+
+def reload_catalog(version=None, force=False):
+    """
+    Load store `version` (the CURRENT one by default), validate it and
+    atomically publish it. Returns (outcome, message), outcome being
+    "reloaded", "unchanged" or "failed"; on failure the current catalog
+    keeps serving.
+    """
+    global _catalog
+    with _reload_lock:
+        try:
+            version = version or current_version()
+        except OSError as e:
+            return "failed", f"no embedding store: {e}"
+        if version == _catalog.version and not force:
+            return "unchanged", f"already serving {version}"
+
+        reload_status.update(state="loading", error=None)
+        start = time.perf_counter()
+        try:
+            catalog = load_catalog(version)
+            _validate(catalog)
+        except Exception as e:
+            reload_status.update(state="failed", error=str(e), failed_version=version)
+            print(f"[ERROR] Reload of store {version} failed, still serving "
+                  f"{_catalog.version}: {e}")
+            return "failed", str(e)
+
+        previous = _catalog.version
+        _catalog = catalog
+        stored = catalog.store.header.get("extractor") or {}
+        model_registry.expect_weights_hash(stored.get("weights_hash"))
+        # Old keys carry the old version and can never hit again
+        result_cache.clear()
+        filter_cache.clear()
+        reload_status.update(
+            state="idle",
+            version=catalog.version,
+            failed_version=None,
+            reloads=reload_status["reloads"] + 1,
+            last_reload=time.strftime("%Y-%m-%dT%H:%M:%S"),
+            load_seconds=round(time.perf_counter() - start, 3),
+        )
+        print(f"[SUCCESS] Recommender switched from store {previous} to {catalog.version} "
+              f"({reload_status['load_seconds']}s)")
+        return "reloaded", f"now serving {catalog.version}"
+
+
+def _watch_store(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            # A version that failed validation is not retried until it changes
+            version = current_version() if store_exists() else None
+            if version and version not in (_catalog.version, reload_status["failed_version"]):
+                reload_catalog(version)
+        except Exception as e:
+            print(f"[WARNING] Store watcher: {e}")
+
+
+def start_store_watcher(interval=None):
+    """
+    Poll the store's CURRENT pointer every RECOMMENDER_RELOAD_INTERVAL
+    seconds (default 30, 0 disables) and reload when it changes. Call once
+    per worker process at server start.
+    """
+    global _watcher_thread
+    interval = float(interval if interval is not None
+                     else os.environ.get("RECOMMENDER_RELOAD_INTERVAL", 30))
+    if interval <= 0 or _watcher_thread is not None:
+        return
+    _watcher_thread = threading.Thread(
+        target=_watch_store, args=(interval,), name="store-watcher", daemon=True
+    )
+    _watcher_thread.start()
+
+
+def cache_stats():
+    """Hit/miss counters of the query caches and micro-batcher, for monitoring."""
+    return {
+        "embedding_cache": embedding_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "batcher": batcher.stats(),
+        "filter_cache": filter_cache.stats(),
+        "search_plans": dict(search_plans),
+        "catalog": dict(reload_status, rows=len(_catalog)),
+    }
+
+
+def recommend_from_bytes(image_bytes, user_gender=None, top_k=5, filters=None):
+    """
+    Same as recommend(), but for an uploaded image held in memory: encoded
+    bytes (JPEG/PNG...) or an already decoded RGB array. Nothing touches disk.
+    Repeated uploads are served from the query caches; otherwise the query
+    goes through the micro-batcher unless RECOMMENDER_BATCHING=0.
+    """
+    catalog = _catalog
+    if len(catalog) == 0:
+        print("[ERROR] Embeddings not loaded, cannot recommend.")
+        return []
+
+    try:
+        with span(STAGE_METRIC, stage="cache_lookup"):
+            image_hash = content_hash(image_bytes)
+            result_key = (catalog.version, image_hash, user_gender, top_k, _filter_key(filters))
+            cached = result_cache.get(result_key)
+        if cached is not None:
+            return list(cached)
+
+        query_embedding = embedding_cache.get(image_hash)
+        if query_embedding is not None:
+            filtered_results = _search(catalog, query_embedding, user_gender, top_k, filters)
+        elif BATCHING_ENABLED:
+            # Queueing plus the shared batch (its decode/cnn/similarity
+            # stages are recorded separately by the batch handler)
+            with span(STAGE_METRIC, stage="batch_wait"):
+                filtered_results, query_embedding = batcher(
+                    (catalog, image_bytes, user_gender, top_k, filters)
+                )
+            embedding_cache.put(image_hash, query_embedding)
+        else:
+            with span(STAGE_METRIC, stage="cnn"):
+                query_embedding = get_extractor().extract_bytes(image_bytes)
+            embedding_cache.put(image_hash, query_embedding)
+            filtered_results = _search(catalog, query_embedding, user_gender, top_k, filters)
+
+        result_cache.put(result_key, list(filtered_results))
 
         print(f"✅ Recommendations generated: {len(filtered_results)} items")
         return filtered_results
@@ -0,0 +1,111 @@
+import numpy as np
+
+from models.ann_index import INDEX_FILE, ExactIndex, IVFIndex, load_index, recall_at_k
+
+
+def _clustered(n_rows=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    labels = rng.integers(clusters, size=n_rows)
+    return (centres[labels] + 0.3 * rng.standard_normal((n_rows, dim))).astype(np.float16)
+
+
+def _brute_force(embeddings, query, k):
+    matrix = embeddings.astype(np.float32)
+    scores = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    return np.argsort(-scores)[:k]
+
+
+def test_exact_index_matches_brute_force():
+    embeddings = _clustered()
+    index = ExactIndex(embeddings)
+    query = embeddings[17].astype(np.float32)
+
+    rows, scores = index.search(query, 10)
+
+    np.testing.assert_array_equal(np.sort(rows), np.sort(_brute_force(embeddings, query, 10)))
+    assert rows[0] == 17
+    assert np.all(np.diff(scores) <= 0)  # best first
+
+
+def test_ivf_probing_every_cell_is_exact():
+    embeddings = _clustered()
+    index = IVFIndex.build(embeddings, nlist=16, seed=0)
+
+    assert recall_at_k(index, embeddings, k=10, queries=50, nprobe=16)["recall"] == 1.0
+
+
+def test_ivf_recall_on_clustered_data():
+    embeddings = _clustered()
+    index = IVFIndex.build(embeddings, nlist=16, seed=0)
+
+    assert recall_at_k(index, embeddings, k=10, queries=100, nprobe=4)["recall"] >= 0.9
+
+
+def test_ivf_prefilter_returns_k_eligible_rows():
+    embeddings = _clustered()
+    index = IVFIndex.build(embeddings, nlist=16, seed=0)
+    rows = np.arange(0, len(embeddings), 97)  # too few per cell for nprobe=1
+
+    found, _ = index.search(embeddings[5].astype(np.float32), 10, rows=rows, nprobe=1)
+
+    assert len(found) == 10
+    assert set(found.tolist()) <= set(rows.tolist())
+
+
+def test_exact_search_batch_matches_single_searches():
+    embeddings = _clustered()
+    index = ExactIndex(embeddings)
+    rng = np.random.default_rng(3)
+    queries = [embeddings[row].astype(np.float32) for row in (3, 400, 1200)]
+    rows_list = [
+        np.sort(rng.choice(len(embeddings), 50, replace=False)),
+        np.sort(rng.choice(len(embeddings), 300, replace=False)),
+        np.arange(0, len(embeddings), 7),
+    ]
+
+    for rows_case in (rows_list, [rows_list[0], None, rows_list[2]]):
+        batch = index.search_batch(queries, 10, rows_case)
+        for query, rows, (found, scores) in zip(queries, rows_case, batch):
+            expected, expected_scores = index.search(query, 10, rows)
+            np.testing.assert_array_equal(found, expected)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+
+
+def test_exact_search_batch_scores_only_the_union_of_filtered_rows(monkeypatch):
+    from models import ann_index
+
+    embeddings = _clustered()
+    scored = []
+    original = ann_index.similarity_scores
+
+    def counting(matrix, query, rows=None):
+        result = original(matrix, query, rows)
+        scored.append(len(result))
+        return result
+
+    monkeypatch.setattr(ann_index, "similarity_scores", counting)
+    rows_list = [np.array([1, 5, 9, 20]), np.array([5, 30, 31])]
+    ExactIndex(embeddings).search_batch([embeddings[1], embeddings[30]], 2, rows_list)
+
+    assert scored == [6]
+
+
+def test_normalized_rows_skip_the_norm_division(tmp_path):
+    embeddings = _clustered().astype(np.float32)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    query = embeddings[11]
+    rows = np.arange(0, len(embeddings), 3)
+
+    plain = ExactIndex(embeddings)
+    unit = load_index(embeddings, mode="exact", artifact_dir=str(tmp_path), normalized=True)
+
+    assert unit.normalized and unit._divisor is None
+    for expected, found in zip(plain.search(query, 10, rows), unit.search(query, 10, rows)):
+        np.testing.assert_allclose(found, expected, rtol=1e-5)
+
+    ivf = IVFIndex.build(embeddings, nlist=16, seed=0)
+    ivf.save(tmp_path / INDEX_FILE)
+    loaded = load_index(embeddings, mode="ivf", artifact_dir=str(tmp_path), normalized=True)
+    assert isinstance(loaded, IVFIndex) and loaded._divisor is None
+    np.testing.assert_array_equal(loaded.search(query, 10)[0], ivf.search(query, 10)[0])
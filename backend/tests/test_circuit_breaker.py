@@ -0,0 +1,88 @@
+import time
+
+import pytest
+
+pytest.importorskip("pymongo")
+
+from app.database.circuit_breaker import CircuitBreaker, DatabaseUnavailable  # noqa: E402
+
+
+class Flaky:
+    """attempt() that fails `failures` times, then succeeds."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise ConnectionError(f"down (call {self.calls})")
+        return "client"
+
+
+def test_closed_breaker_passes_calls_through():
+    breaker = CircuitBreaker("test", cooldown=0.05, max_cooldown=1, wait=0.1)
+
+    assert breaker.call(lambda: "client") == "client"
+    assert breaker.status() == {"state": "closed", "failures": 0, "last_error": None}
+
+
+def test_failure_opens_and_rejects_without_attempting():
+    breaker = CircuitBreaker("test", cooldown=60, max_cooldown=120, wait=0.1)
+    attempt = Flaky(failures=1)
+
+    with pytest.raises(ConnectionError):
+        breaker.call(attempt)
+    with pytest.raises(DatabaseUnavailable, match="down"):
+        breaker.call(attempt)
+
+    assert attempt.calls == 1
+    status = breaker.status()
+    assert status["state"] == "open" and status["failures"] == 1
+    assert 0 < status["retry_in"] <= 60
+
+
+def test_trial_after_cooldown_closes():
+    breaker = CircuitBreaker("test", cooldown=0.05, max_cooldown=1, wait=0.1)
+    attempt = Flaky(failures=1)
+    with pytest.raises(ConnectionError):
+        breaker.call(attempt)
+
+    time.sleep(0.06)
+
+    assert breaker.call(attempt) == "client"
+    assert breaker.status()["state"] == "closed"
+    assert breaker.failures == 0
+
+
+def test_failed_trial_doubles_cooldown_up_to_cap():
+    breaker = CircuitBreaker("test", cooldown=0.05, max_cooldown=0.15, wait=0.1)
+    attempt = Flaky(failures=3)
+
+    windows = []
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            breaker.call(attempt)
+        windows.append(breaker.retry_at - time.monotonic())
+        time.sleep(max(0.0, breaker.retry_at - time.monotonic()) + 0.01)
+
+    assert windows[0] == pytest.approx(0.05, abs=0.02)
+    assert windows[1] == pytest.approx(0.10, abs=0.02)
+    assert windows[2] == pytest.approx(0.15, abs=0.02)  # capped
+    assert breaker.call(attempt) == "client"
+
+
+def test_callers_fail_fast_while_an_attempt_is_in_flight():
+    breaker = CircuitBreaker("test", cooldown=0.05, max_cooldown=1, wait=0.05)
+    rejected = []
+
+    def slow_attempt():
+        # A caller arriving now gives up after `wait` instead of queueing
+        with pytest.raises(DatabaseUnavailable, match="in progress"):
+            breaker.call(lambda: "client")
+        rejected.append(True)
+        return "client"
+
+    assert breaker.call(slow_attempt) == "client"
+    assert rejected == [True]
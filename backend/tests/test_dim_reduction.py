@@ -0,0 +1,113 @@
+import os
+
+import numpy as np
+import pytest
+
+from models.ann_index import recall_at_k, row_norms
+from models.dim_reduction import (
+    REDUCED_EMBEDDINGS_FILE,
+    REDUCER_FILE,
+    ReducedIndex,
+    Reducer,
+    reduce_catalog,
+)
+
+
+def _clustered(n_rows=2000, dim=64, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    labels = rng.integers(clusters, size=n_rows)
+    return (centres[labels] + 0.3 * rng.standard_normal((n_rows, dim))).astype(np.float16)
+
+
+def _normalized(embeddings):
+    return embeddings.astype(np.float32) / row_norms(embeddings)[:, None]
+
+
+def _reducer(method, embeddings, dim=16):
+    if method == "rp":
+        return Reducer.random_projection(embeddings.shape[1], dim)
+    return Reducer.fit_pca(_normalized(embeddings), dim, whiten=method == "pca-whiten")
+
+
+def _reduced_index(method, embeddings, tmp_path):
+    reducer = _reducer(method, embeddings)
+    reducer.save(os.path.join(tmp_path, REDUCER_FILE))
+    reduce_catalog(embeddings, reducer, os.path.join(tmp_path, REDUCED_EMBEDDINGS_FILE))
+    return ReducedIndex.load(embeddings, str(tmp_path))
+
+
+def test_pca_components_are_orthonormal_and_ordered():
+    sample = _normalized(_clustered())
+    reducer = Reducer.fit_pca(sample, 16)
+
+    np.testing.assert_allclose(reducer.components @ reducer.components.T, np.eye(16), atol=1e-4)
+    variances = ((sample - reducer.mean) @ reducer.components.T).var(axis=0)
+    assert np.all(np.diff(variances) <= 1e-6)  # largest variance first
+
+
+def test_pca_whitening_gives_unit_variance():
+    sample = _normalized(_clustered())
+    reducer = Reducer.fit_pca(sample, 16, whiten=True)
+
+    projected = ((sample - reducer.mean) @ reducer.components.T) / reducer.scale
+    assert reducer.method == "pca-whiten"
+    np.testing.assert_allclose(projected.var(axis=0, ddof=1), 1.0, rtol=1e-3)
+
+
+def test_random_projection_roughly_preserves_similarity():
+    sample = _normalized(_clustered())[:200]
+    reducer = Reducer.random_projection(64, 48, seed=1)
+
+    reduced = reducer.transform(sample)
+    np.testing.assert_allclose(np.linalg.norm(reduced, axis=1), 1.0, rtol=1e-5)
+    # Johnson-Lindenstrauss: cosine error shrinks like 1 / sqrt(dim)
+    assert np.abs(sample @ sample.T - reduced @ reduced.T).mean() < 0.15
+
+
+@pytest.mark.parametrize("method", ["pca", "pca-whiten", "rp"])
+def test_reduced_recall_with_rerank(method, tmp_path):
+    embeddings = _clustered()
+    index = _reduced_index(method, embeddings, tmp_path)
+
+    assert recall_at_k(index, embeddings, k=10, queries=100)["recall"] >= 0.95
+
+
+@pytest.mark.parametrize("method", ["pca", "pca-whiten", "rp"])
+def test_reduced_recall_without_rerank(method, tmp_path):
+    embeddings = _clustered()
+    index = _reduced_index(method, embeddings, tmp_path)
+    index.rerank = 0  # scores from the reduced space only
+
+    assert recall_at_k(index, embeddings, k=10, queries=100)["recall"] >= 0.2
+
+
+def test_search_batch_matches_search(tmp_path):
+    embeddings = _clustered()
+    index = _reduced_index("pca", embeddings, tmp_path)
+    queries = [embeddings[row].astype(np.float32) for row in (4, 900)]
+    rows_list = [None, np.arange(0, len(embeddings), 5)]
+
+    for query, rows, (found, scores) in zip(queries, rows_list, index.search_batch(queries, 5, rows_list)):
+        expected, expected_scores = index.search(query, 5, rows)
+        np.testing.assert_array_equal(found, expected)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-5)
+        assert rows is None or set(found.tolist()) <= set(rows.tolist())
+
+
+def test_save_and_load_round_trip(tmp_path):
+    embeddings = _clustered()
+    reducer = _reducer("pca-whiten", embeddings)
+    path = os.path.join(tmp_path, REDUCER_FILE)
+    reducer.save(path)
+
+    loaded = Reducer.load(path)
+    vectors = _normalized(embeddings[:10])
+    assert loaded.method == "pca-whiten" and loaded.dim == 16
+    np.testing.assert_array_equal(loaded.transform(vectors), reducer.transform(vectors))
+
+    index = _reduced_index("pca", embeddings, tmp_path)
+    assert index.kind == "reduced-pca-16"
+    assert isinstance(index.reduced, np.memmap) and index.reduced.shape == (len(embeddings), 16)
+    with pytest.raises(ValueError):
+        ReducedIndex.load(embeddings[:100], str(tmp_path))
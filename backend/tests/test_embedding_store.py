@@ -0,0 +1,106 @@
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pytest
+
+from models.embedding_store import (
+    HEADER_FILE,
+    _prune,
+    current_version,
+    open_store,
+    save_store,
+    store_exists,
+)
+
+
+def _save(root, n=4, **kwargs):
+    embeddings = np.arange(n * 3, dtype=np.float32).reshape(n, 3)
+    filenames = [f"/images/{1000 + i}.jpg" for i in range(n)]
+    return save_store(embeddings, filenames, root=str(root), **kwargs)
+
+
+def test_save_publishes_and_open_reads_back(tmp_path):
+    path = _save(tmp_path, dtype="float16", normalized=True)
+
+    assert store_exists(str(tmp_path))
+    assert current_version(str(tmp_path)) == os.path.basename(path)
+    store = open_store(str(tmp_path))
+    assert len(store) == 4
+    assert store.embeddings.dtype == np.float16
+    assert isinstance(store.embeddings, np.memmap)
+    np.testing.assert_array_equal(store.ids, [1000, 1001, 1002, 1003])
+    assert store.header["normalized"] is True
+    assert not [name for name in os.listdir(tmp_path) if name.startswith(".tmp")]
+
+
+def test_rejects_mismatched_rows(tmp_path):
+    with pytest.raises(ValueError):
+        save_store(np.zeros((3, 2)), ["a.jpg"], root=str(tmp_path))
+
+
+def test_prune_keeps_newest_versions(tmp_path):
+    paths = [_save(tmp_path, keep=2) for _ in range(4)]
+    remaining = sorted(name for name in os.listdir(tmp_path) if name.startswith("v"))
+    assert remaining == sorted(os.path.basename(p) for p in paths[-2:])
+
+
+def test_prune_ignores_mtime_and_never_removes_current(tmp_path):
+    old, new = _save(tmp_path, keep=0), _save(tmp_path, keep=0)
+    # A restored/copied old version looks newest by mtime
+    future = time.time() + 3600
+    os.utime(old, (future, future))
+    _prune(str(tmp_path), keep=1)
+    assert os.path.isdir(new) and not os.path.exists(old)
+
+    # Rolled back CURRENT survives even though it is not among the newest
+    third = _save(tmp_path, keep=0)
+    shutil.copytree(third, str(tmp_path / "v-copy"))  # header-less copies are ignored below
+    os.remove(str(tmp_path / "v-copy" / HEADER_FILE))
+    with open(str(tmp_path / "CURRENT"), "w", encoding="utf-8") as f:
+        f.write(os.path.basename(new))
+    _prune(str(tmp_path), keep=1)
+    assert os.path.isdir(new) and os.path.isdir(third)
+    assert os.path.isdir(str(tmp_path / "v-copy"))
+
+
+def test_prune_orders_legacy_headers_by_version_name(tmp_path):
+    paths = [_save(tmp_path, keep=0) for _ in range(2)]
+    for path, stamp in zip(paths, ["v20240101-000000-aaaa", "v20230101-000000-bbbb"]):
+        with open(os.path.join(path, HEADER_FILE), "r", encoding="utf-8") as f:
+            header = json.load(f)
+        header.pop("created_ns")
+        with open(os.path.join(path, HEADER_FILE), "w", encoding="utf-8") as f:
+            json.dump(header, f)
+        os.rename(path, os.path.join(str(tmp_path), stamp))
+    with open(str(tmp_path / "CURRENT"), "w", encoding="utf-8") as f:
+        f.write("v20240101-000000-aaaa")
+
+    _prune(str(tmp_path), keep=1)
+    assert sorted(n for n in os.listdir(tmp_path) if n.startswith("v")) == ["v20240101-000000-aaaa"]
+
+
+@pytest.mark.parametrize(
+    "version",
+    ["../outside", "/etc", "v20240101-120000-ab12/../../x", "v20240101-120000-zz", 7],
+)
+def test_open_rejects_versions_outside_the_store(tmp_path, version):
+    root = tmp_path / "store"
+    _save(root)
+    (tmp_path / "outside").mkdir()
+    (tmp_path / "outside" / HEADER_FILE).write_text("{}")
+
+    with pytest.raises(ValueError):
+        open_store(str(root), version=version)
+
+
+def test_open_rejects_unknown_or_headerless_versions(tmp_path):
+    _save(tmp_path)
+    (tmp_path / "v20240101-120000-ab12").mkdir()  # no header.json
+
+    with pytest.raises(ValueError, match="no store version"):
+        open_store(str(tmp_path), version="v20240101-120000-ab12")
+    with pytest.raises(ValueError, match="no store version"):
+        open_store(str(tmp_path), version="v20240101-120000-cd34")
@@ -0,0 +1,39 @@
+import numpy as np
+
+from models.metadata import CatalogMetadata, load_metadata
+
+STYLES = """id,gender,masterCategory,subCategory,articleType,baseColour,season,year,usage,productDisplayName
+10,Men,Apparel,Topwear,Shirts,Blue,Summer,2012,Casual,Blue shirt, slim fit
+11,Women,Apparel,Topwear,Tops,Red,Winter,2015,Casual,Red top
+12,Men,Footwear,Shoes,Casual Shoes,Blue,Summer,bad,Sports,Shoes
+"""
+
+
+def _metadata(tmp_path, ids=(12, 10, 99, 11)):
+    csv_path = tmp_path / "styles.csv"
+    csv_path.write_text(STYLES, encoding="utf-8")
+    return CatalogMetadata.build(np.array(ids), str(csv_path)), str(csv_path)
+
+
+def test_rows_are_aligned_and_unknown_is_code_zero(tmp_path):
+    metadata, _ = _metadata(tmp_path)
+    assert [metadata.value("articleType", row) for row in range(4)] == ["Casual Shoes", "Shirts", "", "Tops"]
+    for name, vocab in metadata.vocab.items():
+        assert vocab[0] == "", name
+    assert metadata.codes["gender"][2] == 0
+    np.testing.assert_array_equal(metadata.year, [0, 2012, 0, 2015])
+
+
+def test_filter_mask_combines_attributes_and_years(tmp_path):
+    metadata, _ = _metadata(tmp_path)
+    mask = metadata.filter_mask({"baseColour": ["blue"], "year_min": 2010})
+    np.testing.assert_array_equal(np.flatnonzero(mask), [1])
+    np.testing.assert_array_equal(np.flatnonzero(metadata.mask("season", "Nope")), [])
+
+
+def test_load_metadata_caches_next_to_the_store(tmp_path):
+    metadata, csv_path = _metadata(tmp_path)
+    cached = load_metadata(metadata.ids, str(tmp_path), csv_path)
+    again = load_metadata(metadata.ids, str(tmp_path), csv_path)
+    np.testing.assert_array_equal(cached.codes["usage"], again.codes["usage"])
+    assert (tmp_path / "metadata.npz").exists()
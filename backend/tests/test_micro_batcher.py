@@ -0,0 +1,118 @@
+import threading
+
+import pytest
+
+from models.micro_batcher import MicroBatcher
+
+
+def _square_unless_negative(items):
+    return [ValueError(f"negative: {item}") if item < 0 else item * item for item in items]
+
+
+def test_results_come_back_in_submission_order():
+    batcher = MicroBatcher(_square_unless_negative, max_batch=8, max_wait_ms=20)
+    futures = [batcher.submit(i) for i in range(20)]
+
+    assert [f.result(timeout=5) for f in futures] == [i * i for i in range(20)]
+    assert batcher.stats()["items"] == 20
+
+
+def test_failed_item_does_not_affect_its_batch():
+    seen = []
+
+    def process(items):
+        seen.append(list(items))
+        return _square_unless_negative(items)
+
+    batcher = MicroBatcher(process, max_batch=4, max_wait_ms=200)
+    futures = [batcher.submit(item) for item in (1, -2, 3, 4)]
+
+    assert futures[0].result(timeout=5) == 1
+    assert seen == [[1, -2, 3, 4]]  # one batch
+    with pytest.raises(ValueError, match="negative: -2"):
+        futures[1].result(timeout=5)
+    assert [f.result(timeout=5) for f in futures[2:]] == [9, 16]
+
+
+def test_batch_failure_fails_only_that_batch():
+    calls = []
+
+    def process(items):
+        calls.append(len(calls))
+        if len(calls) == 1:
+            raise RuntimeError("model crashed")
+        return _square_unless_negative(items)
+
+    batcher = MicroBatcher(process, max_batch=2, max_wait_ms=200)
+    first = [batcher.submit(1), batcher.submit(2)]
+    for future in first:
+        with pytest.raises(RuntimeError):
+            future.result(timeout=5)
+
+    # The worker thread survives and keeps serving
+    assert batcher(5, timeout=5) == 25
+    assert batcher.stats()["batches"] == 1
+
+
+def test_concurrent_callers_are_batched():
+    sizes = []
+
+    def process(items):
+        sizes.append(len(items))
+        return _square_unless_negative(items)
+
+    # A long wait: the batch is dispatched as soon as it fills up
+    batcher = MicroBatcher(process, max_batch=9, max_wait_ms=5000)
+    results = [None] * 9
+
+    def call(i):
+        results[i] = batcher(i, timeout=5)
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(9)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+
+    assert results == [i * i for i in range(9)]
+    assert sizes == [9]
+
+
+def test_stalled_batch_falls_back_to_direct_processing():
+    release = threading.Event()
+
+    def process(items):
+        if threading.current_thread().name == "stalled":
+            release.wait(5)
+        return _square_unless_negative(items)
+
+    batcher = MicroBatcher(process, max_batch=1, max_wait_ms=0, name="stalled", timeout=0.1)
+    try:
+        assert batcher(3) == 9  # the worker is stuck, this thread answers
+        with pytest.raises(ValueError):
+            batcher(-1)
+        assert batcher.stats()["fallbacks"] == 2
+    finally:
+        release.set()
+
+
+@pytest.mark.filterwarnings("ignore::pytest.PytestUnhandledThreadExceptionWarning")
+def test_dead_worker_is_replaced_without_dropping_queued_items():
+    calls = []
+
+    def process(items):
+        calls.append(list(items))
+        if len(calls) == 1:
+            raise SystemExit  # not an Exception: kills the worker thread
+        return _square_unless_negative(items)
+
+    batcher = MicroBatcher(process, max_batch=1, max_wait_ms=0, timeout=5)
+    first = batcher.submit(2)
+    queue_before = batcher._queue
+    batcher._thread.join(5)
+
+    queued = batcher.submit(4)  # restarts the worker on the same queue
+
+    assert batcher._queue is queue_before
+    assert queued.result(timeout=5) == 16
+    assert not first.done()  # lost with the dead thread; __call__ would fall back
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("pymongo")
+
+from app.database import client  # noqa: E402
+
+
+@pytest.mark.parametrize(
+    "uri, expected",
+    [
+        ("mongodb://localhost:27017/fashiondb", False),
+        ("mongodb+srv://user:pw@cluster0.example.net/fashiondb", True),
+        ("mongodb://db.example.net/fashiondb?tls=true", True),
+        ("mongodb://db.example.net/fashiondb?retryWrites=true&ssl=true", True),
+        ("mongodb://db.example.net/fashiondb?TLS=false", False),
+    ],
+)
+def test_tls_follows_the_uri(monkeypatch, uri, expected):
+    monkeypatch.setattr(client, "TLS", "")
+    assert client.use_tls(uri) is expected
+
+
+def test_env_flag_overrides_the_uri(monkeypatch):
+    monkeypatch.setattr(client, "TLS", "1")
+    assert client.use_tls("mongodb://localhost:27017/fashiondb") is True
+    monkeypatch.setattr(client, "TLS", "0")
+    assert client.use_tls("mongodb+srv://cluster0.example.net/fashiondb") is False
+
+
+def test_plain_uri_gets_a_client_without_tls(monkeypatch):
+    monkeypatch.setattr(client, "TLS", "")
+    uri = "mongodb://localhost:27017/fashiondb_tls_test"
+    try:
+        mongo = client.get_client(uri)
+        assert mongo.options.pool_options._ssl_context is None
+    finally:
+        client.close_client(uri)
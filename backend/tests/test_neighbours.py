@@ -0,0 +1,59 @@
+import tracemalloc
+
+import numpy as np
+import pytest
+
+from models.ann_index import row_norms
+from models.neighbours import _duplicate_groups, block_top_k, plan_tiles, tile_bytes
+
+
+def _brute_force(embeddings, start, stop, k):
+    normalized = embeddings.astype(np.float32) / row_norms(embeddings)[:, None]
+    scores = normalized[start:stop] @ normalized.T
+    scores[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+    return np.argsort(-scores, axis=1)[:, :k]
+
+
+def test_block_top_k_matches_brute_force():
+    rng = np.random.default_rng(0)
+    embeddings = rng.standard_normal((700, 32)).astype(np.float16)
+    rows, scores = block_top_k(embeddings, row_norms(embeddings), 100, 230, 7, chunk_rows=97)
+
+    assert rows.dtype == np.int32
+    np.testing.assert_array_equal(np.sort(rows, axis=1), np.sort(_brute_force(embeddings, 100, 230, 7), axis=1))
+    assert np.all(np.diff(scores, axis=1) <= 0)  # best first
+
+
+def test_block_top_k_reports_duplicate_pairs_once():
+    rng = np.random.default_rng(1)
+    embeddings = rng.standard_normal((50, 16)).astype(np.float32)
+    embeddings[40] = embeddings[3] * 2  # same direction
+    _, _, pairs, pair_scores = block_top_k(
+        embeddings, row_norms(embeddings), 0, 50, 5, chunk_rows=16, threshold=0.999
+    )
+    assert pairs.tolist() == [[3, 40]]
+    assert pair_scores[0] == pytest.approx(1.0, abs=1e-5)
+    assert sorted(_duplicate_groups([(3, 40), (40, 41), (7, 8)])) == [[3, 40, 41], [7, 8]]
+
+
+@pytest.mark.parametrize("n_rows, dim, k, memory_mb", [(4000, 512, 50, 16), (3000, 128, 10, 1)])
+def test_plan_tiles_keeps_block_within_budget(n_rows, dim, k, memory_mb):
+    budget = memory_mb * 1024 * 1024
+    block_rows, chunk_rows = plan_tiles(n_rows, dim, k, memory_mb)
+    assert tile_bytes(block_rows, chunk_rows, dim, k, n_rows) <= budget
+
+    rng = np.random.default_rng(2)
+    embeddings = rng.standard_normal((n_rows, dim), dtype=np.float32)
+    norms = row_norms(embeddings)
+    tracemalloc.start()
+    try:
+        block_top_k(embeddings, norms, 0, block_rows, k, chunk_rows, threshold=0.99)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    assert peak <= budget
+
+
+def test_plan_tiles_rejects_impossible_budget():
+    with pytest.raises(ValueError):
+        plan_tiles(10_000_000, 4096, 50, memory_mb=1)
@@ -0,0 +1,81 @@
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from bson import ObjectId  # noqa: E402
+
+from app.database import mongodb  # noqa: E402
+
+
+@pytest.fixture
+def products_db(monkeypatch):
+    db = mongomock.MongoClient().db
+    monkeypatch.setattr(mongodb, "_get_db", lambda: db)
+    words = ["red", "blue", "shirt", "denim", "c++ tee"]
+    db["products"].insert_many(
+        [
+            {
+                "name": f"{words[i % 5]} {words[(i * 3) % 5]}",
+                "description": words[(i * 7) % 5],
+                "category": words[(i * 2) % 5],
+                "brand": words[(i * 11) % 5],
+                "price": i,
+            }
+            for i in range(57)
+        ]
+    )
+    return db
+
+
+def _walk(**kwargs):
+    products, token, pages = [], None, 0
+    while True:
+        page = mongodb.get_products_page(page_token=token, **kwargs)
+        products += page["products"]
+        pages += 1
+        token = page["next_page_token"]
+        if token is None:
+            return products, page, pages
+
+
+@pytest.mark.parametrize("last_id", [ObjectId(), "sku-42", 42])
+def test_page_token_round_trip(last_id):
+    token = mongodb._encode_page_token("abc", last_id, 0.65)
+    assert mongodb._decode_page_token(token, "abc") == (last_id, 0.65)
+
+
+def test_page_token_rejects_other_query_and_garbage():
+    token = mongodb._encode_page_token("abc", ObjectId(), None)
+    with pytest.raises(ValueError):
+        mongodb._decode_page_token(token, "other")
+    with pytest.raises(ValueError):
+        mongodb._decode_page_token("not-a-token", "abc")
+
+
+def test_id_pages_cover_every_product_once(products_db):
+    products, last_page, pages = _walk(limit=10, with_count=True)
+    assert pages == 6
+    assert len({p["_id"] for p in products}) == 57
+    assert last_page["total"] == 57
+
+
+def test_scored_pages_are_ranked_and_projected(products_db):
+    products, last_page, _ = _walk(
+        filters={"search_term": "red"}, score_term="red", limit=7, fields="name,price", with_count=True
+    )
+    assert len({p["_id"] for p in products}) == last_page["total"] == len(products)
+    scores = [p["_score"] for p in products]
+    assert scores == sorted(scores, reverse=True)
+    assert set(products[0]) == {"_id", "_score", "name", "price"}
+
+
+def test_search_term_is_matched_literally(products_db):
+    page = mongodb.get_products_page({"search_term": "c++"}, score_term="c++", with_count=True)
+    assert page["total"] > 0
+    assert all(p["_score"] > 0 for p in page["products"])
+    assert mongodb.get_products_page({"search_term": "("}, score_term="(")["products"] == []
+
+
+def test_invalid_field_is_rejected(products_db):
+    with pytest.raises(ValueError):
+        mongodb.get_products_page(fields="$where")
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from models.ann_index import recall_at_k
+from models.quantization import CODECS, ProductQuantizer, QuantizedIndex, make_codec
+
+
+def _clustered(n_rows=2000, dim=32, clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    labels = rng.integers(clusters, size=n_rows)
+    return (centres[labels] + 0.3 * rng.standard_normal((n_rows, dim))).astype(np.float16)
+
+
+@pytest.mark.parametrize("codec", CODECS)
+def test_quantized_recall_with_rerank(codec):
+    embeddings = _clustered()
+    index = QuantizedIndex.build(embeddings, make_codec(codec, m=8))
+
+    assert recall_at_k(index, embeddings, k=10, queries=100)["recall"] >= 0.95
+
+
+@pytest.mark.parametrize("codec, minimum", [("float16", 0.95), ("int8", 0.85), ("pq", 0.25)])
+def test_quantized_recall_without_rerank(codec, minimum):
+    embeddings = _clustered()
+    index = QuantizedIndex.build(embeddings, make_codec(codec, m=8))
+    index.rerank = 10  # the shortlist is the answer: measures the codes alone
+
+    assert recall_at_k(index, embeddings, k=10, queries=100)["recall"] >= minimum
+
+
+def test_reranked_scores_are_exact_cosines():
+    embeddings = _clustered()
+    index = QuantizedIndex.build(embeddings, make_codec("pq", m=8))
+    query = embeddings[42].astype(np.float32)
+
+    rows, scores = index.search(query, 5)
+
+    matrix = embeddings[rows].astype(np.float32)
+    cosines = matrix @ query / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query))
+    assert rows[0] == 42
+    np.testing.assert_allclose(scores, cosines, rtol=1e-3)
+
+
+def test_codes_are_smaller_than_float32():
+    embeddings = _clustered()
+    sizes = {
+        codec: QuantizedIndex.build(embeddings, make_codec(codec, m=8)).codes.nbytes
+        for codec in CODECS
+    }
+    float32_bytes = embeddings.size * 4
+
+    assert sizes == {"float16": float32_bytes // 2, "int8": float32_bytes // 4, "pq": len(embeddings) * 8}
+
+
+def test_save_and_load_round_trip(tmp_path):
+    embeddings = _clustered()
+    index = QuantizedIndex.build(embeddings, make_codec("int8"))
+    path = tmp_path / "quantized_int8.npz"
+    index.save(path)
+
+    loaded = QuantizedIndex.load(embeddings, path)
+    query = embeddings[7].astype(np.float32)
+
+    assert loaded.kind == "int8"
+    np.testing.assert_array_equal(loaded.codes, index.codes)
+    np.testing.assert_array_equal(loaded.search(query, 5)[0], index.search(query, 5)[0])
+    with pytest.raises(ValueError):
+        QuantizedIndex.load(embeddings[:100], path)
+
+
+def test_pq_rejects_indivisible_dimension():
+    with pytest.raises(ValueError):
+        ProductQuantizer(m=5).fit(np.zeros((300, 32), dtype=np.float32))
@@ -0,0 +1,122 @@
+import gc
+import os
+import time
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from bson import ObjectId  # noqa: E402
+
+from app.database import write_behind  # noqa: E402
+from app.database.circuit_breaker import DatabaseUnavailable  # noqa: E402
+from app.database.write_behind import WriteBehindQueue  # noqa: E402
+
+
+def _docs(n):
+    return [{"_id": ObjectId(), "n": i} for i in range(n)]
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def test_documents_are_flushed_per_collection(db):
+    q = WriteBehindQueue(lambda: db, batch_size=100, flush_interval=0.05)
+    q.submit("recommendations", _docs(4))
+    q.submit("search_history", _docs(2))
+    assert _wait_for(lambda: q.stats["written"] == 6)
+    assert db["recommendations"].count_documents({}) == 4
+    assert db["search_history"].count_documents({}) == 2
+    q.close(1)
+
+
+def test_full_queue_writes_synchronously(db):
+    q = WriteBehindQueue(lambda: db, max_queued=3, batch_size=100, flush_interval=5)
+    q.submit("recommendations", _docs(5))
+    assert q.stats["sync_fallbacks"] == 1
+    q.close(1)
+    assert db["recommendations"].count_documents({}) == 5
+
+
+def test_failed_flush_is_retried_and_duplicates_count_as_written(db, monkeypatch):
+    monkeypatch.setattr(write_behind, "BACKOFF_BASE", 0.001)
+    failures = {"left": 2}
+
+    def flaky_db():
+        if failures["left"]:
+            failures["left"] -= 1
+            raise ConnectionError("down")
+        return db
+
+    docs = _docs(5)
+    db["recommendations"].insert_one(dict(docs[2]))  # landed before a dropped connection
+    q = WriteBehindQueue(flaky_db, batch_size=100, flush_interval=0.02)
+    q.submit("recommendations", docs)
+    assert _wait_for(lambda: q.stats["written"] == 5)
+    assert q.stats["retries"] == 2 and q.stats["failed"] == 0
+    assert db["recommendations"].count_documents({}) == 5
+    q.close(1)
+
+
+def test_breaker_rejections_do_not_use_up_retries(db, monkeypatch):
+    monkeypatch.setattr(write_behind, "BACKOFF_BASE", 0.001)
+    rejections = {"left": 8}  # more than max_retries
+
+    def guarded_db():
+        if rejections["left"]:
+            rejections["left"] -= 1
+            raise DatabaseUnavailable("mongodb unavailable (retrying in 15s)")
+        return db
+
+    q = WriteBehindQueue(guarded_db, batch_size=100, flush_interval=0.02, max_retries=2)
+    q.submit("recommendations", _docs(3))
+    assert _wait_for(lambda: q.stats["written"] == 3)
+    assert q.stats["unavailable"] == 8
+    assert q.stats["retries"] == 0 and q.stats["failed"] == 0
+    q.close(1)
+
+
+def test_unused_queues_are_not_kept_alive(db):
+    before = len(write_behind._queues)
+    q = WriteBehindQueue(lambda: db)
+    assert len(write_behind._queues) == before + 1
+    del q
+    gc.collect()
+    assert len(write_behind._queues) == before
+
+
+def test_close_drains_and_later_writes_are_synchronous(db):
+    q = WriteBehindQueue(lambda: db, batch_size=1000, flush_interval=60)
+    q.submit("search_history", _docs(3))
+    q.close(2)
+    assert db["search_history"].count_documents({}) == 3
+    q.submit("search_history", _docs(1))
+    assert db["search_history"].count_documents({}) == 4
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs os.fork")
+def test_forked_child_flushes_its_own_queue(db):
+    q = WriteBehindQueue(lambda: db, batch_size=100, flush_interval=0.02)
+    q.submit("recommendations", _docs(1))  # parent thread running
+    assert _wait_for(lambda: q.stats["written"] == 1)
+
+    pid = os.fork()
+    if pid == 0:  # child: its own thread must pick the documents up
+        ok = False
+        try:
+            q.submit("recommendations", _docs(3))
+            ok = _wait_for(lambda: db["recommendations"].count_documents({}) == 4)
+        finally:
+            os._exit(0 if ok else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.WEXITSTATUS(status) == 0
+    q.close(1)